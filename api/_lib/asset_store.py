@@ -0,0 +1,240 @@
+"""
+Content-addressed store for generated images.
+
+Images are written once under their SHA-256 digest so /api/generate can
+return short /api/assets/<digest> URLs instead of inlining base64, and the
+bytes can be cached indefinitely by browsers and CDNs.
+
+The default directory is local to the instance (/tmp on Vercel); point
+ASSET_STORE_DIR at shared storage when several instances serve assets.
+
+The store is bounded: assets not written (or re-written) for
+ASSET_STORE_TTL_SECONDS are deleted, and when the directory grows past
+ASSET_STORE_MAX_BYTES the oldest are deleted first. Assets younger than
+ASSET_STORE_MIN_AGE_SECONDS and those returned by a registered pin
+provider (the inputs of unfinished jobs, see job_queue) are never
+deleted. An evicted asset's /api/assets URL answers 404, so callers that
+need results for longer should download them or point ASSET_STORE_DIR at
+storage with its own lifecycle (and ASSET_STORE_MAX_BYTES=0 to disable
+eviction here).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ASSET_STORE_DIR = os.environ.get(
+    "ASSET_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "creative-studio-assets"),
+)
+ASSET_URL_PREFIX = "/api/assets/"
+# Byte budget for the store directory (0 disables eviction)
+ASSET_STORE_MAX_BYTES = int(os.environ.get("ASSET_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+ASSET_STORE_TTL_SECONDS = float(os.environ.get("ASSET_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Recently written assets may belong to a job still being submitted or a
+# response whose URLs have not been fetched yet
+ASSET_STORE_MIN_AGE_SECONDS = 600
+# Expired assets are looked for at most this often while under budget
+SWEEP_INTERVAL_SECONDS = 3600
+# Over budget, the directory is rescanned at most this often (the store may
+# stay over budget while everything in it is pinned or too young to evict)
+MIN_SWEEP_GAP_SECONDS = 10
+
+# Callables returning digests that must not be evicted
+_pin_providers = []
+# directory -> {"bytes": tracked total, "swept_at": monotonic time or None}
+_usage = {}
+_usage_lock = threading.Lock()
+_sweep_lock = threading.Lock()
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_digest(digest):
+    """Return True if digest looks like a SHA-256 hex digest."""
+    return bool(digest) and bool(_DIGEST_RE.match(digest))
+
+
+def _paths(digest, directory):
+    """Return (data_path, meta_path) for a digest, sharded by prefix."""
+    shard = os.path.join(directory, digest[:2])
+    data_path = os.path.join(shard, digest)
+    return data_path, data_path + ".json"
+
+
+def register_pinned_assets(provider):
+    """
+    Register a callable returning an iterable of digests that eviction must
+    keep (e.g. the reference images of unfinished jobs).
+    """
+    _pin_providers.append(provider)
+
+
+def put_asset(data, mime_type, directory=None):
+    """
+    Store bytes under their content digest; an asset already present only
+    has its age reset. May evict old assets (see the module docstring).
+
+    Args:
+        data: Raw asset bytes.
+        mime_type: MIME type served with the asset.
+        directory: Optional store directory (defaults to ASSET_STORE_DIR).
+
+    Returns:
+        The SHA-256 hex digest identifying the asset.
+    """
+    directory = directory or ASSET_STORE_DIR
+    digest = hashlib.sha256(data).hexdigest()
+    data_path, meta_path = _paths(digest, directory)
+    if os.path.exists(meta_path):
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+        return digest
+
+    written = 0
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    for path, payload in (
+        (data_path, data),
+        (meta_path, json.dumps({"mime_type": mime_type, "size": len(data)}).encode("utf-8")),
+    ):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        written += len(payload)
+    _account(directory, written)
+    return digest
+
+
+def _account(directory, added):
+    """Add written bytes to a directory's total; sweep when over budget or due."""
+    if not ASSET_STORE_MAX_BYTES:
+        return
+    with _usage_lock:
+        usage = _usage.setdefault(directory, {"bytes": 0, "swept_at": None})
+        usage["bytes"] += added
+        since_sweep = None if usage["swept_at"] is None else time.monotonic() - usage["swept_at"]
+        due = (
+            since_sweep is None
+            or since_sweep > SWEEP_INTERVAL_SECONDS
+            or (usage["bytes"] > ASSET_STORE_MAX_BYTES and since_sweep > MIN_SWEEP_GAP_SECONDS)
+        )
+    if due:
+        _sweep(directory)
+
+
+def _scan(directory):
+    """Return (mtime, size, digest) for every stored asset, oldest first."""
+    entries = []
+    for shard in os.scandir(directory):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if not is_valid_digest(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+                size = stat.st_size + os.path.getsize(entry.path + ".json")
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, entry.name))
+    entries.sort()
+    return entries
+
+
+def _sweep(directory):
+    """Delete expired assets, then the oldest until under ASSET_STORE_MAX_BYTES."""
+    if not _sweep_lock.acquire(blocking=False):
+        return  # another write is already sweeping
+    try:
+        pinned = set()
+        for provider in _pin_providers:
+            try:
+                pinned.update(provider())
+            except Exception as e:
+                # Without the pin list nothing is known to be safe to delete
+                logger.warning("Skipping asset eviction; pinned assets unavailable: %s", e)
+                return
+        now = time.time()
+        entries = _scan(directory)
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for mtime, size, digest in entries:
+            age = now - mtime
+            if age <= ASSET_STORE_TTL_SECONDS and total <= ASSET_STORE_MAX_BYTES:
+                break
+            if age < ASSET_STORE_MIN_AGE_SECONDS:
+                break  # everything after this is younger still
+            if digest in pinned:
+                continue
+            data_path, meta_path = _paths(digest, directory)
+            try:
+                os.remove(meta_path)  # unlisted first, so readers see a miss
+                os.remove(data_path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info("Evicted %d stored asset(s); %d bytes remain", evicted, total)
+        with _usage_lock:
+            _usage[directory] = {"bytes": total, "swept_at": time.monotonic()}
+    finally:
+        _sweep_lock.release()
+
+
+def get_asset_info(digest, directory=None):
+    """
+    Look up a stored asset.
+
+    Returns:
+        Dict with path, mime_type and size, or None if it is not stored.
+    """
+    if not is_valid_digest(digest):
+        return None
+    data_path, meta_path = _paths(digest, directory or ASSET_STORE_DIR)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        size = os.path.getsize(data_path)
+    except (OSError, ValueError):
+        return None
+    return {"path": data_path, "mime_type": meta.get("mime_type"), "size": size}
+
+
+def read_asset(digest, directory=None):
+    """
+    Read a stored asset's bytes.
+
+    Returns:
+        (data, mime_type), or None if it is not stored.
+    """
+    info = get_asset_info(digest, directory)
+    if info is None:
+        return None
+    try:
+        with open(info["path"], "rb") as f:
+            return f.read(), info["mime_type"]
+    except OSError:
+        return None
+
+
+def asset_url(digest):
+    """Return the API URL that serves an asset."""
+    return f"{ASSET_URL_PREFIX}{digest}"
@@ -0,0 +1,260 @@
+"""
+Brand CI digestion: turn a brand guideline PDF into a compact text summary.
+
+Instead of attaching the whole PDF to every segment's Gemini request, the
+guidance that matters - palette hex codes, typography, logo rules and
+short directive excerpts - is extracted once per distinct PDF, cached by
+its content digest and written into the prompt as text.
+
+Extraction uses PyMuPDF (requirements.txt). When it is not installed, or a
+PDF yields nothing usable (e.g. a scanned document), get_brand_ci_summary
+returns None and callers fall back to attaching the PDF.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+
+from .result_cache import MemoryLRUCache, FilesystemCache, TieredCache
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF before 1.24.3
+    except ImportError:  # optional; digest mode then falls back to the raw PDF
+        fitz = None
+
+logger = logging.getLogger(__name__)
+
+# "digest" sends the extracted summary as prompt text; "pdf" attaches the PDF
+BRAND_CI_MODE = os.environ.get("BRAND_CI_MODE", "digest")
+BRAND_CI_MODES = {"digest", "pdf"}
+
+BRAND_CI_CACHE_DIR = os.environ.get(
+    "BRAND_CI_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "creative-studio-brand-ci"),
+)
+# Bump when the extraction rules change so stale summaries are not reused
+SUMMARY_VERSION = 1
+
+MAX_PAGES = 40
+MAX_PALETTE = 12
+MAX_FONTS = 6
+MAX_LOGO_RULES = 8
+MAX_EXCERPTS = 10
+MAX_EXCERPT_CHARS = 240
+# Vector fills within this distance per channel of a listed color are skipped
+COLOR_MERGE_DISTANCE = 6
+
+_HEX_RE = re.compile(r"#([0-9A-Fa-f]{6}|[0-9A-Fa-f]{3})\b")
+_RGB_RE = re.compile(
+    r"\bRGB\s*:?\s*\(?\s*(\d{1,3})\s*[,/ ]\s*(\d{1,3})\s*[,/ ]\s*(\d{1,3})",
+    re.IGNORECASE,
+)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\s*[•●▪]\s*")
+_DIRECTIVE_RE = re.compile(
+    r"\b(must|should|never|always|do not|don't|avoid|ensure|only|minimum|clear ?space|required)\b",
+    re.IGNORECASE,
+)
+_LOGO_RE = re.compile(r"\blogo(type|mark)?s?\b", re.IGNORECASE)
+# Font subsets embedded in PDFs are named like "ABCDEF+Helvetica-Bold"
+_SUBSET_PREFIX_RE = re.compile(r"^[A-Z]{6}\+")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    """Return the process-wide summary cache (memory in front of filesystem)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            tiers = [MemoryLRUCache(max_entries=32)]
+            try:
+                tiers.append(FilesystemCache(directory=BRAND_CI_CACHE_DIR))
+            except OSError as e:
+                logger.warning("Brand CI filesystem cache unavailable: %s", e)
+            _cache = TieredCache(tiers)
+        return _cache
+
+
+def _to_hex(r, g, b):
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def _is_near(a, b):
+    """Return True if two "#RRGGBB" colors differ by at most COLOR_MERGE_DISTANCE per channel."""
+    return all(
+        abs(int(a[i:i + 2], 16) - int(b[i:i + 2], 16)) <= COLOR_MERGE_DISTANCE
+        for i in (1, 3, 5)
+    )
+
+
+def _normalize_hex(code):
+    """Expand #abc to #AABBCC and upper-case."""
+    if len(code) == 3:
+        code = "".join(c * 2 for c in code)
+    return f"#{code.upper()}"
+
+
+def _clean(text):
+    """Collapse whitespace and clip an excerpt to MAX_EXCERPT_CHARS."""
+    text = " ".join(text.split())
+    if len(text) > MAX_EXCERPT_CHARS:
+        text = text[: MAX_EXCERPT_CHARS - 3].rstrip() + "..."
+    return text
+
+
+def _extract_pdf_content(data):
+    """
+    Read text blocks, font usage and fill colors from a PDF with PyMuPDF.
+
+    Returns:
+        (text_blocks, font_usage, fill_colors, page_count) where font_usage
+        and fill_colors are Counters weighted by characters / occurrences.
+    """
+    text_blocks = []
+    font_usage = Counter()
+    fill_colors = Counter()
+    with fitz.open(stream=bytes(data), filetype="pdf") as doc:
+        page_count = doc.page_count
+        for page_index in range(min(page_count, MAX_PAGES)):
+            page = doc[page_index]
+            for block in page.get_text("dict").get("blocks", []):
+                block_text = []
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        text = span.get("text", "")
+                        if not text.strip():
+                            continue
+                        block_text.append(text)
+                        font = _SUBSET_PREFIX_RE.sub("", span.get("font", ""))
+                        if font:
+                            font_usage[font] += len(text)
+                    block_text.append("\n")
+                if block_text:
+                    text_blocks.append("".join(block_text))
+            for drawing in page.get_drawings():
+                fill = drawing.get("fill")
+                if fill and len(fill) == 3:
+                    fill_colors[_to_hex(*(round(c * 255) for c in fill))] += 1
+    return text_blocks, font_usage, fill_colors, page_count
+
+
+def build_summary(text_blocks, font_usage=None, fill_colors=None, page_count=None):
+    """
+    Build the structured brand summary from extracted PDF content.
+
+    Colors written in the text (hex codes, "RGB r, g, b") come first, then
+    the most frequent vector fill colors. Sentences mentioning the logo
+    become logo rules; other directive sentences ("must", "never", ...)
+    become excerpts.
+
+    Args:
+        text_blocks: List of text blocks in reading order.
+        font_usage: Optional Counter of font name -> characters set in it.
+        fill_colors: Optional Counter of "#RRGGBB" -> occurrences.
+        page_count: Optional number of pages in the document.
+
+    Returns:
+        Dict with palette, typography, logo_rules, excerpts and page_count,
+        or None if nothing usable was found.
+    """
+    palette = []
+    logo_rules = []
+    excerpts = []
+    seen = set()
+
+    def add_color(code):
+        if code not in palette and len(palette) < MAX_PALETTE:
+            palette.append(code)
+
+    for block in text_blocks:
+        for match in _HEX_RE.finditer(block):
+            add_color(_normalize_hex(match.group(1)))
+        for match in _RGB_RE.finditer(block):
+            r, g, b = (int(v) for v in match.groups())
+            if max(r, g, b) <= 255:
+                add_color(_to_hex(r, g, b))
+
+        for sentence in _SENTENCE_SPLIT_RE.split(" ".join(block.split())):
+            sentence = _clean(sentence)
+            key = sentence.lower()
+            if len(sentence) < 12 or key in seen:
+                continue
+            if _LOGO_RE.search(sentence):
+                if len(logo_rules) < MAX_LOGO_RULES:
+                    logo_rules.append(sentence)
+                    seen.add(key)
+            elif _DIRECTIVE_RE.search(sentence) and len(excerpts) < MAX_EXCERPTS:
+                excerpts.append(sentence)
+                seen.add(key)
+
+    for code, _ in (fill_colors or Counter()).most_common():
+        if not any(_is_near(code, existing) for existing in palette):
+            add_color(code)
+
+    typography = [name for name, _ in (font_usage or Counter()).most_common(MAX_FONTS)]
+
+    if not (palette or typography or logo_rules or excerpts):
+        return None
+    return {
+        "palette": palette,
+        "typography": typography,
+        "logo_rules": logo_rules,
+        "excerpts": excerpts,
+        "page_count": page_count,
+    }
+
+
+def get_brand_ci_summary(asset):
+    """
+    Return the cached brand summary for a brand CI PDF, extracting it once.
+
+    Args:
+        asset: Brand CI MediaAsset.
+
+    Returns:
+        The summary dict from build_summary, or None if PyMuPDF is missing
+        or the PDF could not be summarized.
+    """
+    if fitz is None:
+        logger.info("PyMuPDF not installed; attaching brand CI PDF instead of a digest")
+        return None
+
+    cache = _get_cache()
+    key = f"{asset.digest}-v{SUMMARY_VERSION}"
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    try:
+        summary = build_summary(*_extract_pdf_content(asset.raw()))
+    except Exception as e:
+        logger.warning("Brand CI extraction failed, attaching PDF instead: %s", e)
+        return None
+    if summary is None:
+        logger.info("Brand CI PDF has no extractable guidance; attaching PDF instead")
+        return None
+    cache.set(key, summary)
+    return summary
+
+
+def format_brand_ci_summary(summary):
+    """Render a summary dict as the text used in the prompt's brand CI section."""
+    lines = []
+    if summary.get("palette"):
+        lines.append(f"- Brand colors: {', '.join(summary['palette'])}")
+    if summary.get("typography"):
+        lines.append(f"- Typography: {', '.join(summary['typography'])}")
+    if summary.get("logo_rules"):
+        lines.append("- Logo rules:")
+        lines.extend(f"  - {rule}" for rule in summary["logo_rules"])
+    if summary.get("excerpts"):
+        lines.append("- Guidelines:")
+        lines.extend(f"  - {excerpt}" for excerpt in summary["excerpts"])
+    return "\n".join(lines)
@@ -0,0 +1,73 @@
+"""
+Campaign matrix planning: reference images x segments x aspect ratios.
+
+A campaign submission lists several reference images, segments and
+aspect ratios. plan_cells expands that into generation cells and drops
+duplicates before anything is generated:
+
+- identical reference images (same content digest) are kept once, so each
+  asset is stored and uploaded once;
+- "auto" is resolved from the image header (as the preflight would), so
+  "auto" and the ratio it resolves to for that image become one cell.
+
+Each surviving cell is one (reference, segment, aspect ratio) generation;
+the job runner builds the prompts per (reference, aspect ratio) group with
+build_prompts_for_segments and runs every cell through one worker pool.
+"""
+
+import os
+
+from .image_preflight import probe_aspect_ratio
+
+MAX_CAMPAIGN_REFERENCES = int(os.environ.get("CAMPAIGN_MAX_REFERENCES", "5"))
+MAX_CAMPAIGN_CELLS = int(os.environ.get("CAMPAIGN_MAX_CELLS", "120"))
+DEFAULT_CAMPAIGN_CONCURRENCY = int(os.environ.get("CAMPAIGN_CONCURRENCY", "8"))
+MAX_CAMPAIGN_CONCURRENCY = 16
+
+
+def plan_cells(references, segment_ids, aspect_ratios, resolve_auto=True):
+    """
+    Expand a campaign into unique generation cells.
+
+    Args:
+        references: List of reference image MediaAssets, in request order.
+        segment_ids: Segment IDs to generate for every reference.
+        aspect_ratios: Requested aspect ratios (may include "auto").
+        resolve_auto: Resolve "auto" per image (preflight enabled).
+
+    Returns:
+        (unique_references, cells, duplicates) where unique_references are
+        the distinct MediaAssets, cells is a list of dicts with reference
+        (index into unique_references), segment_id and aspect_ratio, and
+        duplicates lists the dropped requests as dicts with reference
+        (request index), segment_id, aspect_ratio and same_as (cell index).
+    """
+    unique_references = []
+    reference_index = {}  # digest -> index in unique_references
+    cells = []
+    cell_index = {}  # (reference, segment_id, aspect_ratio) -> cell index
+    duplicates = []
+
+    for request_index, asset in enumerate(references):
+        digest = asset.digest
+        if digest not in reference_index:
+            reference_index[digest] = len(unique_references)
+            unique_references.append(asset)
+        ref = reference_index[digest]
+
+        for requested in aspect_ratios:
+            resolved = probe_aspect_ratio(asset, requested) if resolve_auto else requested
+            for segment_id in segment_ids:
+                key = (ref, segment_id, resolved)
+                if key in cell_index:
+                    duplicates.append({
+                        "reference": request_index,
+                        "segment_id": segment_id,
+                        "aspect_ratio": requested,
+                        "same_as": cell_index[key],
+                    })
+                    continue
+                cell_index[key] = len(cells)
+                cells.append({"reference": ref, "segment_id": segment_id, "aspect_ratio": resolved})
+
+    return unique_references, cells, duplicates
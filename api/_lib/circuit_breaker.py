@@ -0,0 +1,215 @@
+"""
+Circuit breaker for the Gemini API.
+
+During an outage every call would otherwise wait for its full timeout. The
+breaker watches a rolling window of upstream calls and trips when too
+many fail (5xx, timeouts, connection errors) or are too slow:
+
+- closed: calls flow; outcomes are recorded in the window.
+- open: calls are rejected immediately for GEMINI_CIRCUIT_OPEN_SECONDS.
+- half_open: after that, a few probe calls are let through; a healthy
+  probe closes the circuit, a failed one re-opens it.
+
+Client errors (4xx such as safety blocks or bad requests) and 429s say
+nothing about Gemini's health and are not counted as failures.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CIRCUIT_WINDOW_SECONDS = float(os.environ.get("GEMINI_CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_MIN_CALLS = int(os.environ.get("GEMINI_CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_ERROR_RATE = float(os.environ.get("GEMINI_CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get("GEMINI_CIRCUIT_SLOW_CALL_SECONDS", "60"))
+CIRCUIT_SLOW_CALL_RATE = float(os.environ.get("GEMINI_CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("GEMINI_CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("GEMINI_CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+# Statuses that indicate an unhealthy service; the Gemini client maps
+# connection failures to 502 and timeouts to 504
+FAILURE_STATUS_CODES = {500, 502, 503, 504}
+
+
+def is_failure_status(status_code):
+    """Return True if an upstream status should count against the circuit."""
+    return status_code in FAILURE_STATUS_CODES
+
+
+class CircuitOpenError(Exception):
+    """Raised by allow() when the circuit is rejecting calls."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one upstream dependency."""
+
+    def __init__(
+        self,
+        name,
+        window_seconds=CIRCUIT_WINDOW_SECONDS,
+        min_calls=CIRCUIT_MIN_CALLS,
+        error_rate=CIRCUIT_ERROR_RATE,
+        slow_call_seconds=CIRCUIT_SLOW_CALL_SECONDS,
+        slow_call_rate=CIRCUIT_SLOW_CALL_RATE,
+        open_seconds=CIRCUIT_OPEN_SECONDS,
+        half_open_probes=CIRCUIT_HALF_OPEN_PROBES,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._events = deque()  # (monotonic time, failed, slow)
+        self._stats = {"opened": 0, "rejected": 0, "last_open_reason": None}
+
+    def _prune(self, now):
+        cutoff = now - self.window_seconds
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+
+    def _open(self, now, reason):
+        self._state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._stats["opened"] += 1
+        self._stats["last_open_reason"] = reason
+        logger.error("Circuit %s opened: %s", self.name, reason)
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info("Circuit %s half-open; probing", self.name)
+        return self._state
+
+    def retry_after(self):
+        """Seconds until the circuit will let a probe through (0 if not open)."""
+        with self._lock:
+            if self._current_state(time.monotonic()) != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self):
+        """
+        Reserve permission for one upstream call.
+
+        Every allowed call must be followed by record() (or cancel(), if
+        it was abandoned).
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all
+                probe slots taken.
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return
+            self._stats["rejected"] += 1
+            reason = self._stats["last_open_reason"]
+            if state == OPEN:
+                retry_after = max(0.0, self.open_seconds - (now - self._opened_at))
+            else:
+                retry_after = self.open_seconds
+        raise CircuitOpenError(
+            f"Gemini API circuit is {state}; failing fast ({reason})",
+            retry_after,
+        )
+
+    def record(self, failed, latency=None):
+        """
+        Record the outcome of an allowed call.
+
+        Args:
+            failed: Whether the call failed in a way that indicates an
+                unhealthy upstream (see is_failure_status).
+            latency: Seconds the call took.
+        """
+        slow = latency is not None and latency >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open(now, "probe call failed" if failed else "probe call was slow")
+                else:
+                    logger.info("Circuit %s closed after a healthy probe", self.name)
+                    self._state = CLOSED
+                    self._events.clear()
+                return
+            if state == OPEN:
+                return  # a call that started before the circuit opened
+
+            self._events.append((now, failed, slow))
+            self._prune(now)
+            calls = len(self._events)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._events if f)
+            slow_calls = sum(1 for _, _, s in self._events if s)
+            if failures / calls >= self.error_rate:
+                self._open(now, f"{failures}/{calls} calls failed in {self.window_seconds:.0f}s")
+            elif slow_calls / calls >= self.slow_call_rate:
+                self._open(
+                    now,
+                    f"{slow_calls}/{calls} calls slower than {self.slow_call_seconds:.0f}s",
+                )
+
+    def cancel(self):
+        """Release an allowed call that was abandoned before it had an outcome."""
+        with self._lock:
+            if self._current_state(time.monotonic()) == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self):
+        """Return the breaker state and rolling-window counters."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._events)
+            failures = sum(1 for _, f, _ in self._events if f)
+            slow_calls = sum(1 for _, _, s in self._events if s)
+            stats = dict(self._stats)
+            stats.update(
+                state=state,
+                window_calls=calls,
+                window_failures=failures,
+                window_slow_calls=slow_calls,
+                error_rate=round(failures / calls, 3) if calls else 0.0,
+                retry_after_seconds=(
+                    round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                    if state == OPEN else 0.0
+                ),
+            )
+        return stats
@@ -2,14 +2,40 @@
 CORS utility for Vercel serverless function handlers.
 
 Provides helpers to add CORS headers and handle preflight OPTIONS requests.
+Responses are counted in the request metrics (see metrics.py), and JSON
+responses carry a Server-Timing header when the handler collects timings.
+
+JSON responses carrying large strings (base64 images) are serialized
+incrementally and written in chunks instead of being built as one buffer,
+so the response never holds the JSON text and its encoded bytes next to
+the data (see send_json).
 """
 
+import json
+import os
+import time
+
+from .metrics import (
+    stage,
+    record_stage,
+    endpoint_name,
+    HTTP_REQUESTS,
+    HTTP_RESPONSE_BYTES,
+)
+
 # Allowed origins - '*' for development; restrict in production as needed.
 ALLOWED_ORIGIN = "*"
 ALLOWED_METHODS = "GET, POST, PUT, DELETE, OPTIONS"
-ALLOWED_HEADERS = "Content-Type, Authorization, X-Requested-With"
+ALLOWED_HEADERS = "Content-Type, Authorization, X-Requested-With, Range, If-None-Match"
 MAX_AGE = "86400"  # 24 hours
 
+# send_json streams responses whose strings of at least STREAM_STRING_BYTES
+# characters add up to STREAM_MIN_BYTES (0 = never stream)
+STREAM_MIN_BYTES = int(os.environ.get("JSON_STREAM_MIN_BYTES", str(1024 * 1024)))
+STREAM_STRING_BYTES = 64 * 1024
+# Size of each write (and chunk) while streaming
+STREAM_CHUNK_BYTES = 64 * 1024
+
 
 def add_cors_headers(handler_instance):
     """Add standard CORS headers to a BaseHTTPRequestHandler response."""
@@ -29,26 +55,181 @@ def handle_preflight(handler_instance):
     handler_instance.end_headers()
 
 
-def send_json(handler_instance, data, status_code=200):
+def _send_json_headers(handler_instance, status_code, headers):
+    handler_instance.send_response(status_code)
+    handler_instance.send_header("Content-Type", "application/json; charset=utf-8")
+    for key, value in (headers or {}).items():
+        handler_instance.send_header(key, value)
+    timings = getattr(handler_instance, "request_timings", None)
+    if timings is not None:
+        handler_instance.send_header("Server-Timing", timings.server_timing())
+    add_cors_headers(handler_instance)
+
+
+def send_json(handler_instance, data, status_code=200, headers=None):
     """
     Send a JSON response with CORS headers.
 
+    Small responses are encoded in one piece with a Content-Length. When
+    the strings of at least STREAM_STRING_BYTES characters add up to
+    STREAM_MIN_BYTES or more (e.g. several base64 images), the response is
+    streamed instead (see _stream_json).
+
     Args:
         handler_instance: The BaseHTTPRequestHandler instance.
         data: A JSON-serializable Python object.
         status_code: HTTP status code (default 200).
+        headers: Optional dict of extra response headers.
     """
-    import json
+    large_bytes, containers = _find_large_strings(data)
+    if STREAM_MIN_BYTES and large_bytes >= STREAM_MIN_BYTES:
+        _stream_json(handler_instance, data, containers, status_code, headers)
+        return
 
-    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
-    handler_instance.send_response(status_code)
-    handler_instance.send_header("Content-Type", "application/json; charset=utf-8")
-    add_cors_headers(handler_instance)
+    with stage("encode_response"):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    _send_json_headers(handler_instance, status_code, headers)
+    handler_instance.send_header("Content-Length", str(len(body)))
     handler_instance.end_headers()
+    write_start = time.perf_counter()
     handler_instance.wfile.write(body)
+    # Only reaches the histogram: the Server-Timing header is already sent
+    record_stage("write_response", time.perf_counter() - write_start)
+    endpoint = endpoint_name(handler_instance)
+    HTTP_REQUESTS.inc(1, endpoint, str(status_code))
+    HTTP_RESPONSE_BYTES.inc(len(body), endpoint)
+
+
+def _find_large_strings(data):
+    """
+    Find the strings worth streaming.
+
+    Returns:
+        (total characters in strings of at least STREAM_STRING_BYTES, set
+        of id()s of the dicts / lists that contain such a string at any
+        depth).
+    """
+    total = 0
+    containers = set()
+
+    def walk(value):
+        nonlocal total
+        if isinstance(value, str):
+            if len(value) >= STREAM_STRING_BYTES:
+                total += len(value)
+                return True
+            return False
+        if isinstance(value, dict):
+            children = value.values()
+        elif isinstance(value, (list, tuple)):
+            children = value
+        else:
+            return False
+        found = False
+        for child in children:
+            if walk(child):
+                found = True
+        if found:
+            containers.add(id(value))
+        return found
 
+    walk(data)
+    return total, containers
 
-def send_error(handler_instance, message, status_code=400, details=None):
+
+def _iter_json(value, containers):
+    """
+    Yield the JSON text of value in pieces.
+
+    Containers holding a large string are walked; a large string is
+    escaped a slice at a time; everything else is dumped whole.
+    """
+    if isinstance(value, str) and len(value) >= STREAM_STRING_BYTES:
+        yield '"'
+        for start in range(0, len(value), STREAM_CHUNK_BYTES):
+            # Slices split on code points, so each escapes independently
+            yield json.dumps(value[start:start + STREAM_CHUNK_BYTES], ensure_ascii=False)[1:-1]
+        yield '"'
+    elif id(value) in containers and isinstance(value, dict):
+        yield "{"
+        for index, (key, item) in enumerate(value.items()):
+            prefix = ", " if index else ""
+            if not isinstance(key, str):
+                key = json.dumps(key)  # as json.dumps converts keys: 1 -> "1", True -> "true"
+            yield f"{prefix}{json.dumps(key, ensure_ascii=False)}: "
+            yield from _iter_json(item, containers)
+        yield "}"
+    elif id(value) in containers:
+        yield "["
+        for index, item in enumerate(value):
+            if index:
+                yield ", "
+            yield from _iter_json(item, containers)
+        yield "]"
+    else:
+        yield json.dumps(value, ensure_ascii=False)
+
+
+def _stream_json(handler_instance, data, containers, status_code, headers):
+    """
+    Write a JSON response as it is serialized, STREAM_CHUNK_BYTES at a time.
+
+    Uses chunked transfer encoding when the handler speaks HTTP/1.1 to an
+    HTTP/1.1 client; otherwise the body is delimited by closing the
+    connection, as for start_stream.
+    """
+    chunked = (
+        getattr(handler_instance, "protocol_version", "HTTP/1.0") >= "HTTP/1.1"
+        and getattr(handler_instance, "request_version", "HTTP/1.1") >= "HTTP/1.1"
+    )
+    _send_json_headers(handler_instance, status_code, headers)
+    if chunked:
+        handler_instance.send_header("Transfer-Encoding", "chunked")
+    else:
+        handler_instance.send_header("Connection", "close")
+        handler_instance.close_connection = True
+    handler_instance.end_headers()
+
+    wfile = handler_instance.wfile
+    sent = 0
+    write_seconds = 0.0
+    stream_start = time.perf_counter()
+
+    def write(text):
+        nonlocal sent, write_seconds
+        payload = text.encode("utf-8")
+        write_start = time.perf_counter()
+        if chunked:
+            wfile.write(b"%x\r\n%b\r\n" % (len(payload), payload))
+        else:
+            wfile.write(payload)
+        write_seconds += time.perf_counter() - write_start
+        sent += len(payload)
+
+    pending = []
+    pending_size = 0
+    for piece in _iter_json(data, containers):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= STREAM_CHUNK_BYTES:
+            write("".join(pending))
+            pending = []
+            pending_size = 0
+    if pending:
+        write("".join(pending))
+    if chunked:
+        write_start = time.perf_counter()
+        wfile.write(b"0\r\n\r\n")
+        write_seconds += time.perf_counter() - write_start
+
+    record_stage("encode_response", time.perf_counter() - stream_start - write_seconds)
+    record_stage("write_response", write_seconds)
+    endpoint = endpoint_name(handler_instance)
+    HTTP_REQUESTS.inc(1, endpoint, str(status_code))
+    HTTP_RESPONSE_BYTES.inc(sent, endpoint)
+
+
+def send_error(handler_instance, message, status_code=400, details=None, headers=None):
     """
     Send a JSON error response with CORS headers.
 
@@ -57,8 +238,68 @@ def send_error(handler_instance, message, status_code=400, details=None):
         message: Human-readable error message.
         status_code: HTTP status code (default 400).
         details: Optional additional error details.
+        headers: Optional dict of extra response headers.
     """
     payload = {"error": message}
     if details is not None:
         payload["details"] = details
-    send_json(handler_instance, payload, status_code)
+    send_json(handler_instance, payload, status_code, headers=headers)
+
+
+# Streaming response formats
+STREAM_NDJSON = "ndjson"
+STREAM_SSE = "sse"
+STREAM_CONTENT_TYPES = {
+    STREAM_NDJSON: "application/x-ndjson; charset=utf-8",
+    STREAM_SSE: "text/event-stream; charset=utf-8",
+}
+
+
+def start_stream(handler_instance, stream_format, status_code=200):
+    """
+    Send the headers for a streamed (NDJSON or SSE) response with CORS headers.
+
+    The body length is not known up front, so the connection is closed once
+    the stream ends to delimit it.
+
+    Args:
+        handler_instance: The BaseHTTPRequestHandler instance.
+        stream_format: STREAM_NDJSON or STREAM_SSE.
+        status_code: HTTP status code (default 200).
+    """
+    handler_instance.send_response(status_code)
+    handler_instance.send_header("Content-Type", STREAM_CONTENT_TYPES[stream_format])
+    handler_instance.send_header("Cache-Control", "no-cache")
+    handler_instance.send_header("X-Accel-Buffering", "no")
+    handler_instance.send_header("Connection", "close")
+    add_cors_headers(handler_instance)
+    handler_instance.end_headers()
+    handler_instance.close_connection = True
+    HTTP_REQUESTS.inc(1, endpoint_name(handler_instance), str(status_code))
+
+
+def send_stream_event(handler_instance, stream_format, event, data):
+    """
+    Write a single event to a response opened with start_stream and flush it.
+
+    NDJSON events are written as one {"event": ..., "data": ...} object per
+    line; SSE events use the "event:" / "data:" fields.
+
+    Args:
+        handler_instance: The BaseHTTPRequestHandler instance.
+        stream_format: STREAM_NDJSON or STREAM_SSE.
+        event: Event name (e.g. "result", "summary").
+        data: A JSON-serializable Python object.
+    """
+    if stream_format == STREAM_SSE:
+        payload = json.dumps(data, ensure_ascii=False)
+        chunk = f"event: {event}\ndata: {payload}\n\n"
+    else:
+        chunk = json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+    encoded = chunk.encode("utf-8")
+    handler_instance.wfile.write(encoded)
+    HTTP_RESPONSE_BYTES.inc(len(encoded), endpoint_name(handler_instance))
+    flush = getattr(handler_instance.wfile, "flush", None)
+    if flush is not None:
+        flush()
@@ -0,0 +1,82 @@
+"""
+Process-wide asyncio event loop for the async generation engine.
+
+The API handlers are synchronous (one BaseHTTPRequestHandler per request
+thread), so async work runs on a single event loop in a background thread
+and handler threads consume its results through iterate_blocking. Every
+request's Gemini calls share that loop: a call waiting on the network
+costs a coroutine, not a thread.
+"""
+
+import asyncio
+import contextvars
+import queue
+import threading
+
+_default_loop = None
+_default_loop_lock = threading.Lock()
+
+
+def get_default_loop():
+    """Return the shared event loop, starting its thread on first use."""
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="event-loop", daemon=True
+            ).start()
+            _default_loop = loop
+        return _default_loop
+
+
+def iterate_blocking(agen_fn, *args):
+    """
+    Iterate an async generator from synchronous code.
+
+    agen_fn(*args) runs on the shared loop in a copy of the caller's
+    context (so stage timings reach the caller's request) and each item is
+    handed back to the calling thread as it is produced. Closing the
+    returned generator early (e.g. the client disconnected) cancels the
+    async side, including any upstream calls it has in flight.
+
+    Args:
+        agen_fn: Async generator function.
+        *args: Arguments for agen_fn.
+
+    Yields:
+        The items agen_fn yields; its exceptions are re-raised here.
+    """
+    loop = get_default_loop()
+    outcomes = queue.Queue()
+    finished = object()
+    started = threading.Event()
+    holder = {}
+
+    async def pump():
+        try:
+            async for item in agen_fn(*args):
+                outcomes.put((item, None))
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            outcomes.put((None, e))
+        else:
+            outcomes.put((finished, None))
+
+    def start():
+        holder["task"] = loop.create_task(pump())
+        started.set()
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    try:
+        while True:
+            item, error = outcomes.get()
+            if error is not None:
+                raise error
+            if item is finished:
+                return
+            yield item
+    finally:
+        started.wait()
+        loop.call_soon_threadsafe(holder["task"].cancel)
@@ -3,32 +3,138 @@ Google Gemini API client for image generation.
 
 Uses the Generative AI REST API with the gemini-2.0-flash-exp model
 which supports image generation via responseModalities.
+
+generate_image blocks its thread for the whole call; generate_image_async
+is the asyncio equivalent used by the async generation engine (see
+pipeline.GENERATE_ENGINE).
 """
 
+import asyncio
 import base64
+import hashlib
+import http.client
 import json
 import logging
 import os
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from .http_pool import get_pool, get_async_pool
+from .gemini_response import GeminiResponseParser, ResponseParseError
+from .retry import RetryPolicy, parse_retry_after
+from .rate_limiter import get_default_limiter, RateLimitTimeout
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, is_failure_status
+from .single_flight import SingleFlight
+from .metrics import (
+    stage,
+    record_stage,
+    run_in_context,
+    UPSTREAM_RESPONSES,
+    UPSTREAM_REQUEST_BYTES,
+    UPSTREAM_RESPONSE_BYTES,
+)
 
 logger = logging.getLogger(__name__)
 
 GEMINI_MODEL = "gemini-2.0-flash-exp"
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
 GENERATE_ENDPOINT = f"/v1beta/models/{GEMINI_MODEL}:generateContent"
 
 # Timeout for API calls in seconds
 REQUEST_TIMEOUT = 120
 
+# generationConfig sent with every generateContent call
+GENERATION_CONFIG = {
+    "responseModalities": ["IMAGE", "TEXT"],
+    "temperature": 0.8,
+    "topP": 0.95,
+}
+
+# Variants per call: "candidates" asks for several candidates in one call
+# (generationConfig.candidateCount) and tops up with parallel calls if the
+# model returns fewer; "parallel" always makes one call per variant
+MAX_VARIANTS = 4
+VARIANTS_MODE = os.environ.get("GEMINI_VARIANTS_MODE", "candidates")
+VARIANTS_MODES = {"candidates", "parallel"}
+# How long a candidateCount rejection is remembered before "candidates" mode
+# tries a multi-candidate call again (the model behind the endpoint may change)
+CANDIDATE_COUNT_RETRY_SECONDS = float(
+    os.environ.get("GEMINI_CANDIDATE_COUNT_RETRY_SECONDS", "3600")
+)
+
+# How reference assets reach Gemini: "inline" base64 parts in every call, or
+# "files" to upload each distinct asset once and reference it by URI
+UPLOAD_MODE = os.environ.get("GEMINI_UPLOAD_MODE", "inline")
+UPLOAD_MODES = {"inline", "files"}
+UPLOAD_ENDPOINT = "/upload/v1beta/files"
+
+# Context caching: the shared prompt prefix and reference assets are
+# registered once as cachedContents and segment calls send only their
+# suffix. Off by default; the model must support explicit caching
+CONTEXT_CACHE_ENABLED = os.environ.get("GEMINI_CONTEXT_CACHE", "0") in ("1", "true", "True")
+CONTEXT_CACHE_ENDPOINT = "/v1beta/cachedContents"
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+# Stop reusing a cached content this long before it expires; longer than
+# any request or job deadline so it cannot expire mid-request
+CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS = 1200
+
+# Treat uploaded files as expired this long before Gemini's expirationTime
+FILE_EXPIRY_MARGIN_SECONDS = 600
+# Used when an upload response carries no expirationTime (Gemini keeps 48h)
+DEFAULT_FILE_TTL_SECONDS = 47 * 3600
+
+# Finish reasons meaning the output was withheld by a content filter; the
+# same input would be refused again, so these are reported as 422 and never
+# retried
+SAFETY_FINISH_REASONS = {"SAFETY", "IMAGE_SAFETY", "PROHIBITED_CONTENT", "BLOCKLIST", "SPII"}
+
+# Retries with backoff (and optional hedging) for generateContent calls;
+# tuned through the GEMINI_RETRY_* / GEMINI_HEDGE_* environment variables
+GENERATE_RETRY_POLICY = RetryPolicy()
+
+# Trips after repeated upstream failures so calls fail fast during outages;
+# tuned through the GEMINI_CIRCUIT_* environment variables
+GEMINI_CIRCUIT = CircuitBreaker("gemini")
+
+# Identical generations in flight at the same time share one upstream call
+# (keyed by the pipeline like the result cache)
+GENERATE_FLIGHTS = SingleFlight("generate")
+
+# Keep-alive connection pool settings
+POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "10"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("GEMINI_POOL_IDLE_SECONDS", "60"))
+
 
 class GeminiClientError(Exception):
     """Raised when the Gemini API returns an error or is unreachable."""
 
-    def __init__(self, message, status_code=None, details=None):
+    def __init__(
+        self, message, status_code=None, details=None, retry_after=None, retryable=None,
+        upstream_status=None,
+    ):
+        """
+        Args:
+            message: Human-readable error message.
+            status_code: HTTP status to report (Gemini's status for API errors).
+            details: Optional extra error information.
+            retry_after: Seconds from the Retry-After header, if any.
+            retryable: Overrides the retry policy's status-code rules when
+                set (e.g. a missing API key is never worth retrying).
+            upstream_status: error.status from a Gemini error body (e.g.
+                "INVALID_ARGUMENT"), if any.
+        """
         super().__init__(message)
         self.status_code = status_code
         self.details = details
+        self.retry_after = retry_after
+        self.retryable = retryable
+        self.upstream_status = upstream_status
+        # Filled in by the retry policy when the call is given up on
+        self.attempts = None
 
 
 def _get_api_key():
@@ -38,11 +144,507 @@ def _get_api_key():
         raise GeminiClientError(
             "GOOGLE_AI_STUDIO_API_KEY environment variable is not set.",
             status_code=500,
+            retryable=False,
         )
     return key
 
 
-def _build_request_body(prompt, reference_image_base64, reference_image_mime, brand_ci_base64=None):
+def _get_pool():
+    """Return the shared keep-alive connection pool for the Gemini API."""
+    return get_pool(GEMINI_BASE_URL, max_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT)
+
+
+def get_pool_stats():
+    """Return connection pool statistics (reuse counts, idle/in-use connections)."""
+    return _get_pool().stats()
+
+
+def get_rate_limiter_stats():
+    """Return the shared rate limiter's current limits and queue wait times."""
+    return get_default_limiter().stats()
+
+
+def get_circuit_stats():
+    """Return the Gemini circuit breaker state and rolling-window counters."""
+    return GEMINI_CIRCUIT.stats()
+
+
+def get_coalescing_stats():
+    """Return counters for generations that shared an identical in-flight call."""
+    return GENERATE_FLIGHTS.stats()
+
+
+def circuit_retry_after():
+    """Return seconds until the Gemini circuit accepts calls again (0 = now)."""
+    return GEMINI_CIRCUIT.retry_after()
+
+
+def get_retry_stats():
+    """Return retry policy settings and observed generateContent latencies."""
+    return GENERATE_RETRY_POLICY.stats()
+
+
+def _extract_error(error_body):
+    """
+    Pull the human-readable message and the status name (e.g.
+    "INVALID_ARGUMENT", or None) out of a Gemini error response body.
+    """
+    text = error_body.decode("utf-8", errors="replace")
+    try:
+        error = json.loads(text).get("error", {})
+        return error.get("message", text), error.get("status")
+    except Exception:
+        return text, None
+
+
+def _prepare_send(path, body_bytes, headers, with_key):
+    """Add the API key and a Content-Length for chunked bodies; count bytes sent."""
+    if with_key:
+        separator = "&" if "?" in path else "?"
+        path = f"{path}{separator}key={_get_api_key()}"
+
+    if isinstance(body_bytes, list):
+        headers = dict(headers)
+        headers["Content-Length"] = str(sum(len(chunk) for chunk in body_bytes))
+        UPSTREAM_REQUEST_BYTES.inc(int(headers["Content-Length"]))
+    else:
+        UPSTREAM_REQUEST_BYTES.inc(len(body_bytes))
+    return path, headers
+
+
+def _transport_error(error, timeout, request_start):
+    """Map an exception raised by a pool request to a GeminiClientError."""
+    if isinstance(error, TimeoutError):
+        record_stage("upstream", time.perf_counter() - request_start)
+        UPSTREAM_RESPONSES.inc(1, "timeout")
+        logger.error("Gemini API request timed out after %.1fs", timeout)
+        return GeminiClientError(
+            "Gemini API request timed out.",
+            status_code=504,
+        )
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        record_stage("upstream", time.perf_counter() - request_start)
+        UPSTREAM_RESPONSES.inc(1, "connection_error")
+        logger.error("Gemini API connection error: %s", error)
+        return GeminiClientError(
+            f"Failed to connect to Gemini API: {error}",
+            status_code=502,
+        )
+    UPSTREAM_RESPONSES.inc(1, "error")
+    logger.error("Unexpected error calling Gemini API: %s", str(error))
+    return GeminiClientError(
+        f"Unexpected error: {str(error)}",
+        status_code=500,
+        retryable=False,
+    )
+
+
+def _check_response(status, response_headers, response_body, request_start):
+    """Record a completed upstream exchange; raise GeminiClientError for 4xx/5xx."""
+    record_stage("upstream", time.perf_counter() - request_start)
+    UPSTREAM_RESPONSES.inc(1, str(status))
+    if response_body is not None:
+        UPSTREAM_RESPONSE_BYTES.inc(len(response_body))
+
+    if status >= 400:
+        error_message, upstream_status = _extract_error(response_body)
+        error_message = error_message or f"HTTP {status}"
+        logger.error("Gemini API HTTP error %d: %s", status, error_message)
+        raise GeminiClientError(
+            f"Gemini API error: {error_message}",
+            status_code=status,
+            details=error_message,
+            retry_after=parse_retry_after(response_headers.get("Retry-After")),
+            upstream_status=upstream_status,
+        )
+
+    return response_headers, response_body
+
+
+def _send(
+    path,
+    body_bytes,
+    headers,
+    timeout=REQUEST_TIMEOUT,
+    base_url=None,
+    with_key=True,
+    stream_to=None,
+):
+    """
+    Send a POST request to the Gemini API over a pooled connection.
+
+    Args:
+        path: Request path, optionally with a query string.
+        body_bytes: Request body bytes, or a list of bytes chunks (sent
+            back to back without being joined).
+        headers: Dict of request headers.
+        timeout: Socket timeout in seconds.
+        base_url: Origin to send to (defaults to GEMINI_BASE_URL).
+        with_key: Whether to append the API key query parameter.
+        stream_to: Optional body callback factory (see
+            ConnectionPool.request); response_body is None when it took
+            the body.
+
+    Returns:
+        (response_headers, response_body) for a 2xx/3xx response.
+
+    Raises:
+        GeminiClientError: On HTTP errors, timeouts or connection failures.
+    """
+    path, headers = _prepare_send(path, body_bytes, headers, with_key)
+
+    if base_url is None or base_url == GEMINI_BASE_URL:
+        pool = _get_pool()
+    else:
+        pool = get_pool(base_url, max_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT)
+
+    request_start = time.perf_counter()
+    try:
+        status, response_headers, response_body = pool.request(
+            "POST",
+            path,
+            body=body_bytes,
+            headers=headers,
+            timeout=timeout,
+            stream_to=stream_to,
+        )
+    except Exception as e:
+        raise _transport_error(e, timeout, request_start)
+    return _check_response(status, response_headers, response_body, request_start)
+
+
+async def _send_async(path, body_bytes, headers, timeout=REQUEST_TIMEOUT, stream_to=None):
+    """
+    _send for coroutines, over the running event loop's connection pool.
+
+    Cancelling the caller abandons the request and closes its connection.
+    """
+    path, headers = _prepare_send(path, body_bytes, headers, with_key=True)
+    pool = get_async_pool(GEMINI_BASE_URL, max_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT)
+
+    request_start = time.perf_counter()
+    try:
+        status, response_headers, response_body = await pool.request(
+            "POST",
+            path,
+            body=body_bytes,
+            headers=headers,
+            timeout=timeout,
+            stream_to=stream_to,
+        )
+    except Exception as e:
+        raise _transport_error(e, timeout, request_start)
+    return _check_response(status, response_headers, response_body, request_start)
+
+
+def _parse_json(response_body):
+    """Decode a Gemini JSON response body, mapping bad JSON to a 502."""
+    try:
+        with stage("decode_response"):
+            return json.loads(response_body)
+    except ValueError as e:
+        logger.error("Invalid JSON from Gemini API: %s", e)
+        raise GeminiClientError(
+            "Invalid JSON response from Gemini API.",
+            status_code=502,
+        )
+
+
+def _response_parser():
+    """
+    Return (stream_to, close) for parsing a generateContent response as it arrives.
+
+    stream_to hands successful response bodies to a fresh
+    GeminiResponseParser (error bodies stay buffered for their message);
+    close() finishes the parse like _parse_json would, returning the kept
+    fields and mapping bad JSON to a 502.
+    """
+    parsers = []
+
+    def stream_to(status):
+        if status >= 400:
+            return None
+        parser = GeminiResponseParser()
+        parsers.append(parser)
+        return parser.feed
+
+    def close():
+        parser = parsers[-1]
+        UPSTREAM_RESPONSE_BYTES.inc(parser.bytes_received)
+        try:
+            return parser.close()
+        except ResponseParseError as e:
+            logger.error("Invalid JSON from Gemini API: %s", e)
+            raise GeminiClientError(
+                "Invalid JSON response from Gemini API.",
+                status_code=502,
+            )
+        finally:
+            # Parsing overlaps the upstream read, so this is also in "upstream"
+            record_stage("decode_response", parser.seconds)
+
+    return stream_to, close
+
+
+def _post_json(path, body_bytes, timeout=REQUEST_TIMEOUT):
+    """
+    POST a JSON body to the Gemini API and return the parsed JSON response.
+
+    Raises:
+        GeminiClientError: On HTTP errors, timeouts or connection failures.
+    """
+    _, response_body = _send(
+        path, body_bytes, {"Content-Type": "application/json"}, timeout=timeout
+    )
+    return _parse_json(response_body)
+
+
+# content digest -> {"uri", "mime_type", "expires_at"} for uploaded assets
+_uploaded_files = {}
+_uploaded_files_lock = threading.Lock()
+
+
+def _parse_expiration(expiration_time, default_ttl=DEFAULT_FILE_TTL_SECONDS):
+    """Convert an RFC 3339 expirationTime into a time.time() timestamp."""
+    if not expiration_time:
+        return time.time() + default_ttl
+    # Trim nanosecond precision, which datetime.fromisoformat rejects
+    normalized = re.sub(r"(\.\d{6})\d+", r"\1", expiration_time).replace("Z", "+00:00")
+    try:
+        return datetime.fromisoformat(normalized).timestamp()
+    except ValueError:
+        return time.time() + default_ttl
+
+
+def upload_file(data, mime_type, display_name=None, timeout=REQUEST_TIMEOUT):
+    """
+    Upload raw bytes through the Gemini Files API (resumable protocol).
+
+    Args:
+        data: Raw file bytes.
+        mime_type: MIME type of the file.
+        display_name: Optional human-readable name.
+        timeout: Socket timeout in seconds for each call.
+
+    Returns:
+        The "file" dict from the API (uri, name, mimeType, expirationTime, ...).
+
+    Raises:
+        GeminiClientError: If either upload step fails.
+    """
+    metadata = {"file": {"display_name": display_name or "creative-studio-asset"}}
+    start_headers, _ = _send(
+        UPLOAD_ENDPOINT,
+        json.dumps(metadata).encode("utf-8"),
+        {
+            "Content-Type": "application/json",
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(len(data)),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        },
+        timeout=timeout,
+    )
+
+    upload_url = start_headers.get("X-Goog-Upload-URL")
+    if not upload_url:
+        raise GeminiClientError(
+            "Gemini upload did not return an upload URL.",
+            status_code=502,
+        )
+
+    parts = urlsplit(upload_url)
+    upload_path = parts.path + (f"?{parts.query}" if parts.query else "")
+    _, response_body = _send(
+        upload_path,
+        data,
+        {
+            "Content-Length": str(len(data)),
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        },
+        timeout=timeout,
+        base_url=f"{parts.scheme}://{parts.netloc}",
+        with_key=False,
+    )
+
+    file_info = _parse_json(response_body).get("file", {})
+    if not file_info.get("uri") or file_info.get("state") == "FAILED":
+        raise GeminiClientError(
+            "Gemini upload did not produce a usable file.",
+            status_code=502,
+            details=file_info,
+        )
+    return file_info
+
+
+def ensure_file_uri(asset, timeout=REQUEST_TIMEOUT):
+    """
+    Return a Files API URI for an asset, uploading it only if needed.
+
+    URIs are remembered per content digest until shortly before they
+    expire. Upload failures are logged and return None so callers fall back
+    to inline data.
+
+    Args:
+        asset: MediaAsset to upload.
+        timeout: Socket timeout in seconds for the upload.
+
+    Returns:
+        The file URI, or None if the upload failed.
+    """
+    digest = asset.digest
+    now = time.time()
+    with _uploaded_files_lock:
+        known = _uploaded_files.get(digest)
+        if known and known["expires_at"] - FILE_EXPIRY_MARGIN_SECONDS > now:
+            return known["uri"]
+
+    try:
+        file_info = upload_file(
+            asset.raw(), asset.mime_type, display_name=digest[:16], timeout=timeout
+        )
+    except (GeminiClientError, ValueError) as e:
+        logger.warning("Falling back to inline data; asset upload failed: %s", e)
+        return None
+
+    with _uploaded_files_lock:
+        _uploaded_files[digest] = {
+            "uri": file_info["uri"],
+            "mime_type": file_info.get("mimeType", asset.mime_type),
+            "expires_at": _parse_expiration(file_info.get("expirationTime")),
+        }
+        # Drop expired entries so the map does not grow without bound
+        for stale in [d for d, f in _uploaded_files.items() if f["expires_at"] <= now]:
+            del _uploaded_files[stale]
+    return file_info["uri"]
+
+
+# prefix + asset digests -> {"name", "expires_at"} for cached contents
+_cached_contents = {}
+_cached_contents_lock = threading.Lock()
+
+
+def create_cached_content(prefix, reference_image, brand_ci=None, reference_file_uri=None,
+                          brand_ci_file_uri=None, ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+                          timeout=REQUEST_TIMEOUT):
+    """
+    Register a prompt prefix and its assets with the context caching API.
+
+    Args:
+        prefix: Shared prompt prefix (see prompt_builder.build_prompt_prefix).
+        reference_image: MediaAsset for the reference image.
+        brand_ci: Optional MediaAsset for the brand CI PDF.
+        reference_file_uri: Optional Files API URI used instead of inline
+            reference image data.
+        brand_ci_file_uri: Optional Files API URI used instead of inline
+            brand CI data.
+        ttl_seconds: How long Gemini keeps the cached content.
+        timeout: Socket timeout in seconds.
+
+    Returns:
+        The cachedContent dict from the API (name, expireTime, usageMetadata, ...).
+
+    Raises:
+        GeminiClientError: If the API rejects the request (e.g. the model
+            does not support caching or the content is below its minimum
+            size).
+    """
+    parts = [
+        {"text": prefix},
+        _media_part(
+            reference_image.mime_type,
+            None if reference_file_uri else reference_image.base64(),
+            reference_file_uri,
+        ),
+    ]
+    if brand_ci is not None:
+        parts.append(_media_part(
+            "application/pdf",
+            None if brand_ci_file_uri else brand_ci.base64(),
+            brand_ci_file_uri,
+        ))
+    body = {
+        "model": f"models/{GEMINI_MODEL}",
+        "contents": [{"role": "user", "parts": parts}],
+        "ttl": f"{ttl_seconds}s",
+    }
+    cached = _post_json(CONTEXT_CACHE_ENDPOINT, json.dumps(body).encode("utf-8"), timeout=timeout)
+    if not cached.get("name"):
+        raise GeminiClientError(
+            "Gemini context cache did not return a name.",
+            status_code=502,
+            details=cached,
+        )
+    return cached
+
+
+def ensure_cached_content(prefix, reference_image, brand_ci=None, reference_file_uri=None,
+                          brand_ci_file_uri=None, timeout=REQUEST_TIMEOUT):
+    """
+    Return a cachedContents name for a prompt prefix and its assets,
+    creating it only if needed.
+
+    Names are remembered per prefix and asset digest until shortly before
+    they expire, so requests repeating the same reference image and brand CI
+    share one cached content. Failures are logged and return None so callers
+    fall back to sending the full prompt and assets.
+
+    Returns:
+        The cached content name (e.g. "cachedContents/abc"), or None.
+    """
+    key = hashlib.sha256(
+        "\0".join([
+            GEMINI_MODEL,
+            prefix,
+            reference_image.digest,
+            brand_ci.digest if brand_ci is not None else "",
+        ]).encode("utf-8")
+    ).hexdigest()
+    now = time.time()
+    with _cached_contents_lock:
+        known = _cached_contents.get(key)
+        if known and known["expires_at"] - CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS > now:
+            return known["name"]
+
+    try:
+        cached = create_cached_content(
+            prefix,
+            reference_image,
+            brand_ci,
+            reference_file_uri=reference_file_uri,
+            brand_ci_file_uri=brand_ci_file_uri,
+            timeout=timeout,
+        )
+    except (GeminiClientError, ValueError) as e:
+        logger.warning("Context cache unavailable, sending full prompts: %s", e)
+        return None
+
+    with _cached_contents_lock:
+        _cached_contents[key] = {
+            "name": cached["name"],
+            "expires_at": _parse_expiration(cached.get("expireTime"), CONTEXT_CACHE_TTL_SECONDS),
+        }
+        for stale in [k for k, c in _cached_contents.items() if c["expires_at"] <= now]:
+            del _cached_contents[stale]
+    return cached["name"]
+
+
+def _media_part(mime_type, data_base64=None, file_uri=None):
+    """Build a request part referencing an uploaded file or carrying inline data."""
+    if file_uri:
+        return {"file_data": {"mime_type": mime_type, "file_uri": file_uri}}
+    return {"inline_data": {"mime_type": mime_type, "data": data_base64}}
+
+
+def _build_request_body(
+    prompt,
+    reference_image_base64,
+    reference_image_mime,
+    brand_ci_base64=None,
+    reference_file_uri=None,
+    brand_ci_file_uri=None,
+):
     """
     Build the Gemini API request body.
 
@@ -51,30 +653,22 @@ def _build_request_body(prompt, reference_image_base64, reference_image_mime, br
         reference_image_base64: Base64-encoded reference image data.
         reference_image_mime: MIME type of the reference image.
         brand_ci_base64: Optional base64-encoded brand CI PDF.
+        reference_file_uri: Optional Files API URI used instead of inline
+            reference image data.
+        brand_ci_file_uri: Optional Files API URI used instead of inline
+            brand CI data.
 
     Returns:
         Dict representing the JSON request body.
     """
     parts = [
         {"text": prompt},
-        {
-            "inline_data": {
-                "mime_type": reference_image_mime,
-                "data": reference_image_base64,
-            }
-        },
+        _media_part(reference_image_mime, reference_image_base64, reference_file_uri),
     ]
 
     # If brand CI PDF is provided, include it as an additional part
-    if brand_ci_base64:
-        parts.append(
-            {
-                "inline_data": {
-                    "mime_type": "application/pdf",
-                    "data": brand_ci_base64,
-                }
-            }
-        )
+    if brand_ci_base64 or brand_ci_file_uri:
+        parts.append(_media_part("application/pdf", brand_ci_base64, brand_ci_file_uri))
 
     return {
         "contents": [
@@ -82,29 +676,139 @@ def _build_request_body(prompt, reference_image_base64, reference_image_mime, br
                 "parts": parts,
             }
         ],
-        "generationConfig": {
-            "responseModalities": ["IMAGE", "TEXT"],
-            "temperature": 0.8,
-            "topP": 0.95,
-        },
+        "generationConfig": dict(GENERATION_CONFIG),
     }
 
 
+# Characters that never need escaping inside a JSON string (base64 / base64url)
+_JSON_SAFE_BASE64 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_"
+
+
+def _json_string_chunks(value):
+    """
+    Encode a string as a JSON string literal, returned as bytes chunks.
+
+    Clean base64 is copied once into bytes without escaping; anything else
+    goes through json.dumps.
+    """
+    if value.isascii():
+        encoded = value.encode("ascii")
+        if not encoded.translate(None, _JSON_SAFE_BASE64):
+            return [b'"', encoded, b'"']
+    return [json.dumps(value).encode("utf-8")]
+
+
+def _media_part_chunks(asset, file_uri=None):
+    """
+    Serialize the _media_part() for a MediaAsset to bytes chunks.
+
+    Raw bytes are base64-encoded straight into the chunk; base64 input is
+    copied without re-escaping when it is clean.
+    """
+    if file_uri:
+        return [json.dumps(_media_part(asset.mime_type, file_uri=file_uri)).encode("utf-8")]
+    if asset.data is not None:
+        data_chunks = [b'"', base64.b64encode(asset.data), b'"']
+    else:
+        data_chunks = _json_string_chunks(asset.data_base64)
+    return [
+        b'{"inline_data": {"mime_type": ',
+        json.dumps(asset.mime_type).encode("utf-8"),
+        b', "data": ',
+        *data_chunks,
+        b"}}",
+    ]
+
+
+class RequestBodyTemplate:
+    """
+    Pre-serialized generateContent body for calls that share reference assets.
+
+    The media parts (multi-megabyte base64 data, or file URIs) are encoded
+    once; render() only serializes the per-segment prompt and generationConfig
+    and returns a list of byte chunks, sharing the encoded media, that can be
+    written to the socket as-is. The joined chunks are identical to
+    json.dumps(_build_request_body(...)).encode("utf-8").
+
+    With cached_content the assets are not sent at all: the body names the
+    cached content (see ensure_cached_content) and carries only the prompt,
+    which should then be just the segment suffix.
+    """
+
+    def __init__(self, reference_image, brand_ci=None, reference_file_uri=None, brand_ci_file_uri=None,
+                 cached_content=None):
+        """
+        Args:
+            reference_image: MediaAsset for the reference image.
+            brand_ci: Optional MediaAsset for the brand CI PDF.
+            reference_file_uri: Optional Files API URI used instead of
+                inline reference image data.
+            brand_ci_file_uri: Optional Files API URI used instead of inline
+                brand CI data.
+            cached_content: Optional cachedContents name holding the prompt
+                prefix and the assets above.
+        """
+        self.cached_content = cached_content
+        if cached_content:
+            media = [
+                b'}]}], "cachedContent": ',
+                json.dumps(cached_content).encode("utf-8"),
+                b', "generationConfig": ',
+            ]
+        else:
+            media = [b"}, "]
+            media.extend(_media_part_chunks(reference_image, reference_file_uri))
+            if brand_ci is not None:
+                media.append(b", ")
+                media.extend(_media_part_chunks(brand_ci, brand_ci_file_uri))
+            media.append(b']}], "generationConfig": ')
+
+        self._head = b'{"contents": [{"parts": [{"text": '
+        self._media = media
+        self._tail = b"}"
+
+    def render(self, prompt, generation_config=None):
+        """
+        Serialize the body for a single call.
+
+        Args:
+            prompt: The text prompt for this call.
+            generation_config: Optional generationConfig (defaults to
+                GENERATION_CONFIG).
+
+        Returns:
+            List of bytes chunks making up the JSON request body.
+        """
+        config = GENERATION_CONFIG if generation_config is None else generation_config
+        return [
+            self._head,
+            json.dumps(prompt).encode("utf-8"),
+            *self._media,
+            json.dumps(config).encode("utf-8"),
+            self._tail,
+        ]
+
+
 def _parse_response(response_data):
     """
     Parse the Gemini API response and extract generated image data.
 
+    Every candidate carrying an image is returned: the first one at the top
+    level, any others under additional_variants.
+
     Args:
         response_data: Parsed JSON response from the API.
 
     Returns:
-        Dict with 'image_base64', 'image_mime', and optionally 'text'.
+        Dict with 'image_base64', 'image_mime', optionally 'text', 'usage'
+        (see _parse_usage) and 'additional_variants' (list of dicts with the
+        image keys) when more than one candidate has an image.
 
     Raises:
-        GeminiClientError: If no image is found in the response.
+        GeminiClientError: If no image is found in the response: 422 (not
+            retryable) when the prompt or every candidate was blocked by a
+            safety filter, 502 otherwise.
     """
-    result = {"image_base64": None, "image_mime": None, "text": None}
-
     candidates = response_data.get("candidates", [])
     if not candidates:
         # Check for prompt feedback / blocking
@@ -115,96 +819,529 @@ def _parse_response(response_data):
                 f"Generation blocked by safety filter: {block_reason}",
                 status_code=422,
                 details=prompt_feedback,
+                retryable=False,
             )
         raise GeminiClientError(
             "No candidates returned from Gemini API.",
             status_code=502,
         )
 
-    # Extract parts from the first candidate
-    content = candidates[0].get("content", {})
-    parts = content.get("parts", [])
-
-    for part in parts:
-        if "inlineData" in part:
-            inline = part["inlineData"]
-            result["image_base64"] = inline.get("data")
-            result["image_mime"] = inline.get("mimeType", "image/png")
-        elif "text" in part:
-            result["text"] = part["text"]
+    images = []
+    first_text = None
+    for index, candidate in enumerate(candidates):
+        result = {"image_base64": None, "image_mime": None, "text": None}
+        for part in candidate.get("content", {}).get("parts", []):
+            if "inlineData" in part:
+                inline = part["inlineData"]
+                result["image_base64"] = inline.get("data")
+                result["image_mime"] = inline.get("mimeType", "image/png")
+            elif "text" in part:
+                result["text"] = part["text"]
+        if index == 0:
+            first_text = result["text"]
+        if result["image_base64"]:
+            images.append(result)
 
-    if not result["image_base64"]:
+    if not images:
         # Check finish reason
-        finish_reason = candidates[0].get("finishReason", "UNKNOWN")
+        finish_reasons = [candidate.get("finishReason", "UNKNOWN") for candidate in candidates]
+        blocked = [reason for reason in finish_reasons if reason in SAFETY_FINISH_REASONS]
+        if blocked:
+            raise GeminiClientError(
+                f"Generation blocked by safety filter: {blocked[0]}",
+                status_code=422,
+                details={"finish_reason": blocked[0], "text": first_text},
+                retryable=False,
+            )
+        finish_reason = finish_reasons[0]
         raise GeminiClientError(
             f"No image generated. Finish reason: {finish_reason}",
             status_code=502,
-            details={"finish_reason": finish_reason, "text": result.get("text")},
+            details={"finish_reason": finish_reason, "text": first_text},
         )
 
+    result = images[0]
+    if len(images) > 1:
+        result["additional_variants"] = images[1:]
+    result["usage"] = _parse_usage(response_data.get("usageMetadata"))
     return result
 
 
-def generate_image(prompt, reference_image_base64, reference_image_mime, brand_ci_base64=None):
+def _parse_usage(usage_metadata):
+    """
+    Summarize a response's usageMetadata token counts.
+
+    Returns:
+        Dict with prompt_tokens, cached_tokens (served from a context cache),
+        uncached_tokens and output_tokens (0 for counts Gemini omits).
+    """
+    usage_metadata = usage_metadata or {}
+    prompt_tokens = usage_metadata.get("promptTokenCount", 0)
+    cached_tokens = usage_metadata.get("cachedContentTokenCount", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "uncached_tokens": prompt_tokens - cached_tokens,
+        "output_tokens": usage_metadata.get("candidatesTokenCount", 0),
+    }
+
+
+def add_usage(total, usage):
+    """Add the token counts of one usage dict into another (in place)."""
+    for key, value in (usage or {}).items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def _allow_through_circuit(timeout):
+    """Reserve a circuit breaker slot for one call, or raise 504 / 503."""
+    if timeout <= 0:
+        raise GeminiClientError("Gemini API request timed out.", status_code=504)
+    try:
+        GEMINI_CIRCUIT.allow()
+    except CircuitOpenError as e:
+        raise GeminiClientError(
+            str(e),
+            status_code=503,
+            details={"circuit": "open", "retry_after_seconds": round(e.retry_after, 1)},
+            retry_after=e.retry_after,
+            retryable=False,
+        )
+
+
+def _post_through_circuit(path, body_bytes, timeout):
+    """
+    POST to Gemini if the circuit breaker allows it and record the outcome.
+
+    Returns:
+        (response_data, latency_seconds)
+
+    Raises:
+        GeminiClientError: 503 without calling Gemini while the circuit is
+            open, or the upstream error.
+    """
+    _allow_through_circuit(timeout)
+    logger.info("Calling Gemini API for image generation...")
+    call_start = time.monotonic()
+    stream_to, close = _response_parser()
+    try:
+        _send(
+            path, body_bytes, {"Content-Type": "application/json"},
+            timeout=timeout, stream_to=stream_to,
+        )
+        response_data = close()
+    except GeminiClientError as e:
+        GEMINI_CIRCUIT.record(is_failure_status(e.status_code), time.monotonic() - call_start)
+        raise
+    latency = time.monotonic() - call_start
+    GEMINI_CIRCUIT.record(False, latency)
+    return response_data, latency
+
+
+async def _post_through_circuit_async(path, body_bytes, timeout):
+    """_post_through_circuit for coroutines; a cancelled call records no outcome."""
+    _allow_through_circuit(timeout)
+    logger.info("Calling Gemini API for image generation...")
+    call_start = time.monotonic()
+    stream_to, close = _response_parser()
+    try:
+        await _send_async(
+            path, body_bytes, {"Content-Type": "application/json"},
+            timeout=timeout, stream_to=stream_to,
+        )
+        response_data = close()
+    except GeminiClientError as e:
+        GEMINI_CIRCUIT.record(is_failure_status(e.status_code), time.monotonic() - call_start)
+        raise
+    except BaseException:
+        GEMINI_CIRCUIT.cancel()
+        raise
+    latency = time.monotonic() - call_start
+    GEMINI_CIRCUIT.record(False, latency)
+    return response_data, latency
+
+
+def generate_image(
+    prompt,
+    reference_image_base64,
+    reference_image_mime,
+    brand_ci_base64=None,
+    timeout=REQUEST_TIMEOUT,
+    reference_file_uri=None,
+    brand_ci_file_uri=None,
+    body_template=None,
+    variants=1,
+    variants_mode=None,
+):
     """
     Call the Gemini API to generate a modified image.
 
+    Transient failures (429, 5xx, timeouts, connection errors, responses
+    without an image) are retried per GENERATE_RETRY_POLICY within the
+    timeout budget; safety blocks (422), bad requests and key errors are
+    raised immediately. Every attempt first waits for capacity from the
+    process-wide rate limiter (see rate_limiter.py), which adapts to 429s,
+    and is rejected immediately with a 503 while the GEMINI_CIRCUIT breaker
+    is open.
+
+    With variants > 1, "candidates" mode requests that many candidates in
+    one call (the reference assets are sent once) and makes parallel calls
+    for any the model did not return; if the model rejects candidateCount,
+    that is remembered for CANDIDATE_COUNT_RETRY_SECONDS and later requests
+    go straight to parallel calls.
+
     Args:
         prompt: The generation prompt.
         reference_image_base64: Base64-encoded reference image.
         reference_image_mime: MIME type of the reference image (e.g. 'image/png').
         brand_ci_base64: Optional base64-encoded brand CI PDF.
+        timeout: Total seconds for the call, including retries.
+        reference_file_uri: Optional uploaded-file URI for the reference
+            image (see ensure_file_uri); inline data is sent when None.
+        brand_ci_file_uri: Optional uploaded-file URI for the brand CI PDF.
+        body_template: Optional RequestBodyTemplate built once for all
+            segments of a request; when given, the asset arguments above are
+            ignored and only the prompt is serialized per call.
+        variants: Number of images to generate (1 to MAX_VARIANTS).
+        variants_mode: "candidates" or "parallel" (default VARIANTS_MODE).
 
     Returns:
-        Dict with keys: image_base64, image_mime, text (optional description).
+        Dict with keys: image_base64, image_mime, text (optional
+        description), usage (token counts, see _parse_usage; summed over
+        calls for variants), attempts (per-attempt timings, see
+        RetryPolicy.call) and rate_limit_wait_seconds (time queued in the
+        rate limiter). With
+        variants > 1 it also has additional_variants (the other images, as
+        dicts with image_base64, image_mime and text) and variants_mode
+        (how they were produced: "candidates", "parallel" or "mixed").
 
     Raises:
-        GeminiClientError: On API errors or missing configuration.
+        GeminiClientError: On API errors or missing configuration; its
+            attempts attribute lists the attempts made.
     """
-    api_key = _get_api_key()
-    url = f"{GEMINI_BASE_URL}{GENERATE_ENDPOINT}?key={api_key}"
+    render = _body_renderer(
+        prompt,
+        reference_image_base64,
+        reference_image_mime,
+        brand_ci_base64,
+        reference_file_uri,
+        brand_ci_file_uri,
+        body_template,
+    )
+    variants = max(1, min(variants, MAX_VARIANTS))
+    if variants == 1:
+        return _generate_with_retries(render(GENERATION_CONFIG), timeout)
+    return _generate_variants(render, variants, variants_mode or VARIANTS_MODE, timeout)
+
 
-    body = _build_request_body(prompt, reference_image_base64, reference_image_mime, brand_ci_base64)
-    body_bytes = json.dumps(body).encode("utf-8")
+async def generate_image_async(
+    prompt,
+    reference_image_base64,
+    reference_image_mime,
+    brand_ci_base64=None,
+    timeout=REQUEST_TIMEOUT,
+    reference_file_uri=None,
+    brand_ci_file_uri=None,
+    body_template=None,
+    variants=1,
+    variants_mode=None,
+):
+    """
+    generate_image for asyncio: same arguments, result and errors.
 
-    request = Request(
-        url,
-        data=body_bytes,
-        headers={"Content-Type": "application/json"},
-        method="POST",
+    Calls go through the same rate limiter, circuit breaker and retry
+    policy, but wait on the network without holding a thread, so one event
+    loop can keep many slow calls in flight. Cancelling the task abandons
+    the upstream call (and its connection) at once.
+    """
+    render = _body_renderer(
+        prompt,
+        reference_image_base64,
+        reference_image_mime,
+        brand_ci_base64,
+        reference_file_uri,
+        brand_ci_file_uri,
+        body_template,
+    )
+    variants = max(1, min(variants, MAX_VARIANTS))
+    if variants == 1:
+        return await _generate_with_retries_async(render(GENERATION_CONFIG), timeout)
+    return await _generate_variants_async(
+        render, variants, variants_mode or VARIANTS_MODE, timeout
     )
 
-    try:
-        logger.info("Calling Gemini API for image generation...")
-        with urlopen(request, timeout=REQUEST_TIMEOUT) as response:
-            response_body = response.read()
-            response_data = json.loads(response_body)
-    except HTTPError as e:
-        error_body = ""
-        try:
-            error_body = e.read().decode("utf-8")
-            error_data = json.loads(error_body)
-            error_message = error_data.get("error", {}).get("message", error_body)
-        except Exception:
-            error_message = error_body or str(e)
 
-        logger.error("Gemini API HTTP error %d: %s", e.code, error_message)
-        raise GeminiClientError(
-            f"Gemini API error: {error_message}",
-            status_code=e.code,
-            details=error_message,
-        )
-    except URLError as e:
-        logger.error("Gemini API connection error: %s", e.reason)
-        raise GeminiClientError(
-            f"Failed to connect to Gemini API: {e.reason}",
-            status_code=502,
+def _body_renderer(
+    prompt,
+    reference_image_base64,
+    reference_image_mime,
+    brand_ci_base64,
+    reference_file_uri,
+    brand_ci_file_uri,
+    body_template,
+):
+    """Return a callable turning a generationConfig into request body bytes."""
+    def render(generation_config):
+        with stage("serialize"):
+            return _render(generation_config)
+
+    def _render(generation_config):
+        if body_template is not None:
+            return body_template.render(prompt, generation_config)
+        body = _build_request_body(
+            prompt,
+            reference_image_base64,
+            reference_image_mime,
+            brand_ci_base64,
+            reference_file_uri=reference_file_uri,
+            brand_ci_file_uri=brand_ci_file_uri,
         )
-    except Exception as e:
-        logger.error("Unexpected error calling Gemini API: %s", str(e))
-        raise GeminiClientError(
-            f"Unexpected error: {str(e)}",
-            status_code=500,
+        body["generationConfig"] = generation_config
+        return json.dumps(body).encode("utf-8")
+
+    return render
+
+
+def _rate_limit_error(error):
+    return GeminiClientError(
+        f"Gemini rate limit queue timed out: {error}",
+        status_code=503,
+        retryable=False,
+    )
+
+
+def _generate_with_retries(body_bytes, timeout, candidates=1):
+    """
+    Run one generateContent call through the limiter, breaker and retry policy.
+
+    candidates is the call's candidateCount, so the limiter judges its
+    latency against calls of the same size.
+    """
+    limiter = get_default_limiter()
+    waits = []
+
+    def attempt(attempt_timeout):
+        try:
+            waited = limiter.acquire(attempt_timeout)
+            record_stage("rate_limit", waited)
+        except RateLimitTimeout as e:
+            raise _rate_limit_error(e)
+        waits.append(waited)
+
+        status_code = None
+        latency = None
+        try:
+            response_data, latency = _post_through_circuit(
+                GENERATE_ENDPOINT, body_bytes, attempt_timeout - waited
+            )
+        except GeminiClientError as e:
+            status_code = e.status_code
+            raise
+        finally:
+            limiter.release(status_code, latency, candidates)
+        with stage("parse_response"):
+            return _parse_response(response_data)
+
+    result, attempts = GENERATE_RETRY_POLICY.call(attempt, timeout)
+    result["attempts"] = attempts
+    result["rate_limit_wait_seconds"] = round(sum(waits), 3)
+    return result
+
+
+async def _generate_with_retries_async(body_bytes, timeout, candidates=1):
+    """_generate_with_retries for coroutines."""
+    limiter = get_default_limiter()
+    waits = []
+
+    async def attempt(attempt_timeout):
+        try:
+            waited = await limiter.acquire_async(attempt_timeout)
+            record_stage("rate_limit", waited)
+        except RateLimitTimeout as e:
+            raise _rate_limit_error(e)
+        waits.append(waited)
+
+        status_code = None
+        latency = None
+        try:
+            response_data, latency = await _post_through_circuit_async(
+                GENERATE_ENDPOINT, body_bytes, attempt_timeout - waited
+            )
+        except GeminiClientError as e:
+            status_code = e.status_code
+            raise
+        finally:
+            limiter.release(status_code, latency, candidates)
+        with stage("parse_response"):
+            return _parse_response(response_data)
+
+    result, attempts = await GENERATE_RETRY_POLICY.call_async(attempt, timeout)
+    result["attempts"] = attempts
+    result["rate_limit_wait_seconds"] = round(sum(waits), 3)
+    return result
+
+
+# Monotonic time the model last rejected candidateCount > 1 (None if it
+# has not, or the rejection has expired)
+_candidate_count_rejected_at = None
+_candidate_count_lock = threading.Lock()
+
+# Error messages for a rejected candidateCount: ones naming the field, and
+# Gemini's "Multiple candidates is not enabled for models/..."
+_CANDIDATE_COUNT_REJECTION = re.compile(r"candidate_?count|multiple candidates", re.IGNORECASE)
+
+
+def _candidate_count_allowed():
+    """Return False while a candidateCount rejection is remembered."""
+    global _candidate_count_rejected_at
+    with _candidate_count_lock:
+        if _candidate_count_rejected_at is None:
+            return True
+        if time.monotonic() - _candidate_count_rejected_at < CANDIDATE_COUNT_RETRY_SECONDS:
+            return False
+        _candidate_count_rejected_at = None
+        return True
+
+
+def _is_candidate_count_rejection(error):
+    """
+    Return True if the error is Gemini refusing candidateCount > 1: an
+    INVALID_ARGUMENT 400 (or a 400 without a status name) whose message is
+    about candidateCount, not just any bad request.
+    """
+    if error.status_code != 400 or error.upstream_status not in (None, "INVALID_ARGUMENT"):
+        return False
+    return bool(_CANDIDATE_COUNT_REJECTION.search(str(error.details or error)))
+
+
+def _new_variant_tally():
+    """Accumulator for the calls that together produce a segment's variants."""
+    return {"images": [], "attempts": [], "waits": 0.0, "usage": {}, "used": set()}
+
+
+def _add_variant_call(tally, result, mode):
+    """Add one successful call (its images, attempts, waits and usage) to the tally."""
+    tally["attempts"].extend(result.pop("attempts"))
+    tally["waits"] += result.pop("rate_limit_wait_seconds")
+    add_usage(tally["usage"], result.pop("usage", None))
+    tally["images"].append(result)
+    tally["images"].extend(result.pop("additional_variants", []))
+    tally["used"].add(mode)
+
+
+def _candidates_rejected(tally, error):
+    """
+    Handle a failed multi-candidate call: remember a candidateCount
+    rejection so later requests go straight to parallel calls, and re-raise
+    any other error.
+    """
+    global _candidate_count_rejected_at
+    if not _is_candidate_count_rejection(error):
+        raise error
+    with _candidate_count_lock:
+        _candidate_count_rejected_at = time.monotonic()
+    tally["attempts"].extend(error.attempts or [])
+    logger.warning("Model rejected candidateCount; using parallel calls for variants")
+
+
+def _add_parallel_outcomes(tally, outcomes, variants):
+    """Add the results / GeminiClientErrors of the parallel top-up calls."""
+    errors = []
+    for outcome in outcomes:
+        if isinstance(outcome, GeminiClientError):
+            errors.append(outcome)
+            tally["attempts"].extend(outcome.attempts or [])
+        else:
+            _add_variant_call(tally, outcome, "parallel")
+    if not tally["images"]:
+        error = errors[0]
+        error.attempts = tally["attempts"]
+        raise error
+    if errors:
+        logger.warning("%d of %d variants failed: %s", len(errors), variants, errors[0])
+
+
+def _variants_result(tally, variants):
+    """Shape the tally into generate_image's result dict."""
+    images = tally["images"]
+    result = images[0]
+    if len(images) > 1:
+        result["additional_variants"] = images[1:variants]
+    result["attempts"] = tally["attempts"]
+    result["rate_limit_wait_seconds"] = round(tally["waits"], 3)
+    result["usage"] = tally["usage"]
+    used = tally["used"]
+    result["variants_mode"] = used.pop() if len(used) == 1 else "mixed"
+    return result
+
+
+def _generate_variants(render, variants, mode, timeout):
+    """
+    Produce `variants` images, preferring one multi-candidate call.
+
+    Args:
+        render: Callable taking a generationConfig and returning body bytes.
+        variants: Number of images wanted (> 1).
+        mode: "candidates" or "parallel".
+        timeout: Total seconds available.
+    """
+    deadline = time.monotonic() + timeout
+    tally = _new_variant_tally()
+
+    if mode == "candidates" and _candidate_count_allowed():
+        config = dict(GENERATION_CONFIG, candidateCount=variants)
+        try:
+            result = _generate_with_retries(render(config), timeout, variants)
+        except GeminiClientError as e:
+            _candidates_rejected(tally, e)
+        else:
+            _add_variant_call(tally, result, "candidates")
+
+    missing = variants - len(tally["images"])
+    if missing > 0:
+        remaining = deadline - time.monotonic()
+        body_bytes = render(GENERATION_CONFIG)
+        outcomes = []
+        with ThreadPoolExecutor(max_workers=missing, thread_name_prefix="variant") as executor:
+            futures = [
+                executor.submit(run_in_context(_generate_with_retries), body_bytes, remaining)
+                for _ in range(missing)
+            ]
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except GeminiClientError as e:
+                    outcomes.append(e)
+        _add_parallel_outcomes(tally, outcomes, variants)
+
+    return _variants_result(tally, variants)
+
+
+async def _generate_variants_async(render, variants, mode, timeout):
+    """_generate_variants for coroutines; parallel calls run as tasks."""
+    deadline = time.monotonic() + timeout
+    tally = _new_variant_tally()
+
+    if mode == "candidates" and _candidate_count_allowed():
+        config = dict(GENERATION_CONFIG, candidateCount=variants)
+        try:
+            result = await _generate_with_retries_async(render(config), timeout, variants)
+        except GeminiClientError as e:
+            _candidates_rejected(tally, e)
+        else:
+            _add_variant_call(tally, result, "candidates")
+
+    missing = variants - len(tally["images"])
+    if missing > 0:
+        remaining = deadline - time.monotonic()
+        body_bytes = render(GENERATION_CONFIG)
+        outcomes = await asyncio.gather(
+            *(_generate_with_retries_async(body_bytes, remaining) for _ in range(missing)),
+            return_exceptions=True,
         )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException) and not isinstance(outcome, GeminiClientError):
+                raise outcome
+        _add_parallel_outcomes(tally, outcomes, variants)
 
-    return _parse_response(response_data)
+    return _variants_result(tally, variants)
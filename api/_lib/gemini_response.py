@@ -0,0 +1,293 @@
+"""
+Incremental parser for Gemini generateContent responses.
+
+A generateContent response is mostly base64 image data. Rather than
+buffering the whole body and running json.loads over it, the connection
+pool feeds the body to GeminiResponseParser chunk by chunk as it arrives.
+The parser scans the JSON without building it: only the fields
+_parse_response reads are kept (candidates[].content.parts[] inlineData /
+text, candidates[].finishReason, promptFeedback and usageMetadata), and
+each string is collected straight into one bytearray, so an image's
+base64 text is copied once into a buffer and once into its final str.
+Everything else (safety ratings, citations, ...) is scanned and dropped.
+
+close() returns a dict shaped like the JSON subset it kept, so the result
+goes through the same _parse_response checks as before.
+"""
+
+import json
+import re
+import time
+
+# Keep the whole subtree below a field
+ALL = "all"
+
+# Fields kept from a generateContent response; "*" stands for array items
+RESPONSE_FIELDS = {
+    "candidates": {
+        "*": {
+            "content": {"parts": {"*": {"inlineData": ALL, "text": ALL}}},
+            "finishReason": ALL,
+        },
+    },
+    "promptFeedback": ALL,
+    "usageMetadata": ALL,
+}
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+# A number or literal runs up to the next delimiter
+_TOKEN = re.compile(rb"[^ \t\n\r,\]}]+")
+_SCALAR = re.compile(rb"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null")
+# Longest number or literal accepted
+_MAX_SCALAR_BYTES = 64
+_ESCAPES = frozenset(b'"\\/bfnrtu')
+
+_PENDING = object()
+_SKIPPED = object()
+
+
+class ResponseParseError(ValueError):
+    """Raised by GeminiResponseParser.close() for malformed or truncated JSON."""
+
+
+class _Frame:
+    """An object or array being parsed."""
+
+    __slots__ = ("is_object", "container", "node", "key", "state")
+
+    def __init__(self, is_object, node):
+        self.is_object = is_object
+        self.node = node
+        # None while skipping: the values below are scanned, not stored
+        self.container = None if node is None else ({} if is_object else [])
+        self.key = None
+        self.state = "first"
+
+
+class GeminiResponseParser:
+    """
+    Push parser: feed() body chunks as they arrive, then close().
+
+    feed() never raises; a parse error stops parsing and is raised by
+    close(), so the pool can still read the rest of the body and reuse the
+    connection.
+    """
+
+    def __init__(self, fields=RESPONSE_FIELDS):
+        self._fields = fields
+        self._buffer = bytearray()
+        self._stack = []
+        self._result = _PENDING
+        self._error = None
+        # String being scanned: bytes kept (None while skipping) and state
+        self._in_string = False
+        self._string = None
+        self._string_is_key = False
+        self._string_escaped = False
+        self._escape_pending = False
+        self.bytes_received = 0
+        self.seconds = 0.0
+
+    def feed(self, data):
+        """Parse the next chunk of the response body."""
+        self.bytes_received += len(data)
+        if self._error is not None:
+            return
+        start = time.perf_counter()
+        self._buffer += data
+        try:
+            consumed = self._parse(final=False)
+        except ResponseParseError as e:
+            self._error = e
+            self._buffer = bytearray()
+        else:
+            del self._buffer[:consumed]
+        self.seconds += time.perf_counter() - start
+
+    def close(self):
+        """
+        Finish parsing.
+
+        Returns:
+            Dict with the kept fields of the response.
+
+        Raises:
+            ResponseParseError: If the body was not a complete JSON document.
+        """
+        start = time.perf_counter()
+        try:
+            if self._error is None:
+                self._parse(final=True)
+            if self._error is not None:
+                raise self._error
+            if self._result is _PENDING:
+                raise ResponseParseError("Truncated JSON response")
+            if not isinstance(self._result, dict):
+                raise ResponseParseError("Response is not a JSON object")
+            return self._result
+        finally:
+            self._buffer = bytearray()
+            self.seconds += time.perf_counter() - start
+
+    def _parse(self, final):
+        """Consume as much of the buffer as possible; return bytes consumed."""
+        buffer = self._buffer
+        end = len(buffer)
+        pos = 0
+        while True:
+            if self._in_string:
+                pos = self._scan_string(pos)
+                if self._in_string:
+                    return pos
+                continue
+
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= end:
+                return pos
+            if self._result is not _PENDING:
+                raise ResponseParseError("Extra data after the JSON document")
+
+            char = buffer[pos]
+            frame = self._stack[-1] if self._stack else None
+            state = frame.state if frame is not None else "value"
+
+            if frame is not None and frame.is_object and state in ("first", "key"):
+                if char == 0x7D and state == "first":  # }
+                    pos += 1
+                    self._close_frame()
+                elif char == 0x22:  # "
+                    pos += 1
+                    self._start_string(is_key=True, keep=True)
+                else:
+                    raise ResponseParseError(f"Expected a key at byte {self.bytes_received - end + pos}")
+                continue
+            if state == "colon":
+                if char != 0x3A:  # :
+                    raise ResponseParseError("Expected ':' after a key")
+                frame.state = "value"
+                pos += 1
+                continue
+            if state == "next":
+                if char == 0x2C:  # ,
+                    frame.state = "key" if frame.is_object else "value"
+                    pos += 1
+                elif char == (0x7D if frame.is_object else 0x5D):  # } or ]
+                    pos += 1
+                    self._close_frame()
+                else:
+                    raise ResponseParseError("Expected ',' or the end of a container")
+                continue
+            if state == "first" and char == 0x5D:  # ] of an empty array
+                pos += 1
+                self._close_frame()
+                continue
+
+            # A value
+            node = self._child_node()
+            if char == 0x7B:  # {
+                self._stack.append(_Frame(True, node))
+                pos += 1
+            elif char == 0x5B:  # [
+                self._stack.append(_Frame(False, node))
+                pos += 1
+            elif char == 0x22:
+                pos += 1
+                self._start_string(is_key=False, keep=node is not None)
+            else:
+                token = _TOKEN.match(buffer, pos)
+                if token.end() == end and not final and end - pos <= _MAX_SCALAR_BYTES:
+                    # Possibly cut off mid-token; wait for more input
+                    return pos
+                if token.end() - pos > _MAX_SCALAR_BYTES or not _SCALAR.fullmatch(token.group()):
+                    raise ResponseParseError("Invalid JSON value")
+                pos = token.end()
+                self._add_value(json.loads(token.group()) if node is not None else _SKIPPED)
+
+    def _child_node(self):
+        """The fields node for the next value (None = skip it)."""
+        if not self._stack:
+            return self._fields
+        frame = self._stack[-1]
+        node = frame.node
+        if node is None or node is ALL:
+            return node
+        return node.get(frame.key if frame.is_object else "*")
+
+    def _add_value(self, value):
+        if not self._stack:
+            self._result = value
+            return
+        frame = self._stack[-1]
+        if frame.container is not None and value is not _SKIPPED:
+            if frame.is_object:
+                frame.container[frame.key] = value
+            else:
+                frame.container.append(value)
+        frame.state = "next"
+
+    def _close_frame(self):
+        frame = self._stack.pop()
+        self._add_value(_SKIPPED if frame.container is None else frame.container)
+
+    def _start_string(self, is_key, keep):
+        self._in_string = True
+        self._string_is_key = is_key
+        self._string = bytearray() if keep else None
+        self._string_escaped = False
+        self._escape_pending = False
+
+    def _append(self, start, stop):
+        if self._string is not None and stop > start:
+            with memoryview(self._buffer) as view:
+                self._string += view[start:stop]
+
+    def _scan_string(self, pos):
+        """Scan string bytes from pos; return the position after what was consumed."""
+        buffer = self._buffer
+        end = len(buffer)
+        quote = -1
+        while True:
+            if self._escape_pending:
+                # The byte after a backslash never ends the string
+                if pos >= end:
+                    return pos
+                if buffer[pos] not in _ESCAPES:
+                    raise ResponseParseError("Invalid escape in a JSON string")
+                self._append(pos, pos + 1)
+                pos += 1
+                self._escape_pending = False
+            # bytes.find (memchr) is much faster than a regex over base64
+            if quote < pos:
+                quote = buffer.find(b'"', pos)
+            backslash = buffer.find(b"\\", pos, end if quote < 0 else quote)
+            if backslash < 0 and quote < 0:
+                self._append(pos, end)
+                return end
+            if backslash < 0:
+                self._append(pos, quote)
+                self._in_string = False
+                self._finish_string()
+                return quote + 1
+            self._append(pos, backslash + 1)
+            self._string_escaped = True
+            self._escape_pending = True
+            pos = backslash + 1
+
+    def _finish_string(self):
+        raw, self._string = self._string, None
+        if raw is None:
+            value = _SKIPPED
+        else:
+            try:
+                if self._string_escaped:
+                    value = json.loads(b'"' + bytes(raw) + b'"')
+                else:
+                    value = raw.decode("utf-8")
+            except ValueError as e:
+                raise ResponseParseError(f"Invalid JSON string: {e}")
+        if self._string_is_key:
+            frame = self._stack[-1]
+            frame.key = value
+            frame.state = "colon"
+        else:
+            self._add_value(value)
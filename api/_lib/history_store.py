@@ -0,0 +1,337 @@
+"""
+Generation history: one row per segment generation in a local SQLite
+database (WAL mode).
+
+Rows carry the request ID, reference image / brand CI / prompt hashes,
+segment, prompt, timings, status and the generated image's asset
+reference. They are indexed by time, segment, reference image hash,
+request ID and status, and read back newest-first with keyset (cursor)
+pagination, so a page costs the same regardless of how much history there
+is.
+
+Recording never touches the database on the request path: record()
+only appends to an in-memory queue, and a background writer thread
+inserts rows in batches (every HISTORY_FLUSH_SECONDS or HISTORY_BATCH_SIZE
+rows). If the queue is full, entries are dropped and counted rather than
+slowing generation down. Readers only see committed rows, so the last
+~HISTORY_FLUSH_SECONDS of generations may not be listed yet.
+
+The default database is local to the instance (/tmp on Vercel); point
+HISTORY_DB_PATH at persistent storage to keep history across deploys.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "1") not in ("0", "false", "False", "")
+HISTORY_DB_PATH = os.environ.get(
+    "HISTORY_DB_PATH",
+    os.path.join(tempfile.gettempdir(), "creative-studio-history.sqlite3"),
+)
+HISTORY_FLUSH_SECONDS = float(os.environ.get("HISTORY_FLUSH_SECONDS", "0.5"))
+HISTORY_BATCH_SIZE = int(os.environ.get("HISTORY_BATCH_SIZE", "100"))
+HISTORY_QUEUE_MAX = int(os.environ.get("HISTORY_QUEUE_MAX", "10000"))
+BUSY_TIMEOUT_SECONDS = 10
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+COLUMNS = (
+    "created_at",
+    "request_id",
+    "segment_id",
+    "status",
+    "reference_sha256",
+    "brand_ci_sha256",
+    "prompt_sha256",
+    "prompt",
+    "aspect_ratio",
+    "cache_hit",
+    "generation_time_seconds",
+    "queue_time_seconds",
+    "attempt_count",
+    "status_code",
+    "error",
+    "image_sha256",
+    "image_url",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    request_id TEXT NOT NULL,
+    segment_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    reference_sha256 TEXT,
+    brand_ci_sha256 TEXT,
+    prompt_sha256 TEXT,
+    prompt TEXT,
+    aspect_ratio TEXT,
+    cache_hit INTEGER,
+    generation_time_seconds REAL,
+    queue_time_seconds REAL,
+    attempt_count INTEGER,
+    status_code INTEGER,
+    error TEXT,
+    image_sha256 TEXT,
+    image_url TEXT
+);
+CREATE INDEX IF NOT EXISTS generations_created_at ON generations (created_at);
+CREATE INDEX IF NOT EXISTS generations_segment ON generations (segment_id, id);
+CREATE INDEX IF NOT EXISTS generations_reference ON generations (reference_sha256, id);
+CREATE INDEX IF NOT EXISTS generations_request ON generations (request_id);
+CREATE INDEX IF NOT EXISTS generations_status ON generations (status, id);
+"""
+
+# Filters accepted by list_generations -> indexed column they match
+FILTER_COLUMNS = {
+    "segment_id": "segment_id",
+    "reference_sha256": "reference_sha256",
+    "request_id": "request_id",
+    "status": "status",
+}
+
+
+def build_entry(outcome, params, created_at=None):
+    """
+    Turn a segment outcome into a history row.
+
+    Args:
+        outcome: Result or error dict from the pipeline.
+        params: The request's prepared generation params.
+        created_at: Optional epoch seconds (defaults to now).
+    """
+    brand_ci = params.get("brand_ci")
+    prompt = outcome.get("prompt_used")
+    return {
+        "created_at": created_at or time.time(),
+        "request_id": params.get("request_id") or "",
+        "segment_id": outcome["segment_id"],
+        "status": outcome["status"],
+        "reference_sha256": params.get("source_reference_sha256"),
+        "brand_ci_sha256": brand_ci.digest if brand_ci is not None else None,
+        "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest() if prompt else None,
+        "prompt": prompt,
+        "aspect_ratio": params.get("resolved_aspect_ratio") or params.get("aspect_ratio"),
+        "cache_hit": int(bool(outcome.get("cache_hit"))),
+        "generation_time_seconds": outcome.get("generation_time_seconds"),
+        "queue_time_seconds": outcome.get("queue_time_seconds"),
+        "attempt_count": outcome.get("attempt_count"),
+        "status_code": outcome.get("status_code"),
+        "error": outcome.get("error"),
+        "image_sha256": outcome.get("image_sha256"),
+        "image_url": outcome.get("image_url"),
+    }
+
+
+class HistoryStore:
+    """Generation history rows in one SQLite database."""
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def insert_many(self, entries):
+        """Insert history rows (dicts keyed by COLUMNS) in one transaction."""
+        if not entries:
+            return
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT INTO generations ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                [tuple(entry.get(column) for column in COLUMNS) for entry in entries],
+            )
+
+    def list_generations(self, limit=DEFAULT_PAGE_SIZE, cursor=None, since=None, until=None,
+                         **filters):
+        """
+        Return one page of history, newest first.
+
+        Args:
+            limit: Page size (capped at MAX_PAGE_SIZE).
+            cursor: next_cursor from the previous page.
+            since / until: Optional epoch-seconds bounds on created_at.
+            **filters: Equality filters named in FILTER_COLUMNS.
+
+        Returns:
+            (rows, next_cursor) where next_cursor is None on the last page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses = []
+        args = []
+        for name, value in filters.items():
+            if value is not None:
+                clauses.append(f"{FILTER_COLUMNS[name]} = ?")
+                args.append(value)
+        if cursor is not None:
+            clauses.append("id < ?")
+            args.append(cursor)
+        # Batches can commit out of recording order, so time bounds go on
+        # created_at itself (indexed) rather than being mapped to ids
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            args.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM generations {where} ORDER BY id DESC LIMIT ?",
+                args + [limit + 1],
+            ).fetchall()
+        rows = [dict(row, cache_hit=bool(row["cache_hit"])) for row in rows]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+        return rows, next_cursor
+
+
+class HistoryRecorder:
+    """Queues history rows and writes them in batches on a background thread."""
+
+    def __init__(self, store, flush_seconds=HISTORY_FLUSH_SECONDS,
+                 batch_size=HISTORY_BATCH_SIZE, max_queue=HISTORY_QUEUE_MAX):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self.batch_size = max(1, batch_size)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending = 0  # recorded but not yet written
+        self._stats = {"written": 0, "dropped": 0, "batches": 0, "write_errors": 0}
+        threading.Thread(target=self._run, name="history-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, entry):
+        """Queue a row without blocking; drop it if the queue is full."""
+        with self._cond:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._cond:
+                self._pending -= 1
+                self._stats["dropped"] += 1
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            try:
+                self.store.insert_many(batch)
+                written = True
+            except sqlite3.Error as e:
+                written = False
+                logger.warning("Failed to write %d history rows: %s", len(batch), e)
+        with self._cond:
+            if written:
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+            else:
+                self._stats["write_errors"] += 1
+            self._pending -= len(batch)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Give concurrent segments a moment to join the batch
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self, timeout=5.0):
+        """
+        Write everything recorded so far.
+
+        Rows still queued are written from the calling thread; rows already
+        picked up by the writer thread are waited for, up to timeout seconds.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending <= 0, timeout)
+
+    def stats(self):
+        """Return write counters and the number of rows not yet written."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        return stats
+
+
+_default_recorder = None
+_default_recorder_failed = False
+_default_recorder_lock = threading.Lock()
+
+
+def get_default_recorder():
+    """
+    Return the process-wide history recorder.
+
+    Returns:
+        The HistoryRecorder, or None if history is disabled or its
+        database cannot be opened.
+    """
+    global _default_recorder, _default_recorder_failed
+    with _default_recorder_lock:
+        if _default_recorder is None and HISTORY_ENABLED and not _default_recorder_failed:
+            try:
+                _default_recorder = HistoryRecorder(HistoryStore())
+            except (OSError, sqlite3.Error) as e:
+                _default_recorder_failed = True
+                logger.warning("Generation history unavailable: %s", e)
+        return _default_recorder
+
+
+def record_generation(outcome, params):
+    """Queue a history row for one segment outcome (no-op if disabled)."""
+    recorder = get_default_recorder()
+    if recorder is not None:
+        recorder.record(build_entry(outcome, params))
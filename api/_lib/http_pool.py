@@ -0,0 +1,485 @@
+"""
+Keep-alive HTTP(S) connection pool for outbound API calls.
+
+Reuses persistent http.client connections across calls and threads so each
+upstream request does not pay a fresh TCP + TLS handshake. Idle connections
+are evicted after a configurable time and health-checked before reuse.
+
+AsyncConnectionPool is the asyncio counterpart, speaking HTTP/1.1 over
+asyncio streams: a request waiting on the network holds a coroutine rather
+than a thread, so one event loop can keep hundreds of slow calls in flight.
+"""
+
+import asyncio
+import http.client
+import io
+import logging
+import select
+import ssl
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 60.0
+# Read size when a response body is streamed to a callback
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Errors that mean a reused keep-alive connection was closed by the peer
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def _is_healthy(conn):
+    """
+    Check whether an idle connection can be reused.
+
+    An idle keep-alive socket should have nothing to read; if it is readable
+    the peer has closed it (EOF) or sent unsolicited data, so it is discarded.
+    """
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of persistent connections to a single origin.
+
+    Up to max_size idle connections are retained; extra connections created
+    under load are closed when returned instead of being kept.
+    """
+
+    def __init__(self, base_url, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = deque()  # (connection, last_used monotonic time)
+        self._stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "evicted_idle": 0,
+            "evicted_unhealthy": 0,
+            "discarded_overflow": 0,
+            "stale_retries": 0,
+            "in_use": 0,
+        }
+
+    def _new_connection(self, timeout):
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        with self._lock:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _checkout(self, timeout):
+        """Return (connection, reused) with a healthy idle connection if any."""
+        now = time.monotonic()
+        discard = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, last_used = self._idle.pop()  # most recently used first
+                if now - last_used > self.idle_timeout:
+                    self._stats["evicted_idle"] += 1
+                    discard.append(candidate)
+                elif not _is_healthy(candidate):
+                    self._stats["evicted_unhealthy"] += 1
+                    discard.append(candidate)
+                else:
+                    conn = candidate
+                    self._stats["connections_reused"] += 1
+                    break
+            self._stats["in_use"] += 1
+
+        for stale in discard:
+            stale.close()
+
+        if conn is None:
+            return self._new_connection(timeout), False
+
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _checkin(self, conn, reusable):
+        with self._lock:
+            self._stats["in_use"] -= 1
+            if reusable and len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+            if reusable:
+                self._stats["discarded_overflow"] += 1
+        conn.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=None, stream_to=None):
+        """
+        Send a request over a pooled connection and read the full response.
+
+        A reused connection that turns out to have been closed by the server
+        is retried once on a fresh connection.
+
+        Args:
+            method: HTTP method.
+            path: Request path including query string.
+            body: Optional request body bytes.
+            headers: Optional dict of request headers.
+            timeout: Socket timeout in seconds.
+            stream_to: Optional callable(status) returning a callable that
+                receives the body in chunks as it is read, or None to
+                buffer it. Called again if the request is retried.
+
+        Returns:
+            (status, headers, body) where headers is an http.client.HTTPMessage
+            and body is bytes, or None when it was streamed.
+
+        Raises:
+            OSError / http.client.HTTPException on transport failures.
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+
+        attempt = 0
+        while True:
+            attempt += 1
+            conn, reused = self._checkout(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                feed = stream_to(response.status) if stream_to is not None else None
+                if feed is None:
+                    data = response.read()
+                else:
+                    data = None
+                    while True:
+                        chunk = response.read(STREAM_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        feed(chunk)
+                    if response.length:
+                        # read(amt) returns b"" on a short body instead of raising
+                        raise http.client.IncompleteRead(b"", response.length)
+            except _STALE_CONNECTION_ERRORS:
+                self._checkin(conn, reusable=False)
+                if reused and attempt == 1:
+                    with self._lock:
+                        self._stats["stale_retries"] += 1
+                    logger.debug("Retrying on fresh connection after stale keep-alive")
+                    continue
+                raise
+            except BaseException:
+                self._checkin(conn, reusable=False)
+                raise
+
+            self._checkin(conn, reusable=not response.will_close)
+            return response.status, response.headers, data
+
+    def stats(self):
+        """Return a snapshot of pool counters plus the current idle count."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+        snapshot["max_size"] = self.max_size
+        snapshot["idle_timeout_seconds"] = self.idle_timeout
+        return snapshot
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            conn.close()
+
+
+class _AsyncConnection:
+    """One HTTP/1.1 connection on asyncio streams."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def is_healthy(self):
+        # An idle keep-alive connection the peer closed has seen EOF
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """
+    Pool of persistent asyncio connections to a single origin.
+
+    Bound to the event loop it is first used on (see get_async_pool). Only
+    what the API clients need is implemented: a bytes (or list of bytes
+    chunks) request body, and responses framed by Content-Length, chunked
+    transfer encoding or connection close.
+    """
+
+    def __init__(self, base_url, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._host_header = parts.netloc
+        self._ssl = ssl.create_default_context() if self.scheme == "https" else None
+        self._idle = deque()  # (connection, last_used monotonic time)
+        self._stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "evicted_idle": 0,
+            "evicted_unhealthy": 0,
+            "discarded_overflow": 0,
+            "stale_retries": 0,
+            "in_use": 0,
+        }
+
+    async def _checkout(self):
+        """Return (connection, reused) with a healthy idle connection if any."""
+        now = time.monotonic()
+        self._stats["in_use"] += 1
+        while self._idle:
+            conn, last_used = self._idle.pop()  # most recently used first
+            if now - last_used > self.idle_timeout:
+                self._stats["evicted_idle"] += 1
+                conn.close()
+            elif not conn.is_healthy():
+                self._stats["evicted_unhealthy"] += 1
+                conn.close()
+            else:
+                self._stats["connections_reused"] += 1
+                return conn, True
+
+        try:
+            reader, writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self._ssl, limit=2 ** 20
+            )
+        except BaseException:
+            self._stats["in_use"] -= 1
+            raise
+        self._stats["connections_created"] += 1
+        return _AsyncConnection(reader, writer), False
+
+    def _checkin(self, conn, reusable):
+        self._stats["in_use"] -= 1
+        if reusable and len(self._idle) < self.max_size:
+            self._idle.append((conn, time.monotonic()))
+            return
+        if reusable:
+            self._stats["discarded_overflow"] += 1
+        conn.close()
+
+    async def request(self, method, path, body=None, headers=None, timeout=None, stream_to=None):
+        """
+        Send a request over a pooled connection and read the full response.
+
+        A reused connection that turns out to have been closed by the server
+        is retried once on a fresh connection. Cancelling the calling task
+        closes the connection.
+
+        Args:
+            method: HTTP method.
+            path: Request path including query string.
+            body: Optional request body bytes, or a list of bytes chunks.
+            headers: Optional dict of request headers.
+            timeout: Seconds for the whole exchange.
+            stream_to: Optional callable(status) returning a callable that
+                receives the body in chunks as it is read, or None to
+                buffer it. Called again if the request is retried.
+
+        Returns:
+            (status, headers, body) where headers is an http.client.HTTPMessage
+            and body is bytes, or None when it was streamed.
+
+        Raises:
+            TimeoutError, or OSError / http.client.HTTPException on
+            transport failures.
+        """
+        self._stats["requests"] += 1
+        chunks = body if isinstance(body, list) else ([body] if body else [])
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self._host_header}"]
+        head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        if not any(name.lower() == "content-length" for name in headers or {}):
+            head.append(f"Content-Length: {sum(len(chunk) for chunk in chunks)}")
+        head_bytes = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+        async def exchange():
+            attempt = 0
+            while True:
+                attempt += 1
+                conn, reused = await self._checkout()
+                try:
+                    conn.writer.write(head_bytes)
+                    conn.writer.writelines(chunks)
+                    await conn.writer.drain()
+                    status, response_headers, data, will_close = await _read_response(
+                        conn.reader, method, stream_to
+                    )
+                except _STALE_CONNECTION_ERRORS:
+                    self._checkin(conn, reusable=False)
+                    if reused and attempt == 1:
+                        self._stats["stale_retries"] += 1
+                        logger.debug("Retrying on fresh connection after stale keep-alive")
+                        continue
+                    raise
+                except BaseException:
+                    self._checkin(conn, reusable=False)
+                    raise
+                self._checkin(conn, reusable=not will_close)
+                return status, response_headers, data
+
+        return await asyncio.wait_for(exchange(), timeout)
+
+    def stats(self):
+        """Return a snapshot of pool counters plus the current idle count."""
+        snapshot = dict(self._stats)
+        snapshot["idle"] = len(self._idle)
+        snapshot["max_size"] = self.max_size
+        snapshot["idle_timeout_seconds"] = self.idle_timeout
+        return snapshot
+
+    def close(self):
+        """Close all idle connections."""
+        while self._idle:
+            conn, _ = self._idle.pop()
+            conn.close()
+
+
+async def _read_response(reader, method, stream_to=None):
+    """
+    Read one HTTP/1.1 response; return (status, headers, body, will_close).
+
+    With stream_to (see AsyncConnectionPool.request) the body may be handed
+    over in chunks instead, in which case body is None.
+    """
+    try:
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        try:
+            version, status, _ = (status_line.decode("latin-1").rstrip("\r\n") + " ").split(" ", 2)
+            status = int(status)
+        except ValueError:
+            raise http.client.BadStatusLine(status_line)
+
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+
+        connection = (headers.get("Connection") or "").lower()
+        will_close = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return status, headers, b"", will_close
+
+        feed = stream_to(status) if stream_to is not None else None
+        parts = []
+        sink = parts.append if feed is None else feed
+        if "chunked" in (headers.get("Transfer-Encoding") or "").lower():
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers up to the blank line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                await _read_exactly(reader, size, sink, feed is not None)
+                await reader.readline()
+        elif headers.get("Content-Length") is not None:
+            await _read_exactly(reader, int(headers["Content-Length"]), sink, feed is not None)
+        else:
+            will_close = True
+            while True:
+                chunk = await reader.read(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                sink(chunk)
+    except asyncio.IncompleteReadError as e:
+        raise http.client.IncompleteRead(e.partial)
+    return status, headers, None if feed is not None else b"".join(parts), will_close
+
+
+async def _read_exactly(reader, size, sink, in_chunks):
+    """Pass `size` body bytes to sink, in STREAM_CHUNK_BYTES pieces if in_chunks."""
+    if not in_chunks:
+        sink(await reader.readexactly(size))
+        return
+    while size > 0:
+        chunk = await reader.readexactly(min(size, STREAM_CHUNK_BYTES))
+        sink(chunk)
+        size -= len(chunk)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """
+    Return the process-wide pool for an origin, creating it on first use.
+
+    Args:
+        base_url: URL whose scheme, host and port identify the origin.
+        max_size: Maximum idle connections retained.
+        idle_timeout: Seconds after which an idle connection is evicted.
+    """
+    parts = urlsplit(base_url)
+    key = (parts.scheme, parts.hostname, parts.port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(base_url, max_size=max_size, idle_timeout=idle_timeout)
+            _pools[key] = pool
+        return pool
+
+
+# event loop -> {origin: AsyncConnectionPool}; pools die with their loop
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_pool(base_url, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """
+    Return the running event loop's pool for an origin, creating it on first use.
+
+    Must be called from a coroutine; asyncio connections cannot be shared
+    between event loops.
+    """
+    loop = asyncio.get_running_loop()
+    parts = urlsplit(base_url)
+    key = (parts.scheme, parts.hostname, parts.port)
+    pools = _async_pools.setdefault(loop, {})
+    pool = pools.get(key)
+    if pool is None:
+        pool = pools[key] = AsyncConnectionPool(base_url, max_size=max_size, idle_timeout=idle_timeout)
+    return pool
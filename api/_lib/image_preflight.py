@@ -0,0 +1,269 @@
+"""
+Reference image preflight run once per request before segment fan-out.
+
+Reads the image dimensions from the file header (PNG, GIF, JPEG, WebP)
+without decoding the pixels, resolves aspect_ratio="auto" to the nearest
+supported ratio, and - when Pillow is installed - downscales oversized
+images so every segment call uploads a bounded image instead of the
+full-resolution original.
+"""
+
+import io
+import logging
+import math
+import os
+import struct
+
+from .media import MediaAsset
+from .prompt_builder import ASPECT_RATIO_DIMENSIONS
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; preflight then only reads headers
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_ENABLED = os.environ.get("PREFLIGHT_ENABLED", "1") != "0"
+# Longest side sent to Gemini; defaults to the largest output dimension
+PREFLIGHT_MAX_DIMENSION = int(
+    os.environ.get(
+        "PREFLIGHT_MAX_DIMENSION",
+        str(max(int(v) for dims in ASPECT_RATIO_DIMENSIONS.values() for v in dims)),
+    )
+)
+JPEG_QUALITY = 90
+
+# Bytes of the file decoded to find the dimensions (JPEG headers can be
+# preceded by large EXIF / ICC segments)
+HEADER_SCAN_BYTES = 256 * 1024
+
+# Supported fixed ratios as width / height
+_RATIOS = {
+    ratio: int(w) / int(h)
+    for ratio, (w, h) in ASPECT_RATIO_DIMENSIONS.items()
+    if ratio != "auto"
+}
+
+_JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+}
+
+
+def _exif_orientation(exif):
+    """Return the EXIF orientation tag from an APP1 Exif payload, or 1."""
+    if len(exif) < 14 or exif[:6] != b"Exif\x00\x00":
+        return 1
+    tiff = exif[6:]
+    endian = "<" if tiff[:2] == b"II" else ">"
+    try:
+        (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+        (count,) = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, _, _ = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+            if tag == 0x0112:
+                (value,) = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])
+                return value
+    except struct.error:
+        pass
+    return 1
+
+
+def _jpeg_size(data):
+    """Scan JPEG markers for the frame header; returns (w, h, orientation)."""
+    orientation = 1
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        (length,) = struct.unpack(">H", data[offset + 2:offset + 4])
+        if marker == 0xE1:
+            orientation = _exif_orientation(bytes(data[offset + 4:offset + 2 + length]))
+        elif marker in _JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height, orientation
+        offset += 2 + length
+    return None
+
+
+def read_image_size(data):
+    """
+    Read (width, height) from an image header without decoding pixels.
+
+    JPEG EXIF orientations that rotate by 90 degrees are applied, so the
+    result is the size as displayed.
+
+    Args:
+        data: The first bytes of the file (HEADER_SCAN_BYTES is plenty).
+
+    Returns:
+        (width, height), or None if the format is unknown or truncated.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"\xff\xd8":
+        size = _jpeg_size(data)
+        if size is None:
+            return None
+        width, height, orientation = size
+        if orientation in (5, 6, 7, 8):
+            return height, width
+        return width, height
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(data[24:27], "little") + 1
+            height = int.from_bytes(data[27:30], "little") + 1
+            return width, height
+    return None
+
+
+def resolve_aspect_ratio(width, height):
+    """Return the supported ratio ("1:1", "16:9", "9:16") nearest to width/height."""
+    actual = math.log(width / height)
+    return min(_RATIOS, key=lambda ratio: abs(math.log(_RATIOS[ratio]) - actual))
+
+
+def _header_bytes(asset):
+    """Return the leading bytes of an asset, decoding only a base64 prefix."""
+    if asset.data is not None:
+        return asset.data[:HEADER_SCAN_BYTES]
+    prefix_chars = HEADER_SCAN_BYTES * 4 // 3
+    prefix = asset.data_base64[: prefix_chars - prefix_chars % 4]
+    return MediaAsset(asset.mime_type, data_base64=prefix).raw()
+
+
+def _downscale(asset, max_dimension):
+    """
+    Resize and re-encode an image with Pillow.
+
+    Returns:
+        (MediaAsset, (width, height)) for the re-encoded image, or None if
+        Pillow is unavailable or the result would not be smaller.
+    """
+    if Image is None:
+        return None
+
+    raw = asset.raw()
+    with Image.open(io.BytesIO(raw)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if asset.mime_type in ("image/jpeg", "image/jpg"):
+            img.convert("RGB").save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+            mime_type = "image/jpeg"
+        elif asset.mime_type == "image/webp":
+            img.save(out, format="WEBP", quality=JPEG_QUALITY)
+            mime_type = "image/webp"
+        else:
+            # PNG and GIF (first frame) keep lossless output
+            img.save(out, format="PNG", optimize=True)
+            mime_type = "image/png"
+        size = img.size
+
+    encoded = out.getvalue()
+    if len(encoded) >= len(raw):
+        return None
+    return MediaAsset(mime_type, data=encoded), size
+
+
+def probe_aspect_ratio(asset, aspect_ratio):
+    """
+    Resolve "auto" for an asset from its header alone, without decoding it.
+
+    Returns:
+        The supported ratio nearest the image's shape, or aspect_ratio
+        unchanged if it is not "auto" or the dimensions cannot be read.
+    """
+    if aspect_ratio != "auto":
+        return aspect_ratio
+    try:
+        size = read_image_size(_header_bytes(asset))
+    except ValueError:
+        size = None
+    if size is None or not all(size):
+        return aspect_ratio
+    return resolve_aspect_ratio(*size)
+
+
+def preflight_reference(asset, aspect_ratio, max_dimension=PREFLIGHT_MAX_DIMENSION):
+    """
+    Inspect and, if needed, shrink the reference image once per request.
+
+    Args:
+        asset: Reference image MediaAsset.
+        aspect_ratio: Requested aspect ratio ("auto" is resolved here).
+        max_dimension: Longest side allowed before downscaling.
+
+    Returns:
+        (asset, info) where asset is the (possibly replaced) MediaAsset and
+        info is a dict with original/sent dimensions and byte counts and the
+        resolved aspect ratio.
+    """
+    original_bytes = asset.raw_size
+    info = {
+        "original_width": None,
+        "original_height": None,
+        "sent_width": None,
+        "sent_height": None,
+        "original_bytes": original_bytes,
+        "sent_bytes": original_bytes,
+        "resized": False,
+        "resolved_aspect_ratio": aspect_ratio,
+    }
+
+    try:
+        size = read_image_size(_header_bytes(asset))
+    except ValueError:
+        size = None
+    if size is None or not all(size):
+        logger.info("Preflight could not read reference image dimensions")
+        return asset, info
+
+    width, height = size
+    info.update(original_width=width, original_height=height, sent_width=width, sent_height=height)
+    if aspect_ratio == "auto":
+        info["resolved_aspect_ratio"] = resolve_aspect_ratio(width, height)
+
+    if max(width, height) <= max_dimension:
+        return asset, info
+    if Image is None:
+        logger.info("Pillow not installed; sending %dx%d reference image as-is", width, height)
+        return asset, info
+
+    try:
+        downscaled = _downscale(asset, max_dimension)
+    except Exception as e:
+        logger.warning("Preflight downscale failed, sending original image: %s", e)
+        return asset, info
+    if downscaled is None:
+        return asset, info
+
+    new_asset, (sent_width, sent_height) = downscaled
+    info.update(
+        sent_width=sent_width,
+        sent_height=sent_height,
+        sent_bytes=len(new_asset.data),
+        resized=True,
+    )
+    return new_asset, info
@@ -0,0 +1,342 @@
+"""
+Background execution of generation jobs.
+
+POST /api/jobs stores a job and returns immediately; a small pool of
+worker threads picks jobs off an in-process queue and runs their segments
+through the same pipeline as /api/generate, saving each segment's outcome
+as soon as it finishes. Job state lives in the SQLite JobStore and the
+uploaded assets in the asset store, so when the process restarts, jobs
+that were queued or running are re-queued and only their unfinished
+segments are generated again.
+
+Workers only run while the process does: this suits local_server.py or
+any long-lived host. On a serverless platform the function may be frozen
+once the POST has been answered.
+"""
+
+import logging
+import os
+import queue
+import threading
+import uuid
+
+from .asset_store import put_asset, read_asset, register_pinned_assets
+from .job_store import (
+    get_default_store,
+    UNFINISHED_STATES,
+    SEGMENT_PENDING,
+    SEGMENT_RUNNING,
+)
+from .media import MediaAsset
+from .pipeline import (
+    iter_cell_results,
+    prepare_params,
+    resolve_overall_status,
+    MAX_DEADLINE_SECONDS,
+)
+from .prompt_builder import build_prompts_for_segments
+from .segments_data import get_segment_by_id
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Jobs are not bound by an HTTP request, so they get a longer default budget
+JOB_DEADLINE_SECONDS = float(os.environ.get("JOB_DEADLINE_SECONDS", str(MAX_DEADLINE_SECONDS)))
+JOB_URL_PREFIX = "/api/jobs/"
+
+# Generation parameters copied verbatim into the job spec
+_SPEC_PARAMS = (
+    "edit_areas",
+    "use_cache",
+    "upload_mode",
+    "preflight_enabled",
+    "brand_ci_mode",
+    "variants",
+    "context_cache",
+)
+
+
+def _store_asset(asset):
+    """Persist a MediaAsset in the asset store; return its spec reference."""
+    if asset is None:
+        return None
+    return {"sha256": put_asset(asset.raw(), asset.mime_type), "mime_type": asset.mime_type}
+
+
+def _load_asset(ref):
+    """Rebuild a MediaAsset from a spec reference."""
+    if ref is None:
+        return None
+    stored = read_asset(ref["sha256"])
+    if stored is None:
+        raise LookupError(f"Asset {ref['sha256']} is missing from the asset store")
+    return MediaAsset(ref["mime_type"], data=stored[0])
+
+
+def _unfinished_job_assets():
+    """Digests of the assets unfinished jobs still need (kept by asset eviction)."""
+    digests = set()
+    for spec in get_default_store().unfinished_job_specs():
+        refs = [spec.get("reference_image"), spec.get("brand_ci"), *spec.get("references", [])]
+        digests.update(ref["sha256"] for ref in refs if ref)
+    return digests
+
+
+register_pinned_assets(_unfinished_job_assets)
+
+
+def build_job_spec(params, max_concurrency, deadline_seconds=None):
+    """
+    Build the durable spec for a job from /api/generate-style parameters.
+
+    Uploaded assets are written to the asset store and referenced by
+    digest, so the spec stays small and survives restarts.
+
+    Raises:
+        OSError: If the asset store cannot be written.
+    """
+    spec = {key: params[key] for key in _SPEC_PARAMS}
+    spec.update(
+        aspect_ratio=params["aspect_ratio"],
+        reference_image=_store_asset(params["reference_image"]),
+        brand_ci=_store_asset(params.get("brand_ci")),
+        max_concurrency=max_concurrency,
+        deadline_seconds=deadline_seconds or JOB_DEADLINE_SECONDS,
+    )
+    return spec
+
+
+def build_campaign_spec(params, references, cells, max_concurrency, deadline_seconds=None):
+    """
+    Build the durable spec for a campaign matrix job.
+
+    Args:
+        params: Shared generation params (brand CI and settings, no
+            reference image).
+        references: Distinct reference MediaAssets (see plan_cells).
+        cells: Cell dicts from plan_cells; job segment rows follow this order.
+        max_concurrency: Cells generated in parallel.
+        deadline_seconds: Optional budget for the whole campaign.
+
+    Raises:
+        OSError: If the asset store cannot be written.
+    """
+    spec = {key: params[key] for key in _SPEC_PARAMS}
+    spec.update(
+        references=[_store_asset(asset) for asset in references],
+        cells=cells,
+        brand_ci=_store_asset(params.get("brand_ci")),
+        max_concurrency=max_concurrency,
+        deadline_seconds=deadline_seconds or JOB_DEADLINE_SECONDS,
+    )
+    return spec
+
+
+def _params_from_spec(job_id, spec, reference):
+    """Rebuild pipeline params for one reference image from a stored spec."""
+    # Specs stored before a setting existed fall back to its default
+    params = {key: spec[key] for key in _SPEC_PARAMS if key in spec}
+    params.update(
+        request_id=job_id,
+        reference_image=_load_asset(reference),
+        brand_ci=_load_asset(spec.get("brand_ci")),
+        # Results are polled repeatedly; keep images out of the job rows
+        image_delivery="url",
+    )
+    return params
+
+
+def _job_cells(job_id, spec, pending):
+    """
+    Build (segment, params, prompt) cells for a job's unfinished rows.
+
+    Single jobs share one params dict. Campaigns prepare each reference
+    once (preflight, brand digest, uploads) and derive a params dict per
+    aspect ratio; prompts are built per (reference, aspect ratio) group.
+    """
+    if "cells" not in spec:
+        params = _params_from_spec(job_id, spec, spec["reference_image"])
+        params["aspect_ratio"] = spec["aspect_ratio"]
+        prepare_params(params)
+        return [(get_segment_by_id(row["segment_id"]), params, None) for row in pending]
+
+    base_params = {}
+    groups = {}  # (reference, aspect_ratio) -> [(position in pending, segment)]
+    for i, row in enumerate(pending):
+        cell = spec["cells"][row["position"]]
+        ref = cell["reference"]
+        if ref not in base_params:
+            params = _params_from_spec(job_id, spec, spec["references"][ref])
+            params["aspect_ratio"] = "auto"
+            base_params[ref] = prepare_params(params)
+        groups.setdefault((ref, cell["aspect_ratio"]), []).append(
+            (i, get_segment_by_id(row["segment_id"]))
+        )
+
+    cells = [None] * len(pending)
+    for (ref, aspect_ratio), members in groups.items():
+        params = dict(base_params[ref], aspect_ratio=aspect_ratio, resolved_aspect_ratio=aspect_ratio)
+        prompts = build_prompts_for_segments(
+            [segment for _, segment in members],
+            params["edit_areas"],
+            aspect_ratio,
+            has_brand_ci=params["brand_ci"] is not None,
+            brand_ci_summary=params["brand_ci_summary"],
+        )
+        for (i, _), (segment, prompt) in zip(members, prompts):
+            cells[i] = (segment, params, prompt)
+    return cells
+
+
+def job_url(job_id):
+    """Return the API URL that reports a job's status."""
+    return f"{JOB_URL_PREFIX}{job_id}"
+
+
+def describe_job(job):
+    """
+    Render a stored job as the public status document.
+
+    Finished segments carry their result (or error) dict; images are
+    referenced by /api/assets URLs. Campaign rows also name their
+    reference image and aspect ratio.
+    """
+    cells = job["spec"].get("cells")
+    segments = []
+    counts = {"success": 0, "error": 0}
+    for seg in job["segments"]:
+        if seg["status"] in counts:
+            counts[seg["status"]] += 1
+        entry = {
+            "index": seg["position"],
+            "segment_id": seg["segment_id"],
+            "status": seg["status"],
+            "finished_at": seg["finished_at"],
+            "result": seg["outcome"],
+        }
+        if cells:
+            cell = cells[seg["position"]]
+            entry.update(reference=cell["reference"], aspect_ratio=cell["aspect_ratio"])
+        segments.append(entry)
+    return {
+        "job_id": job["id"],
+        "kind": "campaign" if cells else "generate",
+        "status": job["status"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "total_segments": len(segments),
+        "completed_segments": counts["success"] + counts["error"],
+        "successful": counts["success"],
+        "failed": counts["error"],
+        "segments": segments,
+    }
+
+
+class JobRunner:
+    """Worker threads draining an in-process queue of job IDs."""
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._active = 0
+
+    def start(self):
+        """Start the workers and re-queue unfinished jobs (idempotent)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+            recovered = self.store.unfinished_job_ids()
+        for job_id in recovered:
+            self._queue.put(job_id)
+        if recovered:
+            logger.info("Resuming %d unfinished job(s)", len(recovered))
+
+    def submit(self, spec, segment_ids):
+        """
+        Store a new job and queue it.
+
+        Returns:
+            The new job ID.
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        self.store.create_job(job_id, spec, segment_ids)
+        self._queue.put(job_id)
+        return job_id
+
+    def stats(self):
+        """Return worker and queue counters."""
+        with self._lock:
+            return {
+                "workers": self.workers if self._started else 0,
+                "active": self._active,
+                "queued": self._queue.qsize(),
+            }
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                self._active += 1
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self.store.finish_job(job_id, "failed", error=str(e))
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def _run(self, job_id):
+        job = self.store.get_job(job_id)
+        if job is None or job["status"] not in UNFINISHED_STATES:
+            return
+        self.store.mark_running(job_id)
+        spec = job["spec"]
+
+        pending = [
+            seg for seg in job["segments"]
+            if seg["status"] in (SEGMENT_PENDING, SEGMENT_RUNNING)
+        ]
+        if pending:
+            try:
+                cells = _job_cells(job_id, spec, pending)
+            except LookupError as e:
+                self.store.finish_job(job_id, "failed", error=str(e))
+                return
+
+            positions = [seg["position"] for seg in pending]
+            self.store.mark_segments_running(job_id, positions)
+            for index, outcome in iter_cell_results(
+                cells, spec["max_concurrency"], spec["deadline_seconds"]
+            ):
+                self.store.save_outcome(job_id, positions[index], outcome)
+
+        statuses = [seg["status"] for seg in self.store.get_job(job_id)["segments"]]
+        successful = statuses.count("success")
+        status, _ = resolve_overall_status(successful, len(statuses) - successful)
+        self.store.finish_job(job_id, status)
+        logger.info("Job %s finished: %s", job_id, status)
+
+
+_default_runner = None
+_default_runner_lock = threading.Lock()
+
+
+def get_default_runner():
+    """Return the process-wide job runner, starting its workers on first use."""
+    global _default_runner
+    with _default_runner_lock:
+        if _default_runner is None:
+            _default_runner = JobRunner(get_default_store())
+        runner = _default_runner
+    runner.start()
+    return runner
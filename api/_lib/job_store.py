@@ -0,0 +1,199 @@
+"""
+Durable SQLite store for asynchronous generation jobs.
+
+A job row keeps the request spec (generation parameters plus asset-store
+digests of the uploaded reference image and brand CI PDF), and one row
+per segment tracks that segment's status and final result. Because the
+spec and assets live on disk, jobs that were queued or running when the
+server stopped can be picked up again on the next start.
+
+The database runs in WAL mode so status polls read while workers write.
+Each call opens its own short-lived connection, which keeps the store
+safe to use from any thread.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_PATH = os.environ.get(
+    "JOB_STORE_PATH",
+    os.path.join(tempfile.gettempdir(), "creative-studio-jobs.sqlite3"),
+)
+BUSY_TIMEOUT_SECONDS = 10
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+UNFINISHED_STATES = (QUEUED, RUNNING)
+
+# Segment states (finished segments take the outcome status: success / error)
+SEGMENT_PENDING = "pending"
+SEGMENT_RUNNING = "running"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS job_segments (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    position INTEGER NOT NULL,
+    segment_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outcome TEXT,
+    finished_at REAL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+class JobStore:
+    """Jobs and their per-segment outcomes in one SQLite database."""
+
+    def __init__(self, path=None):
+        self.path = path or JOB_STORE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_job(self, job_id, spec, segment_ids):
+        """
+        Insert a queued job with one pending row per segment.
+
+        Args:
+            job_id: Unique job identifier.
+            spec: JSON-serializable dict needed to run the job.
+            segment_ids: Segment IDs in request order.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, spec, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(spec), now),
+            )
+            conn.executemany(
+                "INSERT INTO job_segments (job_id, position, segment_id, status) "
+                "VALUES (?, ?, ?, ?)",
+                [(job_id, i, sid, SEGMENT_PENDING) for i, sid in enumerate(segment_ids)],
+            )
+
+    def get_job(self, job_id):
+        """
+        Load a job with its segments.
+
+        Returns:
+            Dict with id, status, spec, error, timestamps and a segments list
+            (position, segment_id, status, outcome, finished_at), or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            segment_rows = conn.execute(
+                "SELECT position, segment_id, status, outcome, finished_at "
+                "FROM job_segments WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        job = dict(row)
+        job["spec"] = json.loads(job["spec"])
+        job["segments"] = [
+            dict(seg, outcome=json.loads(seg["outcome"]) if seg["outcome"] else None)
+            for seg in segment_rows
+        ]
+        return job
+
+    def mark_running(self, job_id):
+        """Move a job to running and its unfinished segments back to pending."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+            conn.execute(
+                "UPDATE job_segments SET status = ? WHERE job_id = ? AND status = ?",
+                (SEGMENT_PENDING, job_id, SEGMENT_RUNNING),
+            )
+
+    def mark_segments_running(self, job_id, positions):
+        """Flag the given segment positions as in progress."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_segments SET status = ? WHERE job_id = ? AND position = ?",
+                [(SEGMENT_RUNNING, job_id, position) for position in positions],
+            )
+
+    def save_outcome(self, job_id, position, outcome):
+        """Store a finished segment's result or error dict."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_segments SET status = ?, outcome = ?, finished_at = ? "
+                "WHERE job_id = ? AND position = ?",
+                (outcome["status"], json.dumps(outcome), time.time(), job_id, position),
+            )
+
+    def finish_job(self, job_id, status, error=None):
+        """Record a job's final status."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def unfinished_job_ids(self):
+        """Return IDs of queued or running jobs, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                UNFINISHED_STATES,
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def unfinished_job_specs(self):
+        """Return the specs of queued or running jobs."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT spec FROM jobs WHERE status IN (?, ?)", UNFINISHED_STATES
+            ).fetchall()
+        return [json.loads(row["spec"]) for row in rows]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """Return the process-wide job store at JOB_STORE_PATH."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+        return _default_store
@@ -0,0 +1,89 @@
+"""
+Reference asset container shared by the request handlers and Gemini client.
+
+A MediaAsset keeps an uploaded file in the form it arrived in - raw bytes
+from a multipart upload or a base64 string from a JSON body - and converts
+lazily, so raw uploads are base64-encoded only at the single point where
+they are written into a Gemini request.
+"""
+
+import base64
+import binascii
+import hashlib
+
+
+class MediaAsset:
+    """An image or document supplied with a generation request."""
+
+    def __init__(self, mime_type, data=None, data_base64=None):
+        """
+        Args:
+            mime_type: MIME type of the asset.
+            data: Raw bytes (multipart uploads).
+            data_base64: Base64 string (JSON bodies). Exactly one of data /
+                data_base64 should be given.
+        """
+        if data is None and data_base64 is None:
+            raise ValueError("MediaAsset requires data or data_base64.")
+        self.mime_type = mime_type
+        self.data = data
+        self.data_base64 = data_base64
+        self._digest = None
+
+    @classmethod
+    def from_base64(cls, mime_type, data_base64):
+        """Build an asset from a base64 string, or return None if it is empty."""
+        if not data_base64:
+            return None
+        return cls(mime_type, data_base64=data_base64)
+
+    @property
+    def base64_size(self):
+        """Length of the asset once base64-encoded, without encoding it."""
+        if self.data_base64 is not None:
+            return len(self.data_base64)
+        return 4 * ((len(self.data) + 2) // 3)
+
+    @property
+    def raw_size(self):
+        """Size of the raw bytes, computed from the base64 length if needed."""
+        if self.data is not None:
+            return len(self.data)
+        return len(self.data_base64) * 3 // 4 - self.data_base64[-2:].count("=")
+
+    def raw(self):
+        """
+        Return the raw bytes, decoding base64 input on demand (not cached).
+
+        Raises:
+            ValueError: If the base64 input is malformed.
+        """
+        if self.data is not None:
+            return self.data
+        try:
+            return base64.b64decode(self.data_base64)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64 data: {e}")
+
+    def base64(self):
+        """Return the base64 string, encoding raw input on demand (not cached)."""
+        if self.data_base64 is not None:
+            return self.data_base64
+        return base64.b64encode(self.data).decode("ascii")
+
+    @property
+    def digest(self):
+        """
+        SHA-256 hex digest of the raw bytes, computed once.
+
+        Hashing raw bytes means the same file gets the same digest whether it
+        arrived as multipart or base64 JSON. Undecodable base64 falls back
+        to hashing the string itself.
+        """
+        if self._digest is None:
+            try:
+                raw = self.raw()
+            except ValueError:
+                raw = self.data_base64.encode("ascii", errors="surrogateescape")
+            self._digest = hashlib.sha256(raw).hexdigest()
+        return self._digest
@@ -0,0 +1,268 @@
+"""
+Low-overhead request metrics: per-stage timers, byte counters and
+upstream status counts.
+
+Code times a stage with `with stage("name"):` (or record_stage). Each
+timing is observed into a process-wide histogram, exposed in Prometheus
+text format by /api/metrics, and also added to the current request's
+RequestTimings, if one is active. RequestTimings sums the stages of one
+request and renders them as a Server-Timing header.
+
+The current RequestTimings is kept in a context variable. Work handed to
+other threads must run in a copy of the caller's context (see
+run_in_context) so its stages are credited to the right request.
+
+Metrics are per process; on Vercel each instance reports its own.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """A monotonically increasing counter with optional labels."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        """Add amount to the series for the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """A cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Record one observation for the given label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        bounds = self.buckets + (float("inf"),)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "creative_stage_duration_seconds",
+    "Time spent in each request-handling stage.",
+    ("stage",),
+)
+HTTP_REQUESTS = Counter(
+    "creative_http_requests_total",
+    "API requests handled, by endpoint and response status.",
+    ("endpoint", "status"),
+)
+HTTP_REQUEST_BYTES = Counter(
+    "creative_http_request_bytes_total",
+    "Request body bytes received by the API.",
+    ("endpoint",),
+)
+HTTP_RESPONSE_BYTES = Counter(
+    "creative_http_response_bytes_total",
+    "Response body bytes sent by the API.",
+    ("endpoint",),
+)
+UPSTREAM_RESPONSES = Counter(
+    "creative_gemini_responses_total",
+    "Gemini API calls by HTTP status (or timeout / connection_error).",
+    ("status",),
+)
+UPSTREAM_REQUEST_BYTES = Counter(
+    "creative_gemini_request_bytes_total",
+    "Request body bytes sent to the Gemini API.",
+)
+UPSTREAM_RESPONSE_BYTES = Counter(
+    "creative_gemini_response_bytes_total",
+    "Response body bytes received from the Gemini API.",
+)
+COALESCED_CALLS = Counter(
+    "creative_coalesced_calls_total",
+    "Calls served by an identical call already in flight, by kind.",
+    ("flight",),
+)
+
+REGISTRY = (
+    STAGE_SECONDS,
+    HTTP_REQUESTS,
+    HTTP_REQUEST_BYTES,
+    HTTP_RESPONSE_BYTES,
+    UPSTREAM_RESPONSES,
+    UPSTREAM_REQUEST_BYTES,
+    UPSTREAM_RESPONSE_BYTES,
+    COALESCED_CALLS,
+)
+
+
+def render_metrics():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Per-request stage totals, safe to add to from worker threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages = {}  # stage -> [seconds, count], in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                self._stages[stage] = [seconds, 1]
+            else:
+                totals[0] += seconds
+                totals[1] += 1
+
+    def as_dict(self):
+        """Return {stage: {"ms": total milliseconds, "count": n}}."""
+        with self._lock:
+            return {
+                stage: {"ms": round(seconds * 1000, 3), "count": count}
+                for stage, (seconds, count) in self._stages.items()
+            }
+
+    def server_timing(self):
+        """
+        Render the Server-Timing header value.
+
+        Stages that ran more than once (e.g. one Gemini call per segment,
+        in parallel) report their summed duration, so they can add up to
+        more than total.
+        """
+        entries = []
+        for stage, totals in self.as_dict().items():
+            entry = f"{stage};dur={totals['ms']:.2f}"
+            if totals["count"] > 1:
+                entry += f';desc="{totals["count"]} calls"'
+            entries.append(entry)
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings():
+    """Begin collecting stage timings for the current request."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings():
+    """Return the current request's RequestTimings, or None."""
+    return _current_timings.get()
+
+
+def run_in_context(fn):
+    """
+    Wrap fn to run in a copy of the caller's context, so stages recorded
+    on another thread are credited to the caller's request. Wrap once per
+    submitted task: a context cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return run
+
+
+def endpoint_name(handler_instance):
+    """Label for a handler's endpoint: its module name (e.g. "generate")."""
+    return type(handler_instance).__module__.rsplit(".", 1)[-1]
+
+
+def record_stage(stage, seconds):
+    """Observe one stage duration in the histogram and the current request."""
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one occurrence of a stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
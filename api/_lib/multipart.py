@@ -0,0 +1,160 @@
+"""
+Streaming multipart/form-data parser for request handlers.
+
+Reads the request body from rfile in fixed-size chunks and appends each
+part's payload straight into its own buffer, so file uploads are held once
+as raw bytes instead of as a full body copy plus decoded copies.
+"""
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class MultipartError(ValueError):
+    """Raised when a multipart body is malformed or exceeds its limits."""
+
+
+def get_boundary(content_type):
+    """
+    Extract the boundary parameter from a multipart Content-Type header.
+
+    Returns:
+        The boundary as bytes, or None if the header is not multipart/form-data.
+    """
+    if not content_type:
+        return None
+    media_type, _, params = content_type.partition(";")
+    if media_type.strip().lower() != "multipart/form-data":
+        return None
+    for param in params.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip().strip('"').encode("latin-1")
+    return None
+
+
+def _parse_part_headers(raw_headers):
+    """Parse a part's header block into (name, filename, content_type)."""
+    name = None
+    filename = None
+    content_type = None
+    for line in raw_headers.decode("utf-8", errors="replace").split("\r\n"):
+        key, _, value = line.partition(":")
+        key = key.strip().lower()
+        if key == "content-disposition":
+            for param in value.split(";")[1:]:
+                pkey, _, pvalue = param.strip().partition("=")
+                pvalue = pvalue.strip().strip('"')
+                if pkey.lower() == "name":
+                    name = pvalue
+                elif pkey.lower() == "filename":
+                    filename = pvalue
+        elif key == "content-type":
+            content_type = value.strip()
+    return name, filename, content_type
+
+
+class _BodyReader:
+    """Reads at most `remaining` bytes from rfile in chunks."""
+
+    def __init__(self, rfile, content_length):
+        self.rfile = rfile
+        self.remaining = content_length
+
+    def read(self):
+        if self.remaining <= 0:
+            return b""
+        chunk = self.rfile.read(min(CHUNK_SIZE, self.remaining))
+        if not chunk:
+            raise MultipartError("Request body ended before Content-Length bytes were read.")
+        self.remaining -= len(chunk)
+        return chunk
+
+
+def parse_multipart(rfile, content_length, boundary, max_part_bytes):
+    """
+    Parse a multipart/form-data body incrementally.
+
+    Args:
+        rfile: Readable binary stream positioned at the start of the body.
+        content_length: Number of body bytes to read.
+        boundary: Boundary bytes from get_boundary().
+        max_part_bytes: Maximum size of any single part; larger parts abort
+            parsing before they are fully buffered.
+
+    Returns:
+        Dict mapping field name -> {"data": bytearray, "filename": str or
+        None, "content_type": str or None}. Repeated names keep the last part.
+
+    Raises:
+        MultipartError: If the body is malformed or a part is too large.
+    """
+    reader = _BodyReader(rfile, content_length)
+    delimiter = b"\r\n--" + boundary
+    buffer = bytearray()
+    parts = {}
+
+    def fill():
+        chunk = reader.read()
+        if not chunk:
+            raise MultipartError("Unexpected end of multipart body.")
+        buffer.extend(chunk)
+
+    # Skip the preamble up to the first boundary. Prefixing CRLF lets the
+    # opening boundary match the same delimiter as later ones.
+    buffer.extend(b"\r\n")
+    while True:
+        index = buffer.find(delimiter)
+        if index >= 0:
+            del buffer[: index + len(delimiter)]
+            break
+        if len(buffer) > MAX_HEADER_BYTES:
+            raise MultipartError("Multipart boundary not found.")
+        fill()
+
+    while True:
+        while len(buffer) < 2:
+            fill()
+        if buffer[:2] == b"--":
+            return parts  # closing boundary; ignore the epilogue
+        if buffer[:2] != b"\r\n":
+            raise MultipartError("Malformed multipart boundary line.")
+        del buffer[:2]
+
+        # Part headers
+        while True:
+            end = buffer.find(b"\r\n\r\n")
+            if end >= 0:
+                break
+            if len(buffer) > MAX_HEADER_BYTES:
+                raise MultipartError("Multipart part headers too large.")
+            fill()
+        name, filename, content_type = _parse_part_headers(bytes(buffer[:end]))
+        del buffer[: end + 4]
+        if not name:
+            raise MultipartError("Multipart part is missing a field name.")
+
+        # Part body: move everything that cannot be the start of the
+        # delimiter into the part's own buffer as it arrives
+        data = bytearray()
+        while True:
+            index = buffer.find(delimiter)
+            if index >= 0:
+                data += buffer[:index]
+                del buffer[: index + len(delimiter)]
+                break
+            keep = len(delimiter) - 1
+            if len(buffer) > keep:
+                data += buffer[:-keep]
+                del buffer[:-keep]
+            if len(data) > max_part_bytes:
+                raise MultipartError(f"Multipart field '{name}' exceeds {max_part_bytes} bytes.")
+            fill()
+        if len(data) > max_part_bytes:
+            raise MultipartError(f"Multipart field '{name}' exceeds {max_part_bytes} bytes.")
+
+        parts[name] = {
+            "data": data,
+            "filename": filename,
+            "content_type": content_type,
+        }
@@ -0,0 +1,714 @@
+"""
+Per-segment generation pipeline shared by the API handlers.
+
+Runs build_prompt + generate_image for each requested segment, either one
+after another or fanned out over a bounded thread pool, and shapes the
+per-segment result / error dicts returned by /api/generate. Identical
+generations are served from the result cache when enabled.
+
+With GENERATE_ENGINE=asyncio the segments run instead as tasks on the
+shared event loop (see event_loop.py) through generate_image_async; a
+segment still running at the request deadline is cancelled, which also
+abandons its upstream call. The synchronous entry points below keep the
+same interface for both engines.
+
+Identical generations already in flight (same result cache key) share one
+Gemini call through gemini_client.GENERATE_FLIGHTS; set
+GENERATE_COALESCE=0 to give every segment its own call.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .prompt_builder import build_prompt, build_prompt_prefix, split_prompt
+from .gemini_client import (
+    generate_image,
+    generate_image_async,
+    GeminiClientError,
+    REQUEST_TIMEOUT,
+    GEMINI_MODEL,
+    GENERATION_CONFIG,
+    UPLOAD_MODE,
+    CONTEXT_CACHE_ENABLED,
+    ensure_file_uri,
+    ensure_cached_content,
+    RequestBodyTemplate,
+    GENERATE_FLIGHTS,
+)
+from .single_flight import SingleFlightTimeout
+from .result_cache import get_default_cache, build_cache_key
+from .asset_store import put_asset, asset_url
+from .image_preflight import preflight_reference, PREFLIGHT_ENABLED
+from .brand_ci import get_brand_ci_summary, format_brand_ci_summary, BRAND_CI_MODE
+from .history_store import record_generation
+from .metrics import stage, record_stage, run_in_context
+from .event_loop import iterate_blocking
+
+logger = logging.getLogger(__name__)
+
+# Concurrency / deadline defaults (overridable per deployment via env)
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("GENERATE_MAX_CONCURRENCY", "4"))
+DEFAULT_DEADLINE_SECONDS = float(os.environ.get("GENERATE_DEADLINE_SECONDS", "110"))
+MAX_DEADLINE_SECONDS = 900
+
+# How generated images are returned: inline base64 or /api/assets URLs
+IMAGE_DELIVERY = os.environ.get("GENERATE_IMAGE_DELIVERY", "inline")
+IMAGE_DELIVERY_MODES = {"inline", "url"}
+
+# How segments run: "threads" (one pool thread per in-flight segment) or
+# "asyncio" (tasks on one event loop; scales to many slow upstream calls)
+GENERATE_ENGINE = os.environ.get("GENERATE_ENGINE", "threads")
+GENERATE_ENGINES = {"threads", "asyncio"}
+
+# Share one Gemini call between identical generations in flight at once
+COALESCE_ENABLED = os.environ.get("GENERATE_COALESCE", "1") != "0"
+
+# Per-call fields of a generate_image result that are not cached or shared
+_CALL_FIELDS = ("attempts", "rate_limit_wait_seconds", "usage")
+
+
+def _timeout_error(segment, queue_seconds=None):
+    """Build the error dict for a segment that missed the request deadline."""
+    error = {
+        "segment_id": segment["id"],
+        "segment_name": segment["name"],
+        "error": "Request deadline exceeded before generation finished.",
+        "details": None,
+        "generation_time_seconds": 0,
+        "status": "error",
+    }
+    if queue_seconds is not None:
+        error["queue_time_seconds"] = round(queue_seconds, 2)
+    return error
+
+
+def _deliver_as_url(result):
+    """
+    Move a result's image into the asset store and reference it by URL.
+
+    Falls back to leaving image_base64 inline if the store is unavailable.
+    """
+    try:
+        data = base64.b64decode(result["image_base64"])
+        digest = put_asset(data, result["image_mime"])
+    except (OSError, ValueError) as e:
+        logger.warning("Asset store unavailable, returning image inline: %s", e)
+        return result
+
+    del result["image_base64"]
+    result["image_url"] = asset_url(digest)
+    result["image_sha256"] = digest
+    result["image_size_bytes"] = len(data)
+    return result
+
+
+def prepare_params(params):
+    """
+    Compute per-request values shared by every segment.
+
+    Assigns a request_id (unless the caller supplied one), records the
+    uploaded reference image's digest for history, runs the reference
+    image preflight (dimension probe, "auto" aspect ratio resolution,
+    downscaling), digests the brand CI PDF into prompt text (brand_ci_mode
+    "digest"), in "files" upload mode uploads each distinct asset once so
+    segment calls can reference it by URI, with context_cache registers
+    the shared prompt prefix and assets as a Gemini cached content, and
+    pre-serializes the shared part of the request body. Safe to call
+    repeatedly; values already present are kept, so this work happens once
+    per request rather than once per segment.
+    """
+    if "request_id" not in params:
+        params["request_id"] = uuid.uuid4().hex
+    if "source_reference_sha256" not in params:
+        # History is keyed by the uploaded image, before any downscaling
+        params["source_reference_sha256"] = params["reference_image"].digest
+
+    if "preflight" not in params:
+        params["preflight"] = None
+        params["resolved_aspect_ratio"] = params["aspect_ratio"]
+        if params.get("preflight_enabled", PREFLIGHT_ENABLED):
+            params["reference_image"], params["preflight"] = preflight_reference(
+                params["reference_image"], params["aspect_ratio"]
+            )
+            params["resolved_aspect_ratio"] = params["preflight"]["resolved_aspect_ratio"]
+
+    reference_image = params["reference_image"]
+    brand_ci = params.get("brand_ci")
+
+    if "brand_ci_summary" not in params:
+        params["brand_ci_summary"] = None
+        if brand_ci is not None and params.get("brand_ci_mode", BRAND_CI_MODE) == "digest":
+            summary = get_brand_ci_summary(brand_ci)
+            if summary is not None:
+                params["brand_ci_summary"] = format_brand_ci_summary(summary)
+        # Record what was actually used, since digestion falls back to the PDF
+        if brand_ci is None:
+            params["brand_ci_mode"] = None
+        else:
+            params["brand_ci_mode"] = "digest" if params["brand_ci_summary"] else "pdf"
+
+    # With a digest in the prompt the PDF itself is not sent
+    attached_brand_ci = brand_ci if params["brand_ci_mode"] == "pdf" else None
+
+    if "reference_file_uri" not in params:
+        params["reference_file_uri"] = None
+        params["brand_ci_file_uri"] = None
+        if params.get("upload_mode", UPLOAD_MODE) == "files":
+            params["reference_file_uri"] = ensure_file_uri(reference_image)
+            if attached_brand_ci is not None:
+                params["brand_ci_file_uri"] = ensure_file_uri(attached_brand_ci)
+        # Record what was actually used, since failed uploads fall back to inline
+        params["upload_mode"] = "files" if params["reference_file_uri"] else "inline"
+
+    if "cached_content" not in params:
+        params["prompt_prefix"] = build_prompt_prefix(
+            has_brand_ci=brand_ci is not None,
+            brand_ci_summary=params["brand_ci_summary"],
+        )
+        params["cached_content"] = None
+        if params.get("context_cache", CONTEXT_CACHE_ENABLED):
+            params["cached_content"] = ensure_cached_content(
+                params["prompt_prefix"],
+                reference_image,
+                attached_brand_ci,
+                reference_file_uri=params["reference_file_uri"],
+                brand_ci_file_uri=params["brand_ci_file_uri"],
+            )
+        # Record what was actually used, since caching falls back to full prompts
+        params["context_cache"] = params["cached_content"] is not None
+
+    if "body_template" not in params:
+        # Serialize the heavy shared parts once; segments only add their prompt
+        params["body_template"] = RequestBodyTemplate(
+            reference_image,
+            attached_brand_ci,
+            reference_file_uri=params["reference_file_uri"],
+            brand_ci_file_uri=params["brand_ci_file_uri"],
+        )
+        params["cached_body_template"] = None
+        if params["cached_content"]:
+            params["cached_body_template"] = RequestBodyTemplate(
+                reference_image, cached_content=params["cached_content"]
+            )
+    return params
+
+
+def _segment_timeout(deadline):
+    """Seconds the segment may spend upstream, or None if the deadline has passed."""
+    if deadline is None:
+        return REQUEST_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    return min(REQUEST_TIMEOUT, remaining)
+
+
+def _plan_segment(segment, params, prompt):
+    """
+    Build the prompt, look up the result cache and pick the request body.
+
+    Returns:
+        Dict with prompt, variants, cache, cache_key, cached (the cached
+        generation result, or None), flight_key (the key identical
+        in-flight calls coalesce on, or None) and request (generate_image
+        keyword arguments apart from timeout).
+    """
+    brand_ci = params.get("brand_ci")
+    has_brand_ci = brand_ci is not None
+    if prompt is None:
+        with stage("prompt"):
+            prompt = build_prompt(
+                segment=segment,
+                edit_areas=params["edit_areas"],
+                aspect_ratio=params["resolved_aspect_ratio"],
+                has_brand_ci=has_brand_ci,
+                brand_ci_summary=params["brand_ci_summary"],
+            )
+
+    variants = params.get("variants") or 1
+    generation_config = GENERATION_CONFIG
+    if variants > 1:
+        generation_config = dict(GENERATION_CONFIG, candidateCount=variants)
+
+    cache = get_default_cache() if params.get("use_cache", True) else None
+    cache_key = None
+    cached = None
+    if cache is not None or COALESCE_ENABLED:
+        cache_key = build_cache_key(
+            params["reference_image"].digest,
+            brand_ci.digest if has_brand_ci else "",
+            prompt,
+            GEMINI_MODEL,
+            generation_config,
+        )
+    if cache is not None:
+        cached = cache.get(cache_key)
+
+    # With a context cache the prefix and assets are already upstream
+    body_template = params["body_template"]
+    request_prompt = prompt
+    suffix = split_prompt(prompt, params["prompt_prefix"])
+    if params["cached_body_template"] is not None and suffix is not None:
+        body_template = params["cached_body_template"]
+        request_prompt = suffix
+
+    return {
+        "prompt": prompt,
+        "variants": variants,
+        "cache": cache,
+        "cache_key": cache_key,
+        "cached": cached,
+        "flight_key": cache_key if COALESCE_ENABLED else None,
+        "request": {
+            "prompt": request_prompt,
+            "reference_image_base64": None,
+            "reference_image_mime": params["reference_image"].mime_type,
+            "body_template": body_template,
+            "variants": variants,
+        },
+    }
+
+
+def _finish_segment(segment, params, plan, generation_result, segment_start, coalesced=False):
+    """
+    Cache a fresh generation and shape the segment's result dict.
+
+    generation_result is not modified: a coalesced result is shared with
+    the segment that made the call. Like a cache hit, a coalesced segment
+    reports no attempts or usage of its own.
+    """
+    cache_hit = plan["cached"] is not None
+    attempts = []
+    rate_limit_wait = 0.0
+    usage = None
+    if not cache_hit and not coalesced:
+        attempts = generation_result.get("attempts", [])
+        rate_limit_wait = generation_result.get("rate_limit_wait_seconds", 0.0)
+        usage = generation_result.get("usage")
+        if plan["cache"] is not None:
+            plan["cache"].set(
+                plan["cache_key"],
+                {key: value for key, value in generation_result.items() if key not in _CALL_FIELDS},
+            )
+
+    result = {
+        "segment_id": segment["id"],
+        "segment_name": segment["name"],
+        "image_base64": generation_result["image_base64"],
+        "image_mime": generation_result["image_mime"],
+        "description": generation_result.get("text"),
+        "prompt_used": plan["prompt"],
+        "cache_hit": cache_hit,
+        "coalesced": coalesced,
+        "attempt_count": len(attempts),
+        "attempts": attempts,
+        "rate_limit_wait_seconds": rate_limit_wait,
+        "usage": usage,
+        "status": "success",
+    }
+    if plan["variants"] > 1:
+        result["additional_variants"] = [
+            {
+                "image_base64": variant["image_base64"],
+                "image_mime": variant["image_mime"],
+                "description": variant.get("text"),
+            }
+            for variant in generation_result.get("additional_variants", [])
+        ]
+        result["variant_count"] = 1 + len(result["additional_variants"])
+        result["variants_mode"] = generation_result.get("variants_mode")
+    if params.get("image_delivery", IMAGE_DELIVERY) == "url":
+        _deliver_as_url(result)
+        for variant in result.get("additional_variants", []):
+            _deliver_as_url(variant)
+
+    result["generation_time_seconds"] = round(time.time() - segment_start, 2)
+    return result
+
+
+def _gemini_error(segment, error, segment_start):
+    """Build the error dict for a segment whose Gemini call failed."""
+    segment_duration = round(time.time() - segment_start, 2)
+    logger.error("Gemini error for segment %s: %s", segment["id"], str(error))
+    return {
+        "segment_id": segment["id"],
+        "segment_name": segment["name"],
+        "error": str(error),
+        "details": error.details,
+        "status_code": error.status_code,
+        "attempt_count": len(error.attempts or []),
+        "attempts": error.attempts or [],
+        "generation_time_seconds": segment_duration,
+        "status": "error",
+    }
+
+
+def _internal_error(segment, error, segment_start):
+    """Build the error dict for a segment that failed unexpectedly."""
+    segment_duration = round(time.time() - segment_start, 2)
+    logger.error(
+        "Unexpected error for segment %s: %s\n%s",
+        segment["id"],
+        str(error),
+        traceback.format_exc(),
+    )
+    return {
+        "segment_id": segment["id"],
+        "segment_name": segment["name"],
+        "error": f"Internal error: {str(error)}",
+        "generation_time_seconds": segment_duration,
+        "status": "error",
+    }
+
+
+def _coalesced_timeout():
+    """The error a segment gets when the identical call it joined outlives its timeout."""
+    return GeminiClientError("Gemini API request timed out.", status_code=504)
+
+
+def _generate(plan, timeout):
+    """
+    Call generate_image for a planned segment, sharing the call with an
+    identical one already in flight.
+
+    Returns:
+        (generation_result, coalesced)
+    """
+    if plan["flight_key"] is None:
+        return generate_image(timeout=timeout, **plan["request"]), False
+    try:
+        return GENERATE_FLIGHTS.do(
+            plan["flight_key"],
+            lambda: generate_image(timeout=timeout, **plan["request"]),
+            timeout=timeout,
+        )
+    except SingleFlightTimeout:
+        raise _coalesced_timeout()
+
+
+async def _generate_async(plan, timeout):
+    """_generate for the async engine, through generate_image_async."""
+    if plan["flight_key"] is None:
+        return await generate_image_async(timeout=timeout, **plan["request"]), False
+    try:
+        return await GENERATE_FLIGHTS.do_async(
+            plan["flight_key"],
+            lambda: generate_image_async(timeout=timeout, **plan["request"]),
+            timeout=timeout,
+        )
+    except SingleFlightTimeout:
+        raise _coalesced_timeout()
+
+
+def generate_segment(segment, params, deadline=None, prompt=None):
+    """
+    Build the prompt and generate the image for a single segment.
+
+    Args:
+        segment: Segment dict from segments_data.
+        params: Dict with reference_image (MediaAsset), brand_ci
+            (MediaAsset or None), aspect_ratio and edit_areas, plus the
+            optional use_cache / upload_mode / image_delivery /
+            preflight_enabled / brand_ci_mode / variants / context_cache
+            settings and the per-request
+            values added by prepare_params.
+        deadline: Optional time.monotonic() value after which the upstream
+            call should not keep waiting.
+        prompt: Optional prompt already built for this segment and params
+            (see build_prompts_for_segments); built here if omitted.
+
+    Returns:
+        A result dict (status "success") or an error dict (status "error").
+    """
+    segment_start = time.time()
+    params = prepare_params(params)
+    timeout = _segment_timeout(deadline)
+    if timeout is None:
+        return _timeout_error(segment)
+
+    try:
+        plan = _plan_segment(segment, params, prompt)
+        generation_result = plan["cached"]
+        coalesced = False
+        if generation_result is None:
+            generation_result, coalesced = _generate(plan, timeout)
+        return _finish_segment(segment, params, plan, generation_result, segment_start, coalesced)
+    except GeminiClientError as e:
+        return _gemini_error(segment, e, segment_start)
+    except Exception as e:
+        return _internal_error(segment, e, segment_start)
+
+
+async def generate_segment_async(segment, params, deadline=None, prompt=None):
+    """
+    generate_segment for the async engine: same arguments and result.
+
+    The Gemini call runs on the event loop; the short blocking steps
+    around it (result cache lookups and writes, asset store writes) run in
+    the loop's default thread pool.
+    """
+    segment_start = time.time()
+    if "body_template" not in params:
+        await asyncio.to_thread(prepare_params, params)
+    timeout = _segment_timeout(deadline)
+    if timeout is None:
+        return _timeout_error(segment)
+
+    try:
+        plan = await asyncio.to_thread(_plan_segment, segment, params, prompt)
+        generation_result = plan["cached"]
+        coalesced = False
+        if generation_result is None:
+            generation_result, coalesced = await _generate_async(plan, timeout)
+        return await asyncio.to_thread(
+            _finish_segment, segment, params, plan, generation_result, segment_start, coalesced
+        )
+    except GeminiClientError as e:
+        return _gemini_error(segment, e, segment_start)
+    except Exception as e:
+        return _internal_error(segment, e, segment_start)
+
+
+def iter_segment_results(
+    segments, params, max_concurrency=1, deadline_seconds=None, engine=None
+):
+    """
+    Generate all segments, yielding each outcome as soon as it is ready.
+
+    With max_concurrency == 1 segments run one after another on the calling
+    thread; otherwise at most max_concurrency segments are in flight at once.
+    Segments that have not finished when deadline_seconds elapses are
+    reported as deadline errors (with the threads engine an in-flight
+    upstream call cannot be interrupted, but its result is discarded; the
+    asyncio engine cancels it).
+
+    Args:
+        segments: List of segment dicts.
+        params: Generation parameters (see generate_segment).
+        max_concurrency: Maximum number of segments generated in parallel.
+        deadline_seconds: Optional whole-request budget in seconds.
+        engine: "threads" or "asyncio" (default GENERATE_ENGINE).
+
+    Yields:
+        (index, outcome) tuples in completion order, where index is the
+        segment's position in `segments` and outcome is its result/error dict
+        with an added "queue_time_seconds" timing. Every outcome is also
+        queued for the generation history.
+    """
+    if (engine or GENERATE_ENGINE) == "asyncio":
+        yield from iterate_blocking(
+            iter_segment_results_async, segments, params, max_concurrency, deadline_seconds
+        )
+        return
+    started = time.monotonic()
+    deadline = started + deadline_seconds if deadline_seconds else None
+    with stage("prepare"):
+        prepare_params(params)
+    cells = [(segment, params, None) for segment in segments]
+    yield from _iter_cells(cells, max_concurrency, started, deadline)
+
+
+def iter_cell_results(cells, max_concurrency=1, deadline_seconds=None, engine=None):
+    """
+    Generate a batch of cells that may differ in reference image, aspect
+    ratio and prompt, all through one bounded worker pool.
+
+    Args:
+        cells: List of (segment, params, prompt) tuples. params must
+            already have been through prepare_params; prompt may be None.
+        max_concurrency: Maximum number of cells generated in parallel.
+        deadline_seconds: Optional budget for the whole batch.
+        engine: "threads" or "asyncio" (default GENERATE_ENGINE).
+
+    Yields:
+        (index, outcome) tuples in completion order, as iter_segment_results.
+    """
+    if (engine or GENERATE_ENGINE) == "asyncio":
+        yield from iterate_blocking(
+            iter_cell_results_async, cells, max_concurrency, deadline_seconds
+        )
+        return
+    started = time.monotonic()
+    deadline = started + deadline_seconds if deadline_seconds else None
+    yield from _iter_cells(cells, max_concurrency, started, deadline)
+
+
+def _iter_cells(cells, max_concurrency, started, deadline):
+    """Run (segment, params, prompt) cells; see iter_segment_results."""
+    if max_concurrency <= 1 or len(cells) <= 1:
+        for index, (segment, params, prompt) in enumerate(cells):
+            queued = time.monotonic() - started
+            outcome = generate_segment(segment, params, deadline, prompt)
+            outcome["queue_time_seconds"] = round(queued, 2)
+            record_generation(outcome, params)
+            yield index, outcome
+        return
+
+    # A thread that misses the deadline cannot be stopped and still finishes;
+    # whichever of it and the deadline report claims the cell first records
+    # its history row, so each cell gets exactly one
+    recorded = set()
+    recorded_lock = threading.Lock()
+
+    def record_once(index, outcome, params):
+        with recorded_lock:
+            if index in recorded:
+                return
+            recorded.add(index)
+        record_generation(outcome, params)
+
+    def run(index, cell, submitted_at):
+        segment, params, prompt = cell
+        queued = time.monotonic() - submitted_at
+        record_stage("queue", queued)
+        outcome = generate_segment(segment, params, deadline, prompt)
+        outcome["queue_time_seconds"] = round(queued, 2)
+        record_once(index, outcome, params)
+        return outcome
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(max_concurrency, len(cells)),
+        thread_name_prefix="generate",
+    )
+    try:
+        pending = {
+            executor.submit(run_in_context(run), index, cell, time.monotonic()): index
+            for index, cell in enumerate(cells)
+        }
+        while pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                index = pending.pop(future)
+                yield index, future.result()
+
+        # Anything still pending missed the deadline
+        for future, index in sorted(pending.items(), key=lambda item: item[1]):
+            segment, params, _ = cells[index]
+            future.cancel()
+            logger.warning("Segment %s missed the request deadline", segment["id"])
+            outcome = _timeout_error(segment, time.monotonic() - started)
+            record_once(index, outcome, params)
+            yield index, outcome
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def iter_segment_results_async(
+    segments, params, max_concurrency=1, deadline_seconds=None
+):
+    """
+    Async generator form of iter_segment_results for the asyncio engine.
+
+    Segments run as tasks, at most max_concurrency at once; any still
+    running at the deadline are cancelled and reported as deadline errors.
+    Closing the generator early cancels everything in flight.
+    """
+    started = time.monotonic()
+    deadline = started + deadline_seconds if deadline_seconds else None
+    with stage("prepare"):
+        await asyncio.to_thread(prepare_params, params)
+    cells = [(segment, params, None) for segment in segments]
+    async for item in _iter_cells_async(cells, max_concurrency, started, deadline):
+        yield item
+
+
+async def iter_cell_results_async(cells, max_concurrency=1, deadline_seconds=None):
+    """Async generator form of iter_cell_results (see iter_segment_results_async)."""
+    started = time.monotonic()
+    deadline = started + deadline_seconds if deadline_seconds else None
+    async for item in _iter_cells_async(cells, max_concurrency, started, deadline):
+        yield item
+
+
+async def _iter_cells_async(cells, max_concurrency, started, deadline):
+    """Run (segment, params, prompt) cells as tasks; see iter_segment_results_async."""
+    slots = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(cell, submitted_at):
+        segment, params, prompt = cell
+        async with slots:
+            queued = time.monotonic() - submitted_at
+            record_stage("queue", queued)
+            outcome = await generate_segment_async(segment, params, deadline, prompt)
+        outcome["queue_time_seconds"] = round(queued, 2)
+        record_generation(outcome, params)
+        return outcome
+
+    tasks = {
+        asyncio.ensure_future(run(cell, time.monotonic())): index
+        for index, cell in enumerate(cells)
+    }
+    pending = dict(tasks)
+    try:
+        while pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                index = pending.pop(task)
+                yield index, task.result()
+
+        # Anything still pending missed the deadline
+        for task, index in sorted(pending.items(), key=lambda item: item[1]):
+            segment, params, _ = cells[index]
+            task.cancel()
+            logger.warning("Segment %s missed the request deadline", segment["id"])
+            outcome = _timeout_error(segment, time.monotonic() - started)
+            record_generation(outcome, params)
+            yield index, outcome
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_segments(segments, params, max_concurrency=1, deadline_seconds=None, engine=None):
+    """
+    Generate all segments and collect the outcomes in request order.
+
+    Returns:
+        (results, errors) lists of success and error dicts.
+    """
+    outcomes = [None] * len(segments)
+    for index, outcome in iter_segment_results(
+        segments, params, max_concurrency, deadline_seconds, engine
+    ):
+        outcomes[index] = outcome
+
+    results = [o for o in outcomes if o["status"] == "success"]
+    errors = [o for o in outcomes if o["status"] != "success"]
+    return results, errors
+
+
+def resolve_overall_status(successful, failed):
+    """
+    Determine the overall status string and HTTP status code.
+
+    Args:
+        successful: Number of segments that produced an image.
+        failed: Number of segments that errored.
+
+    Returns:
+        (status: str, status_code: int)
+    """
+    if successful == 0 and failed > 0:
+        return "failed", 502
+    if failed > 0:
+        return "partial", 207  # Multi-Status
+    return "success", 200
@@ -2,7 +2,9 @@
 Prompt construction logic for the Creative Intelligence Platform.
 
 Builds detailed prompts for Gemini image generation based on segment attributes,
-edit areas, and aspect ratio.
+edit areas, and aspect ratio. Each prompt is a prefix shared by every segment
+of a request followed by a segment-specific suffix, so the prefix can be
+cached upstream along with the reference assets.
 """
 
 # Aspect ratio to approximate pixel dimensions mapping
@@ -35,18 +37,72 @@ EDIT_AREA_INSTRUCTIONS = {
 }
 
 
-def build_prompt(segment, edit_areas, aspect_ratio="auto", has_brand_ci=False):
+# Joins the shared prefix and the per-segment suffix of a prompt
+PROMPT_SEPARATOR = "\n\n"
+
+
+def build_prompt_prefix(has_brand_ci=False, brand_ci_summary=None):
     """
-    Build a detailed generation prompt for a given segment.
+    Build the part of the prompt shared by every segment of a request.
+
+    It holds the role, task, brand CI and general guidelines, so it is
+    identical for all segments (and aspect ratios) generated from the same
+    reference image and brand CI, and can be cached by Gemini together with
+    those assets (see gemini_client.ensure_cached_content).
+
+    Args:
+        has_brand_ci: Whether brand CI document was provided.
+        brand_ci_summary: Optional text digest of the brand CI document
+            (see brand_ci.format_brand_ci_summary), used in place of the
+            attached PDF.
+
+    Returns:
+        The shared prompt prefix.
+    """
+    brand_ci_note = ""
+    if brand_ci_summary:
+        brand_ci_note = (
+            "\nBRAND CI GUIDELINES:\n"
+            "Follow these rules extracted from the brand CI document. Ensure all "
+            "modifications respect them and do not alter protected brand elements.\n"
+            f"{brand_ci_summary}\n"
+        )
+    elif has_brand_ci:
+        brand_ci_note = (
+            "\nBRAND CI REFERENCE:\n"
+            "A brand CI document has been provided. Ensure all modifications respect "
+            "the brand guidelines including logo usage, brand colors, typography rules, "
+            "and overall brand identity. Do not alter protected brand elements.\n"
+        )
+
+    prefix = f"""You are a marketing creative AI specializing in creating personalized advertising visuals.
+
+TASK: Modify the provided reference image for the target audience segment described below.
+{brand_ci_note}
+IMPORTANT GUIDELINES:
+- Maintain the product/brand as the focal point
+- Keep professional marketing quality suitable for advertising campaigns
+- The image should feel authentic to the target segment
+- Preserve brand elements (logo, product placement)
+- Ensure the output is visually cohesive and polished
+- The result should be immediately usable in a marketing context
+- Generate an image that matches the specified aspect ratio"""
+
+    return prefix.strip()
+
+
+def build_segment_suffix(segment, edit_areas, aspect_ratio="auto"):
+    """
+    Build the per-segment part of the prompt: audience, modifications and
+    aspect ratio.
 
     Args:
         segment: Dict with segment data (name, age_range, visual_style, etc.)
         edit_areas: List of areas to modify, e.g. ["actor", "background", "text"]
         aspect_ratio: Target aspect ratio string.
-        has_brand_ci: Whether brand CI document was provided.
 
     Returns:
-        A fully constructed prompt string.
+        The segment-specific prompt suffix.
     """
     width, height = ASPECT_RATIO_DIMENSIONS.get(
         aspect_ratio, ASPECT_RATIO_DIMENSIONS["auto"]
@@ -74,20 +130,7 @@ def build_prompt(segment, edit_areas, aspect_ratio="auto", has_brand_ci=False):
 
     modifications_block = "\n".join(modification_lines)
 
-    brand_ci_note = ""
-    if has_brand_ci:
-        brand_ci_note = (
-            "\nBRAND CI REFERENCE:\n"
-            "A brand CI document has been provided. Ensure all modifications respect "
-            "the brand guidelines including logo usage, brand colors, typography rules, "
-            "and overall brand identity. Do not alter protected brand elements.\n"
-        )
-
-    prompt = f"""You are a marketing creative AI specializing in creating personalized advertising visuals.
-
-TASK: Modify the provided reference image for the target audience segment.
-
-TARGET AUDIENCE:
+    return f"""TARGET AUDIENCE:
 - Segment: {segment["name"]}
 - Age Range: {segment["age_range"]}
 - Visual Style: {segment["visual_style"]}
@@ -97,22 +140,52 @@ TARGET AUDIENCE:
 
 MODIFICATIONS REQUIRED:
 {modifications_block}
-{brand_ci_note}
-ASPECT RATIO: {aspect_ratio} ({width}x{height})
 
-IMPORTANT GUIDELINES:
-- Maintain the product/brand as the focal point
-- Keep professional marketing quality suitable for advertising campaigns
-- The image should feel authentic to the target segment
-- Preserve brand elements (logo, product placement)
-- Ensure the output is visually cohesive and polished
-- The result should be immediately usable in a marketing context
-- Generate an image that matches the specified aspect ratio"""
+ASPECT RATIO: {aspect_ratio} ({width}x{height})"""
+
+
+def build_prompt(segment, edit_areas, aspect_ratio="auto", has_brand_ci=False, brand_ci_summary=None):
+    """
+    Build a detailed generation prompt for a given segment.
+
+    The prompt is the shared prefix (build_prompt_prefix) followed by the
+    segment suffix (build_segment_suffix), joined by PROMPT_SEPARATOR.
+
+    Args:
+        segment: Dict with segment data (name, age_range, visual_style, etc.)
+        edit_areas: List of areas to modify, e.g. ["actor", "background", "text"]
+        aspect_ratio: Target aspect ratio string.
+        has_brand_ci: Whether brand CI document was provided.
+        brand_ci_summary: Optional text digest of the brand CI document
+            (see brand_ci.format_brand_ci_summary), used in place of the
+            attached PDF.
 
-    return prompt.strip()
+    Returns:
+        A fully constructed prompt string.
+    """
+    return (
+        build_prompt_prefix(has_brand_ci, brand_ci_summary)
+        + PROMPT_SEPARATOR
+        + build_segment_suffix(segment, edit_areas, aspect_ratio)
+    )
+
+
+def split_prompt(prompt, prefix):
+    """
+    Return the segment suffix of a prompt built on the given prefix.
+
+    Returns:
+        The suffix, or None if the prompt does not start with the prefix.
+    """
+    head = prefix + PROMPT_SEPARATOR
+    if not prompt.startswith(head):
+        return None
+    return prompt[len(head):]
 
 
-def build_prompts_for_segments(segments, edit_areas, aspect_ratio="auto", has_brand_ci=False):
+def build_prompts_for_segments(
+    segments, edit_areas, aspect_ratio="auto", has_brand_ci=False, brand_ci_summary=None
+):
     """
     Build prompts for multiple segments.
 
@@ -121,11 +194,12 @@ def build_prompts_for_segments(segments, edit_areas, aspect_ratio="auto", has_br
         edit_areas: List of edit area strings.
         aspect_ratio: Target aspect ratio.
         has_brand_ci: Whether brand CI was provided.
+        brand_ci_summary: Optional text digest of the brand CI document.
 
     Returns:
         List of (segment, prompt) tuples.
     """
     return [
-        (segment, build_prompt(segment, edit_areas, aspect_ratio, has_brand_ci))
+        (segment, build_prompt(segment, edit_areas, aspect_ratio, has_brand_ci, brand_ci_summary))
         for segment in segments
     ]
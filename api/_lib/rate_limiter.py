@@ -0,0 +1,303 @@
+"""
+Client-side rate limiting for outbound Gemini calls.
+
+One AdaptiveRateLimiter is shared by every generate_image caller in the
+process. It combines:
+
+- a token bucket capping the request rate (GEMINI_RATE_LIMIT_QPS, burst
+  GEMINI_RATE_LIMIT_BURST), and
+- an AIMD concurrency limit: each success adds about one slot per window
+  of calls (additive increase); a 429, or latency well above the observed
+  baseline, scales the limit down (multiplicative decrease).
+
+Callers block in acquire() until both a token and a concurrency slot are
+free, so bursts queue locally instead of turning into upstream 429s.
+Coroutines wait in acquire_async() instead, against the same limits. Wait
+times are recorded so throttling time can be told apart from generation
+time.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_QPS = float(os.environ.get("GEMINI_RATE_LIMIT_QPS", "10"))  # 0 = unlimited
+RATE_LIMIT_BURST = float(os.environ.get("GEMINI_RATE_LIMIT_BURST", "10"))
+CONCURRENCY_INITIAL = float(os.environ.get("GEMINI_CONCURRENCY_INITIAL", "8"))
+CONCURRENCY_MIN = float(os.environ.get("GEMINI_CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = float(os.environ.get("GEMINI_CONCURRENCY_MAX", "32"))
+
+# Multiplicative decrease factors
+DECREASE_ON_THROTTLE = 0.5
+DECREASE_ON_LATENCY = 0.9
+# A call slower than this multiple of the baseline counts as a congestion
+# signal. The baseline is the 10th percentile of recent successful calls
+# asking for the same number of candidates (a 4-candidate call is slower
+# than a 1-candidate call without being congested). It is only trusted
+# once BASELINE_MIN_SAMPLES such calls have been seen, so that a single
+# unusually fast call cannot become the baseline
+LATENCY_TOLERANCE = float(os.environ.get("GEMINI_LATENCY_TOLERANCE", "3.0"))
+BASELINE_PERCENTILE = 0.1
+BASELINE_MIN_SAMPLES = 10
+# After a decrease, further decrease signals are ignored for about one
+# round trip (median recent latency), so a burst of 429s from calls that
+# were already in flight only cuts the limit once
+DEFAULT_COOLDOWN_SECONDS = 1.0
+MIN_COOLDOWN_SECONDS = 0.05
+
+WINDOW = 100
+
+
+class RateLimitTimeout(Exception):
+    """Raised when acquire() cannot get capacity before its timeout."""
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket plus AIMD concurrency limit for one upstream API."""
+
+    def __init__(
+        self,
+        rate=RATE_LIMIT_QPS,
+        burst=RATE_LIMIT_BURST,
+        initial_concurrency=CONCURRENCY_INITIAL,
+        min_concurrency=CONCURRENCY_MIN,
+        max_concurrency=CONCURRENCY_MAX,
+        latency_tolerance=LATENCY_TOLERANCE,
+    ):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.min_concurrency = max(min_concurrency, 1.0)
+        self.max_concurrency = max(max_concurrency, self.min_concurrency)
+        self.limit = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.latency_tolerance = latency_tolerance
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._latencies = deque(maxlen=WINDOW)
+        # candidate count -> recent latencies of successful calls
+        self._baselines = {}
+        self._waits = deque(maxlen=WINDOW)
+        # (loop, future) per coroutine waiting for a slot in acquire_async
+        self._async_waiters = []
+        self._stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "throttled": 0,
+            "increases": 0,
+            "decreases": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _ready_in(self):
+        """Seconds until both a token and a slot may be free (0 = now)."""
+        if self._in_flight >= int(self.limit):
+            return None  # woken by release()
+        if self.rate <= 0 or self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """
+        Block until a call may start.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely).
+
+        Returns:
+            Seconds spent waiting.
+
+        Raises:
+            RateLimitTimeout: If no capacity became free within timeout.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ready_in = self._ready_in()
+                    if ready_in == 0.0:
+                        break
+                    wait = ready_in
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise RateLimitTimeout(
+                                f"No Gemini capacity within {timeout:.1f}s"
+                            )
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+            return self._take(start)
+
+    async def acquire_async(self, timeout=None):
+        """
+        acquire() for coroutines: waits without blocking the event loop.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely).
+
+        Returns:
+            Seconds spent waiting.
+
+        Raises:
+            RateLimitTimeout: If no capacity became free within timeout.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ready_in = self._ready_in()
+                    if ready_in == 0.0:
+                        return self._take(start)
+                    if deadline is not None and deadline <= now:
+                        self._stats["timeouts"] += 1
+                        raise RateLimitTimeout(f"No Gemini capacity within {timeout:.1f}s")
+                    woken = loop.create_future()
+                    self._async_waiters.append((loop, woken))
+                wait = ready_in
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                try:
+                    await asyncio.wait([woken], timeout=wait)
+                finally:
+                    with self._cond:
+                        if (loop, woken) in self._async_waiters:
+                            self._async_waiters.remove((loop, woken))
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _take(self, start):
+        """Consume a token and a slot (lock held); return the seconds waited."""
+        if self.rate > 0:
+            self._tokens -= 1
+        self._in_flight += 1
+        waited = time.monotonic() - start
+        self._waits.append(waited)
+        self._stats["acquired"] += 1
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return waited
+
+    def release(self, status_code=None, latency=None, candidates=1):
+        """
+        Return a slot and adapt the concurrency limit to the call's outcome.
+
+        Args:
+            status_code: Upstream HTTP status of the call (None on success
+                or for errors without a status).
+            latency: Seconds the call took, if it completed.
+            candidates: candidateCount the call asked for; latency is only
+                compared against calls asking for the same number.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if status_code == 429:
+                self._stats["throttled"] += 1
+                self._decrease(now, DECREASE_ON_THROTTLE, "429 from Gemini")
+            elif latency is not None and status_code is None:
+                samples = self._baselines.get(candidates)
+                if samples is None:
+                    samples = self._baselines[candidates] = deque(maxlen=WINDOW)
+                baseline = None
+                if len(samples) >= BASELINE_MIN_SAMPLES:
+                    baseline = _percentile(samples, BASELINE_PERCENTILE)
+                samples.append(latency)
+                self._latencies.append(latency)
+                if baseline and latency > baseline * self.latency_tolerance:
+                    self._decrease(now, DECREASE_ON_LATENCY, f"latency {latency:.2f}s")
+                elif self.limit < self.max_concurrency:
+                    # Additive increase: about +1 per `limit` successful calls
+                    self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                    self._stats["increases"] += 1
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, woken in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, woken)
+            except RuntimeError:
+                pass  # the waiter's loop has been closed
+
+    def _decrease(self, now, factor, reason):
+        median = _percentile(self._latencies, 0.5)
+        cooldown = DEFAULT_COOLDOWN_SECONDS if median is None else max(median, MIN_COOLDOWN_SECONDS)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_concurrency, self.limit * factor)
+        if new_limit < self.limit:
+            logger.warning(
+                "Reducing Gemini concurrency %.1f -> %.1f (%s)", self.limit, new_limit, reason
+            )
+            self.limit = new_limit
+            self._stats["decreases"] += 1
+
+    def stats(self):
+        """Return current limits, occupancy and queue wait statistics."""
+        with self._cond:
+            waits = list(self._waits)
+            stats = dict(self._stats)
+            stats.update(
+                rate_per_second=self.rate or None,
+                burst=self.burst,
+                concurrency_limit=round(self.limit, 2),
+                in_flight=self._in_flight,
+                queued=self._waiting,
+            )
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 3)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 3)
+        stats["wait_p50_seconds"] = _percentile(waits, 0.5)
+        stats["wait_p95_seconds"] = _percentile(waits, 0.95)
+        return stats
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter():
+    """Return the process-wide limiter for Gemini generate calls."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = AdaptiveRateLimiter()
+        return _default_limiter
@@ -0,0 +1,422 @@
+"""
+Content-addressed cache for Gemini generation results.
+
+Results are keyed on a hash of everything that determines the output: the
+reference image bytes, the brand CI bytes, the prompt, the model and the
+generationConfig. Backends share a small get/set interface so a shared
+store (Redis, object storage, ...) can be plugged in later; the default
+stack is an in-memory LRU tier in front of a filesystem tier.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Backend selection: comma-separated tiers, fastest first ("none" disables)
+CACHE_BACKENDS = os.environ.get("GENERATION_CACHE_BACKENDS", "memory,filesystem")
+# How long an entry stays valid after it was generated, in every tier
+CACHE_TTL_SECONDS = float(os.environ.get("GENERATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+MEMORY_MAX_ENTRIES = int(os.environ.get("GENERATION_CACHE_MEMORY_ENTRIES", "64"))
+MEMORY_MAX_BYTES = int(os.environ.get("GENERATION_CACHE_MEMORY_BYTES", str(128 * 1024 * 1024)))
+FS_DIR = os.environ.get(
+    "GENERATION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "creative-studio-cache"),
+)
+FS_TTL_SECONDS = CACHE_TTL_SECONDS
+FS_MAX_BYTES = int(os.environ.get("GENERATION_CACHE_FS_BYTES", str(512 * 1024 * 1024)))
+
+
+def build_cache_key(reference_image_digest, brand_ci_digest, prompt, model, generation_config):
+    """
+    Build the cache key for a single generation call.
+
+    Args:
+        reference_image_digest: MediaAsset.digest of the reference image.
+        brand_ci_digest: MediaAsset.digest of the brand CI PDF ("" if none).
+        prompt: The full prompt text sent to Gemini.
+        model: Gemini model name.
+        generation_config: The generationConfig dict sent to Gemini.
+
+    Returns:
+        A hex string key.
+    """
+    material = json.dumps(
+        {
+            "reference_image": reference_image_digest,
+            "brand_ci": brand_ci_digest,
+            "prompt": prompt,
+            "model": model,
+            "generation_config": generation_config,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _entry_size(value):
+    """
+    Approximate the in-memory size of a cached generation result: the
+    length of every string in it, including those nested in lists and
+    dicts such as additional_variants' base64 images.
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_entry_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_entry_size(v) for v in value)
+    return 0
+
+
+class CacheBackend:
+    """Interface for generation result cache backends."""
+
+    name = "base"
+
+    def get(self, key):
+        """Return the cached result dict for key, or None on a miss."""
+        raise NotImplementedError
+
+    def get_entry(self, key):
+        """
+        Return (value, expires_at) for key, or None on a miss.
+
+        expires_at is epoch seconds, or None if the backend does not know;
+        TieredCache passes it on when back-filling faster tiers.
+        """
+        value = self.get(key)
+        return None if value is None else (value, None)
+
+    def set(self, key, value, expires_at=None):
+        """
+        Store a JSON-serializable result dict under key.
+
+        Args:
+            expires_at: Optional epoch seconds after which the entry is a
+                miss; defaults to now plus the backend's TTL.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """Return a dict of backend counters."""
+        return {}
+
+
+class MemoryLRUCache(CacheBackend):
+    """In-process LRU bounded by entry count, approximate byte size and TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, max_bytes=MEMORY_MAX_BYTES,
+                 ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() >= entry[2]:
+                del self._entries[key]
+                self._bytes -= entry[1]
+                self._evictions += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(entry[0]), entry[2]
+
+    def set(self, key, value, expires_at=None):
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            return
+        if expires_at is None:
+            expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (dict(value), size, expires_at)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+class FilesystemCache(CacheBackend):
+    """
+    One JSON file per key with a TTL and a total byte budget.
+
+    Each file stores its entry's created_at / expires_at next to the value;
+    entries past expires_at are treated as misses and removed, however
+    often they were hit. File mtimes are refreshed on every hit and only
+    order eviction: when the directory exceeds max_bytes, least recently
+    used files are deleted first. The directory total is tracked as
+    entries are written and removed, so a write only scans the directory
+    when it takes the total over budget.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, directory=FS_DIR, ttl_seconds=FS_TTL_SECONDS, max_bytes=FS_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._budget_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            value = entry["value"]
+            expires_at = float(entry["expires_at"])
+        except FileNotFoundError:
+            expired = False
+            value = None
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable, or written by an older version without expiry
+            expired = True
+            value = None
+        else:
+            expired = time.time() >= expires_at
+        if value is None or expired:
+            if expired:
+                self._remove(path)
+            with self._lock:
+                self._misses += 1
+            return None
+        try:
+            os.utime(path)  # LRU order only; expiry is stored in the entry
+        except OSError:
+            pass
+        with self._lock:
+            self._hits += 1
+        return value, expires_at
+
+    def set(self, key, value, expires_at=None):
+        path = self._path(key)
+        now = time.time()
+        entry = {
+            "created_at": now,
+            "expires_at": now + self.ttl_seconds if expires_at is None else expires_at,
+            "value": value,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            size = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write cache entry %s: %s", key, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._bytes += size - replaced
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self._enforce_budget()
+
+    def _scan(self):
+        """Return (mtime, size, path) for every entry file."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _enforce_budget(self):
+        """Drop expired entries, then the least recently used until under max_bytes."""
+        if not self._budget_lock.acquire(blocking=False):
+            return  # another write is already trimming the directory
+        try:
+            now = time.time()
+            entries = []
+            total = 0
+            for mtime, size, path in self._scan():
+                # mtime is never older than created_at, so this entry has expired
+                if now - mtime > self.ttl_seconds:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    with self._lock:
+                        self._evictions += 1
+                    continue
+                entries.append((mtime, size, path))
+                total += size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                with self._lock:
+                    self._evictions += 1
+            with self._lock:
+                self._bytes = total
+        finally:
+            self._budget_lock.release()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes -= size
+            self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+class TieredCache(CacheBackend):
+    """
+    Checks tiers fastest first and back-fills faster tiers on a hit,
+    carrying the entry's expiry so a faster tier never outlives it.
+    """
+
+    name = "tiered"
+
+    def __init__(self, tiers):
+        self.tiers = list(tiers)
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key):
+        for index, tier in enumerate(self.tiers):
+            entry = tier.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                for faster in self.tiers[:index]:
+                    faster.set(key, value, expires_at)
+                return value, expires_at
+        return None
+
+    def set(self, key, value, expires_at=None):
+        if expires_at is None:
+            ttls = [getattr(tier, "ttl_seconds", None) for tier in self.tiers]
+            ttls = [ttl for ttl in ttls if ttl is not None]
+            if ttls:
+                expires_at = time.time() + min(ttls)
+        for tier in self.tiers:
+            tier.set(key, value, expires_at)
+
+    def stats(self):
+        return {tier.name: tier.stats() for tier in self.tiers}
+
+
+_BACKEND_FACTORIES = {
+    "memory": MemoryLRUCache,
+    "filesystem": FilesystemCache,
+}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def register_backend(name, factory):
+    """Register a backend factory usable in GENERATION_CACHE_BACKENDS."""
+    _BACKEND_FACTORIES[name] = factory
+
+
+def get_default_cache():
+    """
+    Return the process-wide generation cache, or None if caching is disabled.
+
+    Tiers come from GENERATION_CACHE_BACKENDS (default "memory,filesystem").
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            names = [n.strip() for n in CACHE_BACKENDS.split(",") if n.strip()]
+            if not names or names == ["none"]:
+                return None
+            tiers = []
+            for name in names:
+                factory = _BACKEND_FACTORIES.get(name)
+                if factory is None:
+                    logger.warning("Unknown generation cache backend: %s", name)
+                    continue
+                try:
+                    tiers.append(factory())
+                except OSError as e:
+                    logger.warning("Generation cache backend %s unavailable: %s", name, e)
+            if not tiers:
+                return None
+            _default_cache = TieredCache(tiers)
+        return _default_cache
@@ -0,0 +1,338 @@
+"""
+Retry policy for Gemini API calls.
+
+Transient failures (429, 5xx, timeouts, dropped connections) are retried
+with exponential backoff and full jitter, honoring Retry-After when Gemini
+sends one. Fatal errors - safety blocks (422), bad requests and invalid or
+missing API keys - are raised immediately.
+
+Optionally, an attempt that runs longer than a percentile of recent call
+latencies is hedged: a duplicate call is fired and whichever finishes
+first wins, trimming tail latency at the cost of the extra call.
+
+Every call reports its attempts (number, timing, outcome) so segment
+results show where the time went. call_async applies the same rules to
+coroutines; there the losing side of a hedge is cancelled.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get("GEMINI_RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("GEMINI_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("GEMINI_RETRY_MAX_DELAY", "8"))
+# Longer Retry-After values are not waited for; the error is raised instead
+RETRY_MAX_RETRY_AFTER = float(os.environ.get("GEMINI_RETRY_MAX_RETRY_AFTER", "30"))
+# Do not start another attempt with less time than this left in the budget
+RETRY_MIN_ATTEMPT_SECONDS = 1.0
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Hedging: off unless GEMINI_HEDGE_PERCENTILE is set (e.g. "0.95")
+HEDGE_PERCENTILE = float(os.environ.get("GEMINI_HEDGE_PERCENTILE", "0") or 0)
+HEDGE_MIN_SAMPLES = int(os.environ.get("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.environ.get("GEMINI_HEDGE_MIN_DELAY", "1.0"))
+LATENCY_WINDOW = 200
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date).
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction, min_samples=1):
+        """Return the given percentile (0..1) or None with too few samples."""
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index]
+
+    def stats(self):
+        with self._lock:
+            count = len(self._samples)
+        return {
+            "samples": count,
+            "p50_seconds": self.percentile(0.5),
+            "p95_seconds": self.percentile(0.95),
+        }
+
+
+class RetryPolicy:
+    """Backoff, Retry-After and hedging rules for one kind of upstream call."""
+
+    def __init__(
+        self,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+        max_retry_after=RETRY_MAX_RETRY_AFTER,
+        retryable_status_codes=RETRYABLE_STATUS_CODES,
+        hedge_percentile=HEDGE_PERCENTILE,
+        hedge_min_samples=HEDGE_MIN_SAMPLES,
+        hedge_min_delay=HEDGE_MIN_DELAY,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retryable_status_codes = set(retryable_status_codes)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyTracker()
+
+    def is_retryable(self, error):
+        """Return True if an error from one attempt is worth retrying."""
+        retryable = getattr(error, "retryable", None)
+        if retryable is not None:
+            return retryable
+        return getattr(error, "status_code", None) in self.retryable_status_codes
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Seconds to sleep before the next attempt.
+
+        Full jitter: a random delay up to base_delay * 2^(attempt - 1),
+        capped at max_delay, but never less than the server's Retry-After.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _hedge_delay(self):
+        """Return how long to wait before hedging, or None if hedging is off."""
+        if not self.hedge_percentile:
+            return None
+        threshold = self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+        if threshold is None:
+            return None
+        return max(threshold, self.hedge_min_delay)
+
+    def _run_attempt(self, fn, timeout):
+        """
+        Run one attempt, hedging it if it outlives the latency percentile.
+
+        Returns:
+            (result, error, hedged, winner) - exactly one of result / error
+            is set; winner is "primary" or "hedge".
+        """
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            try:
+                return fn(timeout), None, False, "primary"
+            except Exception as e:
+                return None, e, False, "primary"
+
+        outcomes = queue.Queue()
+        started = time.monotonic()
+
+        def run(label, call_timeout):
+            try:
+                outcomes.put((label, fn(call_timeout), None))
+            except Exception as e:
+                outcomes.put((label, None, e))
+
+        # Calls run in a copy of the caller's context (e.g. its request timings)
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(run, "primary", timeout), daemon=True
+        ).start()
+        try:
+            label, result, error = outcomes.get(timeout=hedge_delay)
+            return result, error, False, label
+        except queue.Empty:
+            pass
+
+        remaining = timeout - (time.monotonic() - started)
+        logger.info("Hedging Gemini call after %.2fs", hedge_delay)
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(run, "hedge", remaining), daemon=True
+        ).start()
+
+        label, result, error = outcomes.get()
+        if error is not None:
+            # Wait for the other call; return the first error if both fail
+            other_label, other_result, other_error = outcomes.get()
+            if other_error is None:
+                return other_result, None, True, other_label
+        return result, error, True, label
+
+    async def _run_attempt_async(self, fn, timeout):
+        """_run_attempt for a coroutine function; the losing call is cancelled."""
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            try:
+                return await fn(timeout), None, False, "primary"
+            except Exception as e:
+                return None, e, False, "primary"
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(fn(timeout))
+        labels = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait([primary], timeout=hedge_delay)
+            if not done:
+                remaining = timeout - (time.monotonic() - started)
+                logger.info("Hedging Gemini call after %.2fs", hedge_delay)
+                labels[asyncio.ensure_future(fn(remaining))] = "hedge"
+            hedged = len(labels) > 1
+            pending = set(labels)
+            first_error, first_label = None, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), None, hedged, labels[task]
+                    if first_error is None:
+                        first_error, first_label = task.exception(), labels[task]
+            # Both failed: return the first error
+            return None, first_error, hedged, first_label
+        finally:
+            for task in labels:
+                task.cancel()
+
+    def _settle(self, attempts, attempt, elapsed, deadline, error, hedged, winner):
+        """
+        Record an attempt and decide what happens next.
+
+        Returns:
+            Seconds to back off before the next attempt, or None on success.
+
+        Raises:
+            The attempt's error, when it is not worth retrying.
+        """
+        record = {
+            "attempt": attempt,
+            "seconds": round(elapsed, 3),
+            "status": "success" if error is None else "error",
+            "status_code": None if error is None else getattr(error, "status_code", None),
+            "hedged": hedged,
+            "winner": winner,
+        }
+        attempts.append(record)
+
+        if error is None:
+            self.latencies.record(elapsed)
+            return None
+
+        retry_after = getattr(error, "retry_after", None)
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            error.attempts = attempts
+            raise error
+        if retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning("Not retrying: Retry-After %.1fs exceeds limit", retry_after)
+            error.attempts = attempts
+            raise error
+
+        delay = self.backoff_delay(attempt, retry_after)
+        if deadline - time.monotonic() - delay < RETRY_MIN_ATTEMPT_SECONDS:
+            error.attempts = attempts
+            raise error
+        record["backoff_seconds"] = round(delay, 3)
+        logger.warning(
+            "Gemini attempt %d failed (%s); retrying in %.2fs",
+            attempt,
+            record["status_code"],
+            delay,
+        )
+        return delay
+
+    def call(self, fn, timeout):
+        """
+        Call fn with retries within a total time budget.
+
+        Args:
+            fn: Callable taking a per-attempt timeout in seconds.
+            timeout: Total seconds available for all attempts and backoff.
+
+        Returns:
+            (result, attempts) where attempts is a list of dicts with
+            attempt, seconds, status, status_code, hedged and winner.
+
+        Raises:
+            The last attempt's exception, with an `attempts` attribute
+            carrying the same list.
+        """
+        deadline = time.monotonic() + timeout
+        attempts = []
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            attempt_start = time.monotonic()
+            result, error, hedged, winner = self._run_attempt(fn, remaining)
+            delay = self._settle(
+                attempts, attempt, time.monotonic() - attempt_start, deadline, error, hedged, winner
+            )
+            if delay is None:
+                return result, attempts
+            time.sleep(delay)
+
+    async def call_async(self, fn, timeout):
+        """
+        call() for a coroutine function taking a per-attempt timeout.
+
+        Returns and raises like call(); backoff sleeps do not block the
+        event loop.
+        """
+        deadline = time.monotonic() + timeout
+        attempts = []
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            attempt_start = time.monotonic()
+            result, error, hedged, winner = await self._run_attempt_async(fn, remaining)
+            delay = self._settle(
+                attempts, attempt, time.monotonic() - attempt_start, deadline, error, hedged, winner
+            )
+            if delay is None:
+                return result, attempts
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """Return the policy settings and observed latency percentiles."""
+        return {
+            "max_attempts": self.max_attempts,
+            "hedge_percentile": self.hedge_percentile or None,
+            "latency": self.latencies.stats(),
+        }
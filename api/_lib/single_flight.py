@@ -0,0 +1,194 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When a user double-clicks Generate, or two people submit the same asset at
+once, identical generations start in parallel. A SingleFlight keyed like
+the result cache lets the first caller (the leader) make the call while
+later callers with the same key wait for it and receive its result or
+error instead of starting their own. Threads and coroutines can share a
+key: threads wait on an event, coroutines on a future woken from whichever
+thread finishes the call.
+
+A leader that is cancelled or interrupted abandons the call rather than
+passing its cancellation on: one of the waiters then becomes the new
+leader. Nothing is kept once a call completes; repeated calls are the
+result cache's job.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from .metrics import COALESCED_CALLS
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when the call being waited on does not finish within the waiter's timeout."""
+
+
+class _Call:
+    """One in-flight call and its outcome once done."""
+
+    __slots__ = ("done", "value", "error", "abandoned", "async_waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.abandoned = False
+        self.async_waiters = []
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """In-flight calls by key; see the module docstring."""
+
+    def __init__(self, name):
+        """
+        Args:
+            name: Label for the coalesced-calls metric and logs.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "coalesced": 0, "abandoned": 0, "wait_timeouts": 0}
+
+    def _join(self, key, loop=None):
+        """
+        Return (call, leader, future). A waiter joining from a coroutine
+        (loop given) gets a future to await; threads wait on call.done.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+                return call, True, None
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                call.async_waiters.append((loop, future))
+            return call, False, future
+
+    def _finish(self, key, call, value=None, error=None, abandoned=False):
+        """Publish the leader's outcome and wake every waiter."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            call.value = value
+            call.error = error
+            call.abandoned = abandoned
+            if abandoned:
+                self._stats["abandoned"] += 1
+            waiters, call.async_waiters = call.async_waiters, []
+        call.done.set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # the waiter's loop has been closed
+
+    def _outcome(self, call):
+        """Return a finished call's value to a waiter, or raise its error."""
+        with self._lock:
+            self._stats["coalesced"] += 1
+        COALESCED_CALLS.inc(1, self.name)
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def _wait_timeout(self, timeout):
+        with self._lock:
+            self._stats["wait_timeouts"] += 1
+        return SingleFlightTimeout(f"Identical {self.name} call still running after {timeout:.1f}s")
+
+    def do(self, key, fn, timeout=None):
+        """
+        Call fn(), or wait for an identical in-flight call to finish.
+
+        Args:
+            key: Identity of the call (e.g. a result cache key).
+            fn: Zero-argument callable making the call.
+            timeout: Maximum seconds to wait for another caller's call
+                (None waits indefinitely). Does not limit fn itself.
+
+        Returns:
+            (value, shared): fn's return value, and whether it came from
+            another caller's call.
+
+        Raises:
+            Whatever the call raised, or SingleFlightTimeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            call, leader, _ = self._join(key)
+            if leader:
+                try:
+                    value = fn()
+                except Exception as e:
+                    self._finish(key, call, error=e)
+                    raise
+                except BaseException:
+                    self._finish(key, call, abandoned=True)
+                    raise
+                self._finish(key, call, value=value)
+                return value, False
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None:
+                remaining = max(0.0, remaining)
+            if not call.done.wait(remaining):
+                raise self._wait_timeout(timeout)
+            if call.abandoned:
+                logger.debug("In-flight %s call abandoned; retrying", self.name)
+                continue
+            return self._outcome(call), True
+
+    async def do_async(self, key, fn, timeout=None):
+        """
+        do() for coroutines: fn returns an awaitable, and waiting does not
+        block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            call, leader, future = self._join(key, loop)
+            if leader:
+                try:
+                    value = await fn()
+                except Exception as e:
+                    self._finish(key, call, error=e)
+                    raise
+                except BaseException:
+                    self._finish(key, call, abandoned=True)
+                    raise
+                self._finish(key, call, value=value)
+                return value, False
+
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                raise self._wait_timeout(timeout)
+            finally:
+                with self._lock:
+                    if (loop, future) in call.async_waiters:
+                        call.async_waiters.remove((loop, future))
+            if call.abandoned:
+                logger.debug("In-flight %s call abandoned; retrying", self.name)
+                continue
+            return self._outcome(call), True
+
+    def stats(self):
+        """Return call counters plus the number of calls now in flight."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = len(self._calls)
+        return snapshot
@@ -0,0 +1,136 @@
+"""
+Generated asset endpoint.
+
+GET /api/assets/<sha256>       -> The stored image bytes
+GET /api/assets?hash=<sha256>  -> Same (used by the Vercel rewrite)
+
+Assets are content-addressed and never change, so responses carry an
+immutable Cache-Control header and a strong ETag. Single byte ranges
+(Range: bytes=start-end) are supported.
+"""
+
+from http.server import BaseHTTPRequestHandler
+import os
+import re
+import sys
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib.cors import add_cors_headers, send_error, handle_preflight
+from _lib.asset_store import get_asset_info, ASSET_URL_PREFIX
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+COPY_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _get_digest(path):
+    """Extract the asset digest from the path tail or ?hash= parameter."""
+    parsed = urlparse(path)
+    digest = parse_qs(parsed.query).get("hash", [None])[0]
+    if not digest and parsed.path.startswith(ASSET_URL_PREFIX):
+        digest = parsed.path[len(ASSET_URL_PREFIX):].strip("/")
+    return (digest or "").lower()
+
+
+def _parse_range(header, size):
+    """
+    Parse a single-range Range header.
+
+    Returns:
+        (start, end) inclusive byte offsets, None if there is no usable Range
+        header, or "unsatisfiable".
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        digest = _get_digest(self.path)
+        info = get_asset_info(digest)
+        if info is None:
+            send_error(self, f"Asset not found: {digest}", status_code=404)
+            return
+
+        etag = f'"{digest}"'
+        size = info["size"]
+
+        if_none_match = self.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*":
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            add_cors_headers(self)
+            self.end_headers()
+            return
+
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if not if_range or if_range == etag:
+            byte_range = _parse_range(self.headers.get("Range"), size)
+
+        if byte_range == "unsatisfiable":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            add_cors_headers(self)
+            self.end_headers()
+            return
+
+        if byte_range:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+
+        length = end - start + 1 if size else 0
+        self.send_header("Content-Type", info["mime_type"] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.send_header("Accept-Ranges", "bytes")
+        add_cors_headers(self)
+        self.end_headers()
+
+        if not send_body or length == 0:
+            return
+
+        with open(info["path"], "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def do_OPTIONS(self):
+        handle_preflight(self)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,218 @@
+"""
+Campaign matrix endpoint.
+
+POST /api/campaigns
+Queues every combination of reference images x segments x aspect ratios
+as one background job. Accepts JSON body with:
+  - references (list, required): Reference images, each
+    {"image_base64": str, "mime": str}
+  - segments (list[str], optional): Segment IDs (default: all segments)
+  - aspect_ratios (list[str], optional): Any of "auto", "1:1", "16:9",
+    "9:16" (default ["auto"])
+  - max_concurrency (int, optional): Cells generated in parallel through
+    the campaign's shared worker pool (default CAMPAIGN_CONCURRENCY env, 8)
+  - edit_areas, brand_ci_base64, brand_ci_mode, use_cache, upload_mode,
+    preflight, deadline_seconds, variants, context_cache: as for
+    /api/generate
+
+Alternatively accepts multipart/form-data with a manifest part (the
+fields above; references may carry just "mime") and reference_image_0,
+reference_image_1, ... file parts, plus an optional brand_ci file part.
+
+Identical cells are generated once: duplicate reference images are
+merged, and "auto" is resolved per image so it collapses into the ratio it
+resolves to (e.g. "auto" and "1:1" for a square image). Each distinct
+asset is stored and uploaded once.
+
+Answers 202 with job_id, status_url (/api/jobs/<job_id>), the planned
+cells and the dropped duplicates. Poll the status URL for per-cell
+progress and results.
+"""
+
+from http.server import BaseHTTPRequestHandler
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib.cors import send_json, send_error, handle_preflight
+from _lib.multipart import MultipartError
+from _lib.media import MediaAsset
+from _lib.segments_data import get_all_segments, get_segment_by_id
+from _lib.campaign import (
+    plan_cells,
+    MAX_CAMPAIGN_REFERENCES,
+    MAX_CAMPAIGN_CELLS,
+    DEFAULT_CAMPAIGN_CONCURRENCY,
+    MAX_CAMPAIGN_CONCURRENCY,
+)
+from _lib.job_store import QUEUED
+from _lib.job_queue import get_default_runner, build_campaign_spec, job_url
+from generate import (
+    _read_body,
+    _validate_reference_image,
+    _validate_options,
+    _decode_base64_field,
+    _build_option_params,
+    VALID_ASPECT_RATIOS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_campaign(body):
+    """
+    Validate a campaign body.
+
+    Returns:
+        (is_valid: bool, error_message: str or None)
+    """
+    if not body:
+        return False, "Request body is required."
+
+    references = body.get("references")
+    if not references or not isinstance(references, list):
+        return False, "references must be a non-empty array of reference images."
+    if len(references) > MAX_CAMPAIGN_REFERENCES:
+        return False, f"Maximum {MAX_CAMPAIGN_REFERENCES} references per campaign."
+    for index, reference in enumerate(references):
+        if not isinstance(reference, dict):
+            return False, f"references[{index}] must be an object."
+        is_valid, error_msg = _validate_reference_image(
+            reference.get("mime"),
+            reference.get("image_base64"),
+            reference.get("image_bytes"),
+            base64_field=f"references[{index}].image_base64",
+            mime_field=f"references[{index}].mime",
+            file_part=f"reference_image_{index}",
+            bytes_field=f"references[{index}].image_bytes",
+        )
+        if not is_valid:
+            return False, error_msg
+
+    segments = body.get("segments")
+    if segments is not None:
+        if not segments or not isinstance(segments, list):
+            return False, "segments must be a non-empty array of segment IDs."
+        for sid in segments:
+            if not isinstance(sid, str) or get_segment_by_id(sid) is None:
+                return False, f"Unknown segment ID: {sid}"
+
+    aspect_ratios = body.get("aspect_ratios", ["auto"])
+    if not aspect_ratios or not isinstance(aspect_ratios, list):
+        return False, "aspect_ratios must be a non-empty array."
+    invalid = [
+        ratio for ratio in aspect_ratios
+        if not isinstance(ratio, str) or ratio not in VALID_ASPECT_RATIOS
+    ]
+    if invalid:
+        return False, (
+            f"Invalid aspect_ratios: {', '.join(map(str, invalid))}. "
+            f"Must be from: {', '.join(sorted(VALID_ASPECT_RATIOS))}"
+        )
+
+    max_concurrency = body.get("max_concurrency")
+    if max_concurrency is not None:
+        if (
+            not isinstance(max_concurrency, int)
+            or isinstance(max_concurrency, bool)
+            or not 1 <= max_concurrency <= MAX_CAMPAIGN_CONCURRENCY
+        ):
+            return False, (
+                f"max_concurrency must be an integer between 1 and {MAX_CAMPAIGN_CONCURRENCY}."
+            )
+
+    return _validate_options(body)
+
+
+def _reference_assets(body):
+    """Build MediaAssets for the validated references, keeping raw uploads as bytes."""
+    assets = []
+    for reference in body["references"]:
+        if reference.get("image_bytes"):
+            assets.append(MediaAsset(reference["mime"], data=reference["image_bytes"]))
+        else:
+            assets.append(MediaAsset.from_base64(reference["mime"], reference["image_base64"]))
+    return assets
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        try:
+            body = _read_body(self)
+        except json.JSONDecodeError as e:
+            send_error(self, f"Invalid JSON in request body: {str(e)}")
+            return
+        except MultipartError as e:
+            send_error(self, f"Invalid multipart request body: {str(e)}")
+            return
+        except Exception as e:
+            send_error(self, f"Failed to read request body: {str(e)}", status_code=500)
+            return
+
+        is_valid, error_msg = _validate_campaign(body)
+        if not is_valid or body is None:
+            send_error(self, error_msg or "Request body is required", status_code=400)
+            return
+        error_msg = _decode_base64_field(body, "brand_ci_base64", "brand_ci_bytes")
+        for index, reference in enumerate(body["references"]):
+            error_msg = error_msg or _decode_base64_field(
+                reference, "image_base64", "image_bytes", f"references[{index}].image_base64"
+            )
+        if error_msg:
+            send_error(self, error_msg, status_code=400)
+            return
+
+        params = _build_option_params(body)
+        segment_ids = body.get("segments") or [segment["id"] for segment in get_all_segments()]
+        references, cells, duplicates = plan_cells(
+            _reference_assets(body),
+            list(dict.fromkeys(segment_ids)),
+            list(dict.fromkeys(body.get("aspect_ratios", ["auto"]))),
+            resolve_auto=params["preflight_enabled"],
+        )
+        if len(cells) > MAX_CAMPAIGN_CELLS:
+            send_error(
+                self,
+                f"Campaign has {len(cells)} cells; maximum {MAX_CAMPAIGN_CELLS}.",
+                status_code=400,
+            )
+            return
+
+        try:
+            spec = build_campaign_spec(
+                params,
+                references,
+                cells,
+                body.get("max_concurrency", DEFAULT_CAMPAIGN_CONCURRENCY),
+                body.get("deadline_seconds"),
+            )
+            job_id = get_default_runner().submit(spec, [cell["segment_id"] for cell in cells])
+        except Exception as e:
+            logger.exception("Failed to queue campaign")
+            send_error(self, f"Failed to queue campaign: {str(e)}", status_code=500)
+            return
+
+        status_url = job_url(job_id)
+        send_json(
+            self,
+            {
+                "job_id": job_id,
+                "status": QUEUED,
+                "status_url": status_url,
+                "total_cells": len(cells),
+                "unique_references": len(references),
+                "duplicate_cells": len(duplicates),
+                "cells": [dict(cell, index=index) for index, cell in enumerate(cells)],
+                "duplicates": duplicates,
+            },
+            status_code=202,
+            headers={"Location": status_url},
+        )
+
+    def do_OPTIONS(self):
+        handle_preflight(self)
+
+    def log_message(self, format, *args):
+        pass
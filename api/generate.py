@@ -9,23 +9,107 @@ Accepts JSON body with:
   - aspect_ratio (str, optional): "auto", "1:1", "16:9", "9:16" (default "auto")
   - edit_areas (list[str], optional): Areas to modify - "actor", "background", "text"
   - brand_ci_base64 (str, optional): Base64-encoded brand CI PDF
+  - brand_ci_mode (str, optional): "digest" extracts the palette, typography,
+    logo rules and guideline excerpts once (cached by PDF hash) and sends
+    them as prompt text; "pdf" attaches the PDF to every call (default
+    BRAND_CI_MODE env, "digest"; falls back to "pdf" if nothing can be
+    extracted)
+  - max_concurrency (int, optional): Segments generated in parallel
+    (default GENERATE_MAX_CONCURRENCY env, 4; 1 = sequential)
+  - deadline_seconds (number, optional): Whole-request time budget
+    (default GENERATE_DEADLINE_SECONDS env, 110)
+  - use_cache (bool, optional): Serve identical generations from the result
+    cache (default true); false forces a fresh Gemini call
+  - upload_mode (str, optional): "inline" sends assets as base64 parts in
+    every Gemini call; "files" uploads each distinct asset once and refers
+    to it by URI (default GEMINI_UPLOAD_MODE env, "inline")
+  - image_delivery (str, optional): "inline" returns image_base64 per result;
+    "url" stores images in the asset store and returns image_url
+    (/api/assets/<sha256>) instead (default GENERATE_IMAGE_DELIVERY env,
+    "inline")
+  - preflight (bool, optional): Probe the reference image dimensions, resolve
+    aspect_ratio "auto" to the nearest supported ratio and downscale large
+    images once before fan-out (default PREFLIGHT_ENABLED env, on)
+  - variants (int, optional): Images generated per segment, 1-4 (default
+    1). Extra images are returned in each result's additional_variants; the
+    model is asked for several candidates in one call where it supports
+    that, otherwise one call is made per variant
+  - context_cache (bool, optional): Register the prompt prefix shared by all
+    segments, the reference image and the brand CI once with Gemini's
+    context caching API so each segment call sends only its own part of
+    the prompt (default GEMINI_CONTEXT_CACHE env, off; needs a model that
+    supports caching and falls back to full requests otherwise)
+
+Alternatively accepts multipart/form-data so files are sent as raw binary
+instead of base64:
+  - manifest (JSON part): the non-file fields above
+  - reference_image (file part, required): the image; its Content-Type is
+    used when the manifest has no reference_image_mime
+  - brand_ci (file part, optional): the brand CI PDF
 
 Returns JSON with generated images per segment.
+
+Streaming mode (opt-in): send "Accept: application/x-ndjson" or
+"Accept: text/event-stream", or add ?stream=ndjson / ?stream=sse, to receive
+a "start" event, one "result" / "error" event per segment as soon as it
+finishes, and a final "summary" event carrying status and metadata.
+
+Every response carries a Server-Timing header with the time spent per stage
+(read_body, validate, prepare, prompt, serialize, rate_limit, upstream,
+parse_response, encode_response, ...; stages repeated per segment are
+summed) and metadata.timings repeats it, including for streamed responses.
+The same stages are aggregated on /api/metrics.
+
+While the Gemini circuit breaker is open (repeated upstream failures), the
+endpoint answers 503 immediately with a Retry-After header instead of
+waiting on Gemini.
 """
 
 from http.server import BaseHTTPRequestHandler
 import json
 import logging
+import math
 import sys
 import os
+import re
 import time
-import traceback
+from urllib.parse import urlparse, parse_qs
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from _lib.cors import send_json, send_error, handle_preflight
+from _lib.cors import (
+    send_json,
+    send_error,
+    handle_preflight,
+    start_stream,
+    send_stream_event,
+    STREAM_NDJSON,
+    STREAM_SSE,
+)
 from _lib.segments_data import get_segments_by_ids, get_segment_by_id
-from _lib.prompt_builder import build_prompt
-from _lib.gemini_client import generate_image, GeminiClientError
+from _lib.gemini_client import (
+    UPLOAD_MODE,
+    UPLOAD_MODES,
+    MAX_VARIANTS,
+    CONTEXT_CACHE_ENABLED,
+    add_usage,
+    circuit_retry_after,
+    get_circuit_stats,
+)
+from _lib.media import MediaAsset
+from _lib.image_preflight import PREFLIGHT_ENABLED
+from _lib.brand_ci import BRAND_CI_MODE, BRAND_CI_MODES
+from _lib.multipart import get_boundary, parse_multipart, MultipartError
+from _lib.metrics import start_request_timings, stage, endpoint_name, HTTP_REQUEST_BYTES
+from _lib.pipeline import (
+    run_segments,
+    iter_segment_results,
+    resolve_overall_status,
+    IMAGE_DELIVERY,
+    IMAGE_DELIVERY_MODES,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_DEADLINE_SECONDS,
+    MAX_DEADLINE_SECONDS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -35,43 +119,284 @@ VALID_EDIT_AREAS = {"actor", "background", "text"}
 VALID_IMAGE_MIMES = {"image/png", "image/jpeg", "image/jpg", "image/webp", "image/gif"}
 MAX_IMAGE_SIZE_BYTES = 20 * 1024 * 1024  # 20 MB base64 limit (generous)
 MAX_SEGMENTS_PER_REQUEST = 8
+MAX_MULTIPART_PART_BYTES = MAX_IMAGE_SIZE_BYTES  # raw bytes per file part
+MAX_MULTIPART_BODY_BYTES = 3 * MAX_IMAGE_SIZE_BYTES
+
+_NUMBERED_REFERENCE_RE = re.compile(r"^reference_image_(\d{1,2})$")
 
 
 def _read_body(handler_instance):
-    """Read and parse the JSON request body."""
+    """Read and parse the request body (JSON or multipart/form-data)."""
     content_length = int(handler_instance.headers.get("Content-Length", 0))
     if content_length == 0:
         return None
+    HTTP_REQUEST_BYTES.inc(content_length, endpoint_name(handler_instance))
+
+    boundary = get_boundary(handler_instance.headers.get("Content-Type"))
+    if boundary:
+        return _read_multipart_body(handler_instance, content_length, boundary)
+
     raw = handler_instance.rfile.read(content_length)
     return json.loads(raw.decode("utf-8"))
 
 
-def _validate_request(body):
+def _read_multipart_body(handler_instance, content_length, boundary):
     """
-    Validate the incoming request body.
+    Parse a multipart request into the same dict shape as a JSON body.
+
+    File parts are kept as raw bytes under reference_image_bytes and
+    brand_ci_bytes instead of the *_base64 fields.
+    """
+    if content_length > MAX_MULTIPART_BODY_BYTES:
+        raise MultipartError(f"Request body too large. Max size: {MAX_MULTIPART_BODY_BYTES} bytes.")
+
+    parts = parse_multipart(
+        handler_instance.rfile, content_length, boundary, MAX_MULTIPART_PART_BYTES
+    )
+
+    body = {}
+    manifest = parts.get("manifest")
+    if manifest is not None:
+        body = json.loads(manifest["data"].decode("utf-8"))
+        if not isinstance(body, dict):
+            raise MultipartError("manifest must be a JSON object.")
+
+    image = parts.get("reference_image")
+    if image is not None:
+        body["reference_image_bytes"] = image["data"]
+        if not body.get("reference_image_mime") and image["content_type"]:
+            body["reference_image_mime"] = image["content_type"]
+
+    brand_ci = parts.get("brand_ci")
+    if brand_ci is not None and brand_ci["data"]:
+        body["brand_ci_bytes"] = brand_ci["data"]
+
+    # Numbered reference_image_<n> parts (used by /api/campaigns) fill the
+    # matching "references" entries, creating them if the manifest has none
+    numbered = []
+    for name, part in parts.items():
+        match = _NUMBERED_REFERENCE_RE.match(name)
+        if match:
+            numbered.append((int(match.group(1)), part))
+    if numbered:
+        numbered.sort(key=lambda item: item[0])
+        references = body.get("references")
+        if not isinstance(references, list):
+            references = body["references"] = []
+        for index, part in numbered:
+            while len(references) <= index:
+                references.append({})
+            if not isinstance(references[index], dict):
+                raise MultipartError(f"references[{index}] must be an object.")
+            references[index]["image_bytes"] = part["data"]
+            if not references[index].get("mime") and part["content_type"]:
+                references[index]["mime"] = part["content_type"]
+
+    return body
+
+
+def _get_stream_format(handler_instance):
+    """
+    Determine whether the client asked for a streamed response.
+
+    Returns:
+        STREAM_NDJSON, STREAM_SSE, or None for a single JSON document.
+    """
+    params = parse_qs(urlparse(handler_instance.path).query)
+    requested = (params.get("stream", [""])[0] or "").lower()
+    if requested in ("ndjson", "1", "true"):
+        return STREAM_NDJSON
+    if requested == "sse":
+        return STREAM_SSE
+
+    accept = handler_instance.headers.get("Accept", "") or ""
+    if "text/event-stream" in accept:
+        return STREAM_SSE
+    if "application/x-ndjson" in accept:
+        return STREAM_NDJSON
+    return None
+
+
+def _validate_reference_image(
+    mime,
+    image_base64=None,
+    image_bytes=None,
+    base64_field="reference_image_base64",
+    mime_field="reference_image_mime",
+    file_part="reference_image",
+    bytes_field="reference_image_bytes",
+):
+    """
+    Validate one reference image given as base64 or raw bytes.
+
+    Raw bytes only come from a multipart file part, so a JSON body setting
+    the bytes field itself is rejected. The *_field / file_part names are
+    only used in error messages.
 
     Returns:
         (is_valid: bool, error_message: str or None)
     """
-    if not body:
-        return False, "Request body is required."
+    if image_bytes is not None and not isinstance(image_bytes, (bytes, bytearray)):
+        return False, f"{bytes_field} is not accepted; send a {file_part} file part instead."
+    if image_base64 is not None and not isinstance(image_base64, str):
+        return False, f"{base64_field} must be a base64 string."
 
-    # Required fields
-    if not body.get("reference_image_base64"):
-        return False, "reference_image_base64 is required."
+    if not image_base64 and not image_bytes:
+        return False, f"{base64_field} (or a {file_part} file part) is required."
 
-    if not body.get("reference_image_mime"):
-        return False, "reference_image_mime is required."
+    if not mime:
+        return False, f"{mime_field} is required."
 
-    if body["reference_image_mime"] not in VALID_IMAGE_MIMES:
+    if not isinstance(mime, str) or mime not in VALID_IMAGE_MIMES:
         return False, (
-            f"Invalid reference_image_mime. Must be one of: {', '.join(sorted(VALID_IMAGE_MIMES))}"
+            f"Invalid {mime_field}. Must be one of: {', '.join(sorted(VALID_IMAGE_MIMES))}"
         )
 
-    # Check base64 size (rough estimate)
-    img_size = len(body["reference_image_base64"])
+    # Check base64 size (rough estimate; binary uploads use the encoded size)
+    if image_bytes:
+        img_size = 4 * ((len(image_bytes) + 2) // 3)
+    else:
+        img_size = len(image_base64)
     if img_size > MAX_IMAGE_SIZE_BYTES:
         return False, f"Reference image too large. Max base64 size: {MAX_IMAGE_SIZE_BYTES} bytes."
+    return True, None
+
+
+def _decode_base64_field(container, base64_field, bytes_field, label=None):
+    """
+    Replace a validated base64 field with its decoded bytes, as if the asset
+    had arrived as a multipart file part.
+
+    /api/jobs and /api/campaigns store every asset as raw bytes, so they
+    decode up front: malformed base64 is then a 400 before anything is
+    queued, and is not decoded twice.
+
+    Args:
+        container: The request body, or one item of it (e.g. a reference).
+        base64_field: Key of the base64 string.
+        bytes_field: Key to store the raw bytes under.
+        label: Name of the field in error messages (default base64_field).
+
+    Returns:
+        Error message, or None.
+    """
+    value = container.get(base64_field)
+    if not value or container.get(bytes_field):
+        return None
+    try:
+        container[bytes_field] = MediaAsset("application/octet-stream", data_base64=value).raw()
+    except ValueError as e:
+        return f"{label or base64_field}: {e}"
+    del container[base64_field]
+    return None
+
+
+def _validate_options(body):
+    """
+    Validate the optional generation settings shared with /api/jobs and
+    /api/campaigns.
+
+    Returns:
+        (is_valid: bool, error_message: str or None)
+    """
+    brand_ci_bytes = body.get("brand_ci_bytes")
+    if brand_ci_bytes is not None and not isinstance(brand_ci_bytes, (bytes, bytearray)):
+        return False, "brand_ci_bytes is not accepted; send a brand_ci file part instead."
+    brand_ci_base64 = body.get("brand_ci_base64")
+    if brand_ci_base64 is not None and not isinstance(brand_ci_base64, str):
+        return False, "brand_ci_base64 must be a base64 string."
+
+    # Edit areas
+    edit_areas = body.get("edit_areas", [])
+    if edit_areas:
+        if not isinstance(edit_areas, list):
+            return False, "edit_areas must be an array."
+        if not all(isinstance(area, str) for area in edit_areas):
+            return False, "edit_areas must be an array of strings."
+        invalid = set(edit_areas) - VALID_EDIT_AREAS
+        if invalid:
+            return False, (
+                f"Invalid edit_areas: {', '.join(invalid)}. "
+                f"Must be from: {', '.join(sorted(VALID_EDIT_AREAS))}"
+            )
+
+    use_cache = body.get("use_cache")
+    if use_cache is not None and not isinstance(use_cache, bool):
+        return False, "use_cache must be a boolean."
+
+    upload_mode = body.get("upload_mode")
+    if upload_mode is not None and (
+        not isinstance(upload_mode, str) or upload_mode not in UPLOAD_MODES
+    ):
+        return False, (
+            f"Invalid upload_mode. Must be one of: {', '.join(sorted(UPLOAD_MODES))}"
+        )
+
+    image_delivery = body.get("image_delivery")
+    if image_delivery is not None and (
+        not isinstance(image_delivery, str) or image_delivery not in IMAGE_DELIVERY_MODES
+    ):
+        return False, (
+            f"Invalid image_delivery. Must be one of: {', '.join(sorted(IMAGE_DELIVERY_MODES))}"
+        )
+
+    brand_ci_mode = body.get("brand_ci_mode")
+    if brand_ci_mode is not None and (
+        not isinstance(brand_ci_mode, str) or brand_ci_mode not in BRAND_CI_MODES
+    ):
+        return False, (
+            f"Invalid brand_ci_mode. Must be one of: {', '.join(sorted(BRAND_CI_MODES))}"
+        )
+
+    preflight = body.get("preflight")
+    if preflight is not None and not isinstance(preflight, bool):
+        return False, "preflight must be a boolean."
+
+    context_cache = body.get("context_cache")
+    if context_cache is not None and not isinstance(context_cache, bool):
+        return False, "context_cache must be a boolean."
+
+    deadline_seconds = body.get("deadline_seconds")
+    if deadline_seconds is not None:
+        if (
+            not isinstance(deadline_seconds, (int, float))
+            or isinstance(deadline_seconds, bool)
+            or not 0 < deadline_seconds <= MAX_DEADLINE_SECONDS
+        ):
+            return False, (
+                f"deadline_seconds must be a number between 0 and {MAX_DEADLINE_SECONDS}."
+            )
+
+    variants = body.get("variants")
+    if variants is not None:
+        if (
+            not isinstance(variants, int)
+            or isinstance(variants, bool)
+            or not 1 <= variants <= MAX_VARIANTS
+        ):
+            return False, f"variants must be an integer between 1 and {MAX_VARIANTS}."
+
+    return True, None
+
+
+def _validate_request(body):
+    """
+    Validate the incoming request body.
+
+    Returns:
+        (is_valid: bool, error_message: str or None)
+    """
+    if not body:
+        return False, "Request body is required."
+
+    # Required fields
+    is_valid, error_msg = _validate_reference_image(
+        body.get("reference_image_mime"),
+        body.get("reference_image_base64"),
+        body.get("reference_image_bytes"),
+    )
+    if not is_valid:
+        return False, error_msg
 
     # Segments
     segments = body.get("segments")
@@ -90,152 +415,251 @@ def _validate_request(body):
 
     # Aspect ratio
     aspect_ratio = body.get("aspect_ratio", "auto")
-    if aspect_ratio not in VALID_ASPECT_RATIOS:
+    if not isinstance(aspect_ratio, str) or aspect_ratio not in VALID_ASPECT_RATIOS:
         return False, (
             f"Invalid aspect_ratio. Must be one of: {', '.join(sorted(VALID_ASPECT_RATIOS))}"
         )
 
-    # Edit areas
-    edit_areas = body.get("edit_areas", [])
-    if edit_areas:
-        if not isinstance(edit_areas, list):
-            return False, "edit_areas must be an array."
-        invalid = set(edit_areas) - VALID_EDIT_AREAS
-        if invalid:
+    is_valid, error_msg = _validate_options(body)
+    if not is_valid:
+        return False, error_msg
+
+    # Fan-out tuning
+    max_concurrency = body.get("max_concurrency")
+    if max_concurrency is not None:
+        if (
+            not isinstance(max_concurrency, int)
+            or isinstance(max_concurrency, bool)
+            or not 1 <= max_concurrency <= MAX_SEGMENTS_PER_REQUEST
+        ):
             return False, (
-                f"Invalid edit_areas: {', '.join(invalid)}. "
-                f"Must be from: {', '.join(sorted(VALID_EDIT_AREAS))}"
+                f"max_concurrency must be an integer between 1 and {MAX_SEGMENTS_PER_REQUEST}."
             )
 
     return True, None
 
 
+def _build_option_params(body):
+    """
+    Build the pipeline params shared by every reference image: brand CI
+    and the optional settings checked by _validate_options.
+    """
+    if body.get("brand_ci_bytes"):
+        brand_ci = MediaAsset("application/pdf", data=body["brand_ci_bytes"])
+    else:
+        brand_ci = MediaAsset.from_base64("application/pdf", body.get("brand_ci_base64"))
+
+    return {
+        "brand_ci": brand_ci,
+        "edit_areas": body.get("edit_areas", ["actor", "background", "text"]),
+        "use_cache": body.get("use_cache", True),
+        "upload_mode": body.get("upload_mode", UPLOAD_MODE),
+        "image_delivery": body.get("image_delivery", IMAGE_DELIVERY),
+        "preflight_enabled": body.get("preflight", PREFLIGHT_ENABLED),
+        "brand_ci_mode": body.get("brand_ci_mode", BRAND_CI_MODE),
+        "variants": body.get("variants", 1),
+        "context_cache": body.get("context_cache", CONTEXT_CACHE_ENABLED),
+    }
+
+
+def _build_generation_params(body):
+    """
+    Turn a validated request body into pipeline inputs.
+
+    Returns:
+        (segments, params, max_concurrency, deadline_seconds)
+    """
+    reference_image_mime = body["reference_image_mime"]
+
+    # Keep binary uploads as raw bytes until they are encoded for Gemini
+    if body.get("reference_image_bytes"):
+        reference_image = MediaAsset(reference_image_mime, data=body["reference_image_bytes"])
+    else:
+        reference_image = MediaAsset.from_base64(
+            reference_image_mime, body["reference_image_base64"]
+        )
+    params = _build_option_params(body)
+    params.update(
+        reference_image=reference_image,
+        aspect_ratio=body.get("aspect_ratio", "auto"),
+    )
+    return (
+        get_segments_by_ids(body["segments"]),
+        params,
+        body.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+        body.get("deadline_seconds", DEFAULT_DEADLINE_SECONDS),
+    )
+
+
+def _new_tally():
+    """Create the per-request outcome counters reported in metadata."""
+    return {
+        "successful": 0,
+        "failed": 0,
+        "cache_hits": 0,
+        "coalesced_hits": 0,
+        "rate_limit_wait_seconds": 0.0,
+        "usage": {},
+    }
+
+
+def _count_outcome(tally, outcome):
+    """Add a single segment outcome to the tally."""
+    if outcome["status"] == "success":
+        tally["successful"] += 1
+        if outcome.get("cache_hit"):
+            tally["cache_hits"] += 1
+        if outcome.get("coalesced"):
+            tally["coalesced_hits"] += 1
+        tally["rate_limit_wait_seconds"] += outcome.get("rate_limit_wait_seconds", 0.0)
+        add_usage(tally["usage"], outcome.get("usage"))
+    else:
+        tally["failed"] += 1
+
+
+def _build_metadata(segments, tally, start_time, params, max_concurrency, deadline_seconds,
+                    timings=None):
+    """Build the metadata block shared by the JSON and streamed responses."""
+    return {
+        "total_segments": len(segments),
+        "successful": tally["successful"],
+        "failed": tally["failed"],
+        "cache_hits": tally["cache_hits"],
+        "coalesced_hits": tally["coalesced_hits"],
+        "rate_limit_wait_seconds": round(tally["rate_limit_wait_seconds"], 3),
+        "usage": tally["usage"],
+        "total_time_seconds": round(time.time() - start_time, 2),
+        "aspect_ratio": params["aspect_ratio"],
+        "edit_areas": params["edit_areas"],
+        "max_concurrency": max_concurrency,
+        "deadline_seconds": deadline_seconds,
+        "upload_mode": params["upload_mode"],
+        "brand_ci_mode": params["brand_ci_mode"],
+        "variants": params["variants"],
+        "context_cache": params["context_cache"],
+        "resolved_aspect_ratio": params["resolved_aspect_ratio"],
+        "preflight": params["preflight"],
+        # Per-stage totals so far (also sent as the Server-Timing header)
+        "timings": timings.as_dict() if timings is not None else None,
+    }
+
+
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         start_time = time.time()
+        # Stage timers (body parsing, prompts, Gemini calls, ...) for the
+        # Server-Timing header and /api/metrics
+        self.request_timings = start_request_timings()
+
+        # Fail fast while Gemini is known to be down, before reading the body
+        retry_after = circuit_retry_after()
+        if retry_after > 0:
+            send_error(
+                self,
+                "Gemini API is temporarily unavailable (circuit breaker open). "
+                "Retry after the indicated delay.",
+                status_code=503,
+                details={"circuit": get_circuit_stats()},
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            return
 
         # Parse request body
         try:
-            body = _read_body(self)
+            with stage("read_body"):
+                body = _read_body(self)
         except json.JSONDecodeError as e:
             send_error(self, f"Invalid JSON in request body: {str(e)}")
             return
+        except MultipartError as e:
+            send_error(self, f"Invalid multipart request body: {str(e)}")
+            return
         except Exception as e:
             send_error(self, f"Failed to read request body: {str(e)}", status_code=500)
             return
 
         # Validate
-        is_valid, error_msg = _validate_request(body)
+        with stage("validate"):
+            is_valid, error_msg = _validate_request(body)
         if not is_valid or body is None:
             send_error(self, error_msg or "Request body is required", status_code=400)
             return
 
-        # Extract fields (body is guaranteed non-None after validation)
-        reference_image_base64 = body["reference_image_base64"]
-        reference_image_mime = body["reference_image_mime"]
-        segment_ids = body["segments"]
-        aspect_ratio = body.get("aspect_ratio", "auto")
-        edit_areas = body.get("edit_areas", ["actor", "background", "text"])
-        brand_ci_base64 = body.get("brand_ci_base64")
-
-        # Resolve segments
-        segments = get_segments_by_ids(segment_ids)
-
-        has_brand_ci = brand_ci_base64 is not None and len(brand_ci_base64) > 0
-
-        # Generate for each segment
-        results = []
-        errors = []
-
-        for segment in segments:
-            segment_start = time.time()
-            try:
-                prompt = build_prompt(
-                    segment=segment,
-                    edit_areas=edit_areas,
-                    aspect_ratio=aspect_ratio,
-                    has_brand_ci=has_brand_ci,
-                )
-
-                generation_result = generate_image(
-                    prompt=prompt,
-                    reference_image_base64=reference_image_base64,
-                    reference_image_mime=reference_image_mime,
-                    brand_ci_base64=brand_ci_base64 if has_brand_ci else None,
-                )
-
-                segment_duration = round(time.time() - segment_start, 2)
-
-                results.append({
-                    "segment_id": segment["id"],
-                    "segment_name": segment["name"],
-                    "image_base64": generation_result["image_base64"],
-                    "image_mime": generation_result["image_mime"],
-                    "description": generation_result.get("text"),
-                    "prompt_used": prompt,
-                    "generation_time_seconds": segment_duration,
-                    "status": "success",
-                })
-
-            except GeminiClientError as e:
-                segment_duration = round(time.time() - segment_start, 2)
-                logger.error(
-                    "Gemini error for segment %s: %s", segment["id"], str(e)
-                )
-                errors.append({
-                    "segment_id": segment["id"],
-                    "segment_name": segment["name"],
-                    "error": str(e),
-                    "details": e.details,
-                    "generation_time_seconds": segment_duration,
-                    "status": "error",
-                })
-
-            except Exception as e:
-                segment_duration = round(time.time() - segment_start, 2)
-                logger.error(
-                    "Unexpected error for segment %s: %s\n%s",
-                    segment["id"],
-                    str(e),
-                    traceback.format_exc(),
-                )
-                errors.append({
-                    "segment_id": segment["id"],
-                    "segment_name": segment["name"],
-                    "error": f"Internal error: {str(e)}",
-                    "generation_time_seconds": segment_duration,
-                    "status": "error",
-                })
-
-        total_duration = round(time.time() - start_time, 2)
+        with stage("build_params"):
+            segments, params, max_concurrency, deadline_seconds = _build_generation_params(body)
+
+        stream_format = _get_stream_format(self)
+        if stream_format:
+            self._stream_segments(
+                stream_format, segments, params, max_concurrency, deadline_seconds, start_time
+            )
+            return
+
+        # Generate for each segment (bounded fan-out)
+        results, errors = run_segments(
+            segments,
+            params,
+            max_concurrency=max_concurrency,
+            deadline_seconds=deadline_seconds,
+        )
+
+        tally = _new_tally()
+        for outcome in results + errors:
+            _count_outcome(tally, outcome)
 
         # Determine overall status
-        if len(results) == 0 and len(errors) > 0:
-            overall_status = "failed"
-            status_code = 502
-        elif len(errors) > 0:
-            overall_status = "partial"
-            status_code = 207  # Multi-Status
-        else:
-            overall_status = "success"
-            status_code = 200
+        overall_status, status_code = resolve_overall_status(
+            tally["successful"], tally["failed"]
+        )
 
         response = {
             "status": overall_status,
             "results": results,
             "errors": errors,
-            "metadata": {
-                "total_segments": len(segments),
-                "successful": len(results),
-                "failed": len(errors),
-                "total_time_seconds": total_duration,
-                "aspect_ratio": aspect_ratio,
-                "edit_areas": edit_areas,
-            },
+            "metadata": _build_metadata(
+                segments, tally, start_time, params, max_concurrency, deadline_seconds,
+                self.request_timings,
+            ),
         }
 
         send_json(self, response, status_code=status_code)
 
+    def _stream_segments(
+        self, stream_format, segments, params, max_concurrency, deadline_seconds, start_time
+    ):
+        """Write each segment outcome as an event as soon as it completes."""
+        start_stream(self, stream_format)
+        send_stream_event(self, stream_format, "start", {
+            "total_segments": len(segments),
+            "segment_ids": [segment["id"] for segment in segments],
+        })
+
+        # Only counts are kept; each image is released once it is written
+        tally = _new_tally()
+        try:
+            for index, outcome in iter_segment_results(
+                segments, params, max_concurrency, deadline_seconds
+            ):
+                outcome["index"] = index
+                _count_outcome(tally, outcome)
+                event = "result" if outcome["status"] == "success" else "error"
+                send_stream_event(self, stream_format, event, outcome)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning("Client disconnected during streamed generation")
+            return
+
+        overall_status, status_code = resolve_overall_status(
+            tally["successful"], tally["failed"]
+        )
+        send_stream_event(self, stream_format, "summary", {
+            "status": overall_status,
+            "status_code": status_code,
+            "metadata": _build_metadata(
+                segments, tally, start_time, params, max_concurrency, deadline_seconds,
+                self.request_timings,
+            ),
+        })
+
     def do_OPTIONS(self):
         handle_preflight(self)
 
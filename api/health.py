@@ -1,7 +1,18 @@
 """
 Health check endpoint.
 
-GET /api/health -> {"status": "ok", "version": "1.0.0"}
+GET /api/health -> {"status": "ok", "version": "1.0.0", "gemini_pool": {...},
+                    "gemini_retry": {...}, "gemini_rate_limiter": {...},
+                    "gemini_circuit": {...}, "generate_coalescing": {...}}
+
+gemini_pool reports the keep-alive connection pool counters so connection
+reuse can be confirmed under load; gemini_retry reports the retry / hedging
+settings and recent generateContent latency percentiles; gemini_rate_limiter
+reports the current request rate / concurrency limits and queue wait times;
+gemini_circuit reports the circuit breaker state (closed / open / half_open);
+generate_coalescing counts generations that shared an identical in-flight
+Gemini call instead of making their own.
+status is "degraded" while the circuit is not closed.
 """
 
 from http.server import BaseHTTPRequestHandler
@@ -12,14 +23,27 @@ import os
 # Add parent directory to path for shared lib imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from _lib.cors import send_json, handle_preflight
+from _lib.gemini_client import (
+    get_pool_stats,
+    get_retry_stats,
+    get_rate_limiter_stats,
+    get_circuit_stats,
+    get_coalescing_stats,
+)
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        circuit = get_circuit_stats()
         send_json(self, {
-            "status": "ok",
+            "status": "ok" if circuit["state"] == "closed" else "degraded",
             "version": "1.0.0",
             "service": "Egg Digital Dynamic Creative Intelligence Platform",
+            "gemini_pool": get_pool_stats(),
+            "gemini_retry": get_retry_stats(),
+            "gemini_rate_limiter": get_rate_limiter_stats(),
+            "gemini_circuit": circuit,
+            "generate_coalescing": get_coalescing_stats(),
         })
 
     def do_OPTIONS(self):
@@ -1,28 +1,99 @@
 """
 Generation history endpoint.
 
-GET /api/history -> Returns generation history (empty for now, no persistent storage on Vercel).
+GET /api/history -> Past segment generations, newest first.
 
-In a production deployment, this would connect to a database or external storage
-service to retrieve past generation records.
+Query parameters (all optional):
+  - limit (int): Page size, 1-200 (default 50)
+  - cursor (int): next_cursor from the previous page
+  - segment (str): Only this segment ID
+  - reference_sha256 (str): Only generations from this reference image
+    (SHA-256 of the uploaded bytes)
+  - request_id (str): Only one /api/generate request or /api/jobs job
+  - status (str): "success" or "error"
+  - since / until (number): Epoch-second bounds on the generation time
+
+Returns JSON with history (list of rows), count and next_cursor (null on
+the last page). Rows are written in the background, so generations from
+the last ~HISTORY_FLUSH_SECONDS (default 0.5 s) may not be listed yet.
+
+History is recorded by the generation pipeline into a local SQLite
+database (HISTORY_DB_PATH). On Vercel that is per-instance /tmp storage,
+so point HISTORY_DB_PATH at persistent storage for durable history.
 """
 
 from http.server import BaseHTTPRequestHandler
 import sys
 import os
+from urllib.parse import urlparse, parse_qs
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from _lib.cors import send_json, handle_preflight
+from _lib.cors import send_json, send_error, handle_preflight
+from _lib.history_store import get_default_recorder, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+VALID_STATUSES = {"success", "error"}
+
+
+def _parse_query(path):
+    """
+    Parse and validate the query string.
+
+    Returns:
+        (options dict for list_generations, error message or None)
+    """
+    query = {key: values[0] for key, values in parse_qs(urlparse(path).query).items()}
+    options = {
+        "segment_id": query.get("segment") or None,
+        "reference_sha256": (query.get("reference_sha256") or "").lower() or None,
+        "request_id": query.get("request_id") or None,
+        "status": query.get("status") or None,
+    }
+    if options["status"] is not None and options["status"] not in VALID_STATUSES:
+        return None, f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}"
+
+    try:
+        options["limit"] = int(query.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None, "limit must be an integer."
+    if not 1 <= options["limit"] <= MAX_PAGE_SIZE:
+        return None, f"limit must be between 1 and {MAX_PAGE_SIZE}."
+
+    try:
+        options["cursor"] = int(query["cursor"]) if query.get("cursor") else None
+    except ValueError:
+        return None, "cursor must be an integer."
+
+    for name in ("since", "until"):
+        try:
+            options[name] = float(query[name]) if query.get(name) else None
+        except ValueError:
+            return None, f"{name} must be a number (epoch seconds)."
+    return options, None
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
-        send_json(self, {
-            "history": [],
-            "total": 0,
-            "message": "History is not persisted in the current serverless deployment. "
-                       "Connect a database for persistent history.",
-        })
+        options, error_msg = _parse_query(self.path)
+        if error_msg:
+            send_error(self, error_msg, status_code=400)
+            return
+
+        recorder = get_default_recorder()
+        if recorder is None:
+            send_json(self, {
+                "history": [],
+                "count": 0,
+                "next_cursor": None,
+                "message": "Generation history is disabled or its database is unavailable.",
+            })
+            return
+
+        rows, next_cursor = recorder.store.list_generations(**options)
+        send_json(
+            self,
+            {"history": rows, "count": len(rows), "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-store"},
+        )
 
     def do_OPTIONS(self):
         handle_preflight(self)
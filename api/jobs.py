@@ -0,0 +1,124 @@
+"""
+Asynchronous generation job endpoint.
+
+POST /api/jobs
+Accepts the same JSON or multipart body as POST /api/generate (see
+generate.py), validates it the same way and answers 202 at once with:
+  - job_id (str): Identifier to poll
+  - status (str): "queued"
+  - status_url (str): /api/jobs/<job_id>
+Segments are generated by background workers; images are always delivered
+as /api/assets URLs. deadline_seconds defaults to JOB_DEADLINE_SECONDS.
+
+GET /api/jobs/<job_id>       -> Job status with per-segment status and results
+GET /api/jobs?id=<job_id>    -> Same (used by the Vercel rewrite)
+
+Job status is "queued", "running", then "success", "partial" or "failed";
+each segment is "pending", "running", "success" or "error". Jobs are kept
+in a local SQLite database (JOB_STORE_PATH) and resume after a restart,
+so this endpoint is meant for local_server.py or another long-lived host.
+"""
+
+from http.server import BaseHTTPRequestHandler
+import json
+import logging
+import os
+import re
+import sys
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib.cors import send_json, send_error, handle_preflight
+from _lib.multipart import MultipartError
+from _lib.job_store import get_default_store, QUEUED
+from _lib.job_queue import (
+    get_default_runner,
+    build_job_spec,
+    describe_job,
+    job_url,
+    JOB_URL_PREFIX,
+)
+from generate import (
+    _read_body,
+    _validate_request,
+    _decode_base64_field,
+    _build_generation_params,
+)
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _get_job_id(path):
+    """Extract the job ID from the path tail or ?id= parameter."""
+    parsed = urlparse(path)
+    job_id = parse_qs(parsed.query).get("id", [None])[0]
+    if not job_id and parsed.path.startswith(JOB_URL_PREFIX):
+        job_id = parsed.path[len(JOB_URL_PREFIX):].strip("/")
+    return (job_id or "").lower()
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        try:
+            body = _read_body(self)
+        except json.JSONDecodeError as e:
+            send_error(self, f"Invalid JSON in request body: {str(e)}")
+            return
+        except MultipartError as e:
+            send_error(self, f"Invalid multipart request body: {str(e)}")
+            return
+        except Exception as e:
+            send_error(self, f"Failed to read request body: {str(e)}", status_code=500)
+            return
+
+        is_valid, error_msg = _validate_request(body)
+        if not is_valid or body is None:
+            send_error(self, error_msg or "Request body is required", status_code=400)
+            return
+        for base64_field, bytes_field in (
+            ("reference_image_base64", "reference_image_bytes"),
+            ("brand_ci_base64", "brand_ci_bytes"),
+        ):
+            error_msg = _decode_base64_field(body, base64_field, bytes_field)
+            if error_msg:
+                send_error(self, error_msg, status_code=400)
+                return
+
+        segments, params, max_concurrency, _ = _build_generation_params(body)
+        try:
+            spec = build_job_spec(params, max_concurrency, body.get("deadline_seconds"))
+            job_id = get_default_runner().submit(spec, [segment["id"] for segment in segments])
+        except Exception as e:
+            logger.exception("Failed to queue job")
+            send_error(self, f"Failed to queue job: {str(e)}", status_code=500)
+            return
+
+        status_url = job_url(job_id)
+        send_json(
+            self,
+            {"job_id": job_id, "status": QUEUED, "status_url": status_url},
+            status_code=202,
+            headers={"Location": status_url},
+        )
+
+    def do_GET(self):
+        job_id = _get_job_id(self.path)
+        if not _JOB_ID_RE.match(job_id):
+            send_error(self, "A job ID is required: /api/jobs/<job_id>", status_code=400)
+            return
+
+        # Starting the runner here resumes unfinished jobs after a restart
+        get_default_runner()
+        job = get_default_store().get_job(job_id)
+        if job is None:
+            send_error(self, f"Job not found: {job_id}", status_code=404)
+            return
+        send_json(self, describe_job(job), headers={"Cache-Control": "no-store"})
+
+    def do_OPTIONS(self):
+        handle_preflight(self)
+
+    def log_message(self, format, *args):
+        pass
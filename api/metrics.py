@@ -0,0 +1,46 @@
+"""
+Metrics endpoint.
+
+GET /api/metrics -> Prometheus text exposition (version 0.0.4) with:
+  - creative_stage_duration_seconds (histogram by stage): read_body,
+    validate, build_params, prepare, queue, prompt, serialize, rate_limit,
+    upstream, decode_response, parse_response, encode_response,
+    write_response
+  - creative_http_requests_total (by endpoint and status)
+  - creative_http_request_bytes_total / creative_http_response_bytes_total
+    (by endpoint)
+  - creative_gemini_responses_total (by upstream HTTP status, or timeout /
+    connection_error)
+  - creative_gemini_request_bytes_total / creative_gemini_response_bytes_total
+  - creative_coalesced_calls_total (by flight: generations that shared an
+    identical in-flight Gemini call instead of making their own)
+
+Metrics are kept in process memory, so each serverless instance (or
+local_server.py process) reports its own since it started.
+"""
+
+from http.server import BaseHTTPRequestHandler
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib.cors import add_cors_headers, handle_preflight
+from _lib.metrics import render_metrics, CONTENT_TYPE
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        add_cors_headers(self)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        handle_preflight(self)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,97 @@
+"""
+Small measurement helpers shared by the benchmark scripts.
+
+Each measurement reports wall time, CPU time and peak traced memory
+(tracemalloc) for a callable, so runs are comparable across commits.
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Make the API package importable as it is by the serverless handlers
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+
+def measure(fn, repeat=3):
+    """
+    Run fn `repeat` times and report the best wall / CPU time and peak memory.
+
+    Args:
+        fn: Zero-argument callable to measure.
+        repeat: Number of runs.
+
+    Returns:
+        Dict with wall_seconds, cpu_seconds and peak_bytes (the largest
+        tracemalloc peak across runs).
+    """
+    best_wall = float("inf")
+    best_cpu = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        gc.collect()
+        tracemalloc.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        fn()
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        _, run_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        best_wall = min(best_wall, wall)
+        best_cpu = min(best_cpu, cpu)
+        peak = max(peak, run_peak)
+    return {"wall_seconds": best_wall, "cpu_seconds": best_cpu, "peak_bytes": peak}
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reset_peak_rss():
+    """Reset the process's peak RSS (Linux); return False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    """Peak resident set size since start (or reset_peak_rss), or None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def format_bytes(n):
+    """Format a byte count for display."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}"
+        n /= 1024.0
+
+
+def print_rows(rows):
+    """Print measurement rows as an aligned table."""
+    print(f"{'case':<40} {'wall':>10} {'cpu':>10} {'peak mem':>12}")
+    for name, m in rows:
+        print(
+            f"{name:<40} {m['wall_seconds'] * 1000:>8.1f}ms {m['cpu_seconds'] * 1000:>8.1f}ms "
+            f"{format_bytes(m['peak_bytes']):>12}"
+        )
@@ -0,0 +1,159 @@
+"""
+Benchmark: concurrent generations one process can hold, threads vs asyncio.
+
+Starts N segment generations at once through the pipeline with each
+engine, against the Gemini mock running as a separate process with a slow
+response (default 5 s), and reports how many finished within the deadline,
+the wall time, the peak thread count and the peak RSS growth. Every run is
+a fresh process so runs do not inherit each other's threads or memory.
+The threads engine needs a thread per in-flight call; the asyncio engine
+holds them as coroutines on one event loop.
+
+    python benchmarks/bench_async_engine.py [--levels 50,200,500] [--latency 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import format_bytes, rss_bytes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Sampler:
+    """Samples the thread count and RSS on a background thread."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            rss = rss_bytes()
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _start_mock(latency):
+    """Run mock_gemini.py in a subprocess; return (process, base_url)."""
+    process = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(BENCH_DIR, "mock_gemini.py"),
+         "--port", "0", "--latency", str(latency)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    return process, line.rsplit(" ", 1)[-1].strip()
+
+
+def run_level(concurrency, engine, deadline):
+    """Generate `concurrency` segments at once in this process; return the row dict."""
+    from _lib import pipeline, rate_limiter
+    from _lib.media import MediaAsset
+    from _lib.segments_data import get_all_segments
+
+    # Unthrottled limiter so only the engine bounds concurrency
+    rate_limiter._default_limiter = rate_limiter.AdaptiveRateLimiter(
+        rate=0, initial_concurrency=concurrency, max_concurrency=concurrency
+    )
+    segments = (get_all_segments() * concurrency)[:concurrency]
+    params = {
+        "reference_image": MediaAsset("image/png", data=os.urandom(64 * 1024)),
+        "brand_ci": None,
+        "aspect_ratio": "1:1",
+        "edit_areas": ["actor", "background", "text"],
+        "upload_mode": "inline",
+        "preflight_enabled": False,
+        "use_cache": False,
+    }
+
+    rss_before = rss_bytes()
+    with _Sampler() as sampler:
+        start = time.perf_counter()
+        results, errors = pipeline.run_segments(
+            segments, params, max_concurrency=concurrency,
+            deadline_seconds=deadline, engine=engine,
+        )
+        elapsed = time.perf_counter() - start
+    rss_growth = None
+    if rss_before is not None and sampler.peak_rss is not None:
+        rss_growth = sampler.peak_rss - rss_before
+    return {
+        "done": len(results),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "threads": sampler.peak_threads,
+        "rss_growth": rss_growth,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="50,200,500", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", type=float, default=5.0, help="Mock Gemini latency (s)")
+    parser.add_argument("--deadline", type=float, default=60.0, help="Request deadline (s)")
+    parser.add_argument(
+        "--engines", default="threads,asyncio", help="Comma-separated engines to compare"
+    )
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # "engine:concurrency" (child process)
+    args = parser.parse_args()
+
+    if args.run:
+        engine, concurrency = args.run.split(":")
+        print(json.dumps(run_level(int(concurrency), engine, args.deadline)))
+        return
+
+    mock, base_url = _start_mock(args.latency)
+    env = dict(
+        os.environ,
+        GEMINI_BASE_URL=base_url,
+        GENERATION_CACHE_BACKENDS="none",
+        HISTORY_ENABLED="0",
+    )
+    env.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+    print(f"Mock latency {args.latency:.1f}s, deadline {args.deadline:.0f}s")
+    print(f"{'engine':<8} {'in flight':>10} {'done':>6} {'errors':>7} {'wall':>9} "
+          f"{'gen/s':>7} {'threads':>8} {'rss growth':>11}")
+    try:
+        for concurrency in (int(level) for level in args.levels.split(",")):
+            for engine in args.engines.split(","):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--run", f"{engine}:{concurrency}",
+                     "--deadline", str(args.deadline)],
+                    env=env, capture_output=True, text=True, check=True,
+                ).stdout
+                row = json.loads(output.strip().splitlines()[-1])
+                rss_growth = row["rss_growth"]
+                print(
+                    f"{engine:<8} {concurrency:>10} {row['done']:>6} {row['errors']:>7} "
+                    f"{row['seconds']:>8.2f}s {row['done'] / row['seconds']:>7.1f} "
+                    f"{row['threads']:>8} "
+                    f"{format_bytes(rss_growth) if rss_growth is not None else 'n/a':>11}"
+                )
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: brand CI sent as a text digest vs the raw PDF on every call.
+
+Runs the generation pipeline against the in-process Gemini mock in both
+brand_ci_mode settings and reports the request bytes Gemini received and
+the end-to-end latency, plus the one-off digest extraction cost (cold)
+versus a cached lookup.
+
+Digest mode needs PyMuPDF (requirements.txt), which is also used to build
+the synthetic brand CI PDF unless --pdf points at a real one:
+
+    python benchmarks/bench_brand_ci.py [--pdf brand.pdf] [--segments 8] [--latency 0.2]
+"""
+
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import format_bytes
+from mock_gemini import MockGeminiServer, PLACEHOLDER_PNG_BASE64
+
+
+def make_brand_pdf(image_mb):
+    """Build a brand guideline PDF with rules text, swatches and a noise image."""
+    import fitz
+
+    doc = fitz.open()
+    page = doc.new_page()
+    rules = [
+        "Brand colours: Egg Yellow #FFC20E, Charcoal #1A1A1A, Sky RGB 0, 114, 206.",
+        "Headlines must be set in Helvetica Bold; body copy uses Helvetica.",
+        "The logo must always keep clear space equal to the height of the wordmark.",
+        "Never stretch, rotate or recolour the logo.",
+        "Photography should feel warm and natural; avoid heavy filters.",
+    ]
+    for line, text in enumerate(rules):
+        page.insert_text((50, 80 + 24 * line), text, fontname="helv", fontsize=11)
+    for index, color in enumerate([(1, 0.76, 0.05), (0.1, 0.1, 0.1), (0, 0.45, 0.81)]):
+        page.draw_rect(fitz.Rect(50 + 90 * index, 260, 130 + 90 * index, 340), fill=color)
+
+    # Embedded imagery makes up most of a real brand book's size
+    side = max(int((image_mb * 1024 * 1024 / 3) ** 0.5), 1)
+    pixmap = fitz.Pixmap(fitz.csRGB, side, side, os.urandom(side * side * 3), 0)
+    image_page = doc.new_page()
+    image_page.insert_image(image_page.rect, pixmap=pixmap)
+    return doc.tobytes(deflate=False)
+
+
+def run_mode(mock, params, segments, pipeline):
+    """Run all segments once; return (seconds, bytes received, calls, errors)."""
+    mock.state.reset()
+    start = time.perf_counter()
+    _, errors = pipeline.run_segments(segments, params, max_concurrency=4, deadline_seconds=120)
+    elapsed = time.perf_counter() - start
+    counters = dict(mock.counters)
+    return elapsed, counters["bytes_received"], counters["generate_calls"], errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", help="Path to a real brand CI PDF")
+    parser.add_argument("--image-mb", type=float, default=4.0, help="Synthetic PDF image size")
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock Gemini latency (s)")
+    args = parser.parse_args()
+
+    mock = MockGeminiServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+    os.environ["GENERATION_CACHE_BACKENDS"] = "none"
+    os.environ["BRAND_CI_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-brand-ci-")
+
+    from _lib import brand_ci, pipeline
+    from _lib.media import MediaAsset
+    from _lib.segments_data import get_all_segments
+
+    if brand_ci.fitz is None:
+        print("PyMuPDF is not installed; digest mode needs it (pip install -r requirements.txt)")
+        mock.stop()
+        sys.exit(1)
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = make_brand_pdf(args.image_mb)
+
+    segments = (get_all_segments() * args.segments)[: args.segments]
+    reference = MediaAsset("image/png", data=base64.b64decode(PLACEHOLDER_PNG_BASE64))
+    brand = MediaAsset("application/pdf", data=pdf_bytes)
+
+    start = time.perf_counter()
+    summary = brand_ci.get_brand_ci_summary(brand)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    brand_ci.get_brand_ci_summary(brand)
+    warm = time.perf_counter() - start
+
+    print(f"Brand CI PDF: {format_bytes(len(pdf_bytes))}, {args.segments} segments, "
+          f"mock latency {args.latency * 1000:.0f}ms")
+    print(f"Digest extraction: {cold * 1000:.1f}ms cold, {warm * 1000:.2f}ms cached")
+    if summary is None:
+        print("No guidance could be extracted from this PDF; digest mode would fall back to pdf")
+    else:
+        print(brand_ci.format_brand_ci_summary(summary))
+    print()
+
+    print(f"{'mode':<8} {'bytes/request':>14} {'total bytes':>12} {'latency':>10} {'errors':>7}")
+    for mode in ("pdf", "digest"):
+        params = {
+            "reference_image": reference,
+            "brand_ci": brand,
+            "aspect_ratio": "1:1",
+            "edit_areas": ["actor", "background", "text"],
+            "upload_mode": "inline",
+            "brand_ci_mode": mode,
+        }
+        elapsed, received, calls, errors = run_mode(mock, params, segments, pipeline)
+        print(
+            f"{params['brand_ci_mode']:<8} {format_bytes(received / max(calls, 1)):>14} "
+            f"{format_bytes(received):>12} {elapsed * 1000:>8.0f}ms {len(errors):>7}"
+        )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: time spent on calls during a Gemini outage, with and without
+the circuit breaker.
+
+The mock stops answering within the client timeout (every call hangs
+for --hang seconds), then recovers. With the breaker, calls fail fast once
+the circuit opens, and a probe closes it again after recovery.
+
+    python benchmarks/bench_circuit_breaker.py [--calls 20] [--timeout 1.0]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from mock_gemini import MockGeminiServer, PLACEHOLDER_PNG_BASE64
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=1.0, help="Client timeout per call")
+    parser.add_argument("--hang", type=float, default=5.0, help="Mock response delay in the outage")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    mock = MockGeminiServer(latency=0.02).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+    from _lib import gemini_client, rate_limiter
+    from _lib.circuit_breaker import CircuitBreaker
+    from _lib.gemini_client import GeminiClientError, generate_image
+    from _lib.retry import RetryPolicy
+
+    rate_limiter._default_limiter = rate_limiter.AdaptiveRateLimiter(rate=0, initial_concurrency=64)
+    gemini_client.GENERATE_RETRY_POLICY = RetryPolicy(max_attempts=1)
+
+    def call():
+        start = time.perf_counter()
+        try:
+            generate_image("benchmark prompt", PLACEHOLDER_PNG_BASE64, "image/png", timeout=args.timeout)
+            status = 200
+        except GeminiClientError as e:
+            status = e.status_code
+        return status, time.perf_counter() - start
+
+    print(f"Outage: {args.calls} sequential calls, each hanging {args.hang}s "
+          f"against a {args.timeout}s client timeout\n")
+    print(f"{'breaker':<9} {'outage time':>12} {'504 timeouts':>13} {'503 fast-fail':>14} {'state':>10}")
+    for label, breaker in (
+        ("off", CircuitBreaker("bench-off", min_calls=10 ** 9)),
+        ("on", CircuitBreaker("bench-on", min_calls=5, open_seconds=1.0)),
+    ):
+        gemini_client.GEMINI_CIRCUIT = breaker
+        mock.state.tail_latency = args.hang
+        mock.state.tail_rate = 1.0
+        outcomes = [call() for _ in range(args.calls)]
+        total = sum(seconds for _, seconds in outcomes)
+        timeouts = sum(1 for status, _ in outcomes if status == 504)
+        fast = sum(1 for status, _ in outcomes if status == 503)
+        print(
+            f"{label:<9} {total:>11.2f}s {timeouts:>13} {fast:>14} {breaker.state:>10}"
+        )
+
+        if label == "on":
+            mock.state.tail_rate = 0.0
+            time.sleep(breaker.open_seconds)
+            status, seconds = call()
+            print(f"\nAfter recovery: probe returned {status} in {seconds * 1000:.0f}ms, "
+                  f"circuit {breaker.state}")
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: identical generations submitted at once, with and without
+single-flight coalescing.
+
+Simulates a double-clicked Generate (or several teammates submitting the
+same asset): N identical requests start together against the in-process
+Gemini mock, with the result cache off so only coalescing can save calls.
+Reports the generateContent calls Gemini received, the coalesced segments
+and the wall time for each setting.
+
+    python benchmarks/bench_coalescing.py [--duplicates 2,4] [--segments 4] [--engine threads]
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from mock_gemini import MockGeminiServer
+
+
+def run_duplicates(mock, pipeline, segments, params, duplicates, engine):
+    """Run `duplicates` identical requests at once; return (seconds, calls, coalesced, errors)."""
+    mock.state.reset()
+    outcomes = []
+
+    def submit():
+        outcomes.append(pipeline.run_segments(
+            segments, dict(params), max_concurrency=len(segments), deadline_seconds=120,
+            engine=engine,
+        ))
+
+    threads = [threading.Thread(target=submit) for _ in range(duplicates)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    coalesced = sum(result.get("coalesced", False) for results, _ in outcomes for result in results)
+    errors = sum(len(errors) for _, errors in outcomes)
+    return elapsed, mock.counters["generate_calls"], coalesced, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duplicates", default="2,4", help="Comma-separated identical request counts")
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock Gemini latency (s)")
+    parser.add_argument("--engine", default="threads", help="threads or asyncio")
+    args = parser.parse_args()
+
+    mock = MockGeminiServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+    os.environ["GENERATION_CACHE_BACKENDS"] = "none"
+    os.environ["HISTORY_ENABLED"] = "0"
+
+    from _lib import pipeline, rate_limiter
+    from _lib.media import MediaAsset
+    from _lib.segments_data import get_all_segments
+
+    segments = (get_all_segments() * args.segments)[: args.segments]
+    params = {
+        "reference_image": MediaAsset("image/png", data=os.urandom(64 * 1024)),
+        "brand_ci": None,
+        "aspect_ratio": "1:1",
+        "edit_areas": ["actor", "background", "text"],
+        "upload_mode": "inline",
+        "preflight_enabled": False,
+        "use_cache": False,
+    }
+
+    print(f"{args.segments} segments per request, mock latency {args.latency * 1000:.0f}ms, "
+          f"engine {args.engine}")
+    print(f"{'duplicates':>10} {'coalescing':<11} {'gemini calls':>13} {'coalesced':>10} "
+          f"{'wall':>9} {'errors':>7}")
+    for duplicates in (int(count) for count in args.duplicates.split(",")):
+        for enabled in (False, True):
+            pipeline.COALESCE_ENABLED = enabled
+            # Fresh, unthrottled limiter so runs do not inherit each other's limit
+            rate_limiter._default_limiter = rate_limiter.AdaptiveRateLimiter(
+                rate=0, initial_concurrency=64
+            )
+            elapsed, calls, coalesced, errors = run_duplicates(
+                mock, pipeline, segments, params, duplicates, args.engine
+            )
+            print(
+                f"{duplicates:>10} {'on' if enabled else 'off':<11} {calls:>13} {coalesced:>10} "
+                f"{elapsed * 1000:>7.0f}ms {errors:>7}"
+            )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: shared prompt prefix and assets sent with every segment call vs
+registered once with the context caching API.
+
+Runs the generation pipeline against the in-process Gemini mock with
+context_cache off and on and reports the request bytes Gemini received,
+the prompt tokens billed per call split into cached and uncached (from
+usageMetadata, estimated by the mock), and the end-to-end latency.
+
+    python benchmarks/bench_context_cache.py [--segments 8] [--reference-kb 1024] [--brand-ci-kb 2048]
+"""
+
+import argparse
+import os
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import format_bytes
+from mock_gemini import MockGeminiServer
+
+
+def run_mode(mock, params, segments, pipeline):
+    """Run all segments once; return (seconds, bytes received, calls, usage, errors)."""
+    from _lib.gemini_client import add_usage
+
+    mock.state.reset()
+    start = time.perf_counter()
+    results, errors = pipeline.run_segments(segments, params, max_concurrency=4, deadline_seconds=120)
+    elapsed = time.perf_counter() - start
+    counters = dict(mock.counters)
+    usage = {}
+    for result in results:
+        add_usage(usage, result.get("usage"))
+    return elapsed, counters["bytes_received"], counters["generate_calls"], usage, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--reference-kb", type=int, default=1024, help="Reference image size")
+    parser.add_argument("--brand-ci-kb", type=int, default=2048, help="Brand CI PDF size (0 = none)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock Gemini latency (s)")
+    args = parser.parse_args()
+
+    mock = MockGeminiServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+    os.environ["GENERATION_CACHE_BACKENDS"] = "none"
+
+    from _lib import pipeline
+    from _lib.media import MediaAsset
+    from _lib.segments_data import get_all_segments
+
+    segments = (get_all_segments() * args.segments)[: args.segments]
+    reference = MediaAsset("image/png", data=os.urandom(args.reference_kb * 1024))
+    brand = None
+    if args.brand_ci_kb:
+        brand = MediaAsset("application/pdf", data=os.urandom(args.brand_ci_kb * 1024))
+
+    print(f"Reference image: {format_bytes(args.reference_kb * 1024)}, brand CI: "
+          f"{format_bytes(args.brand_ci_kb * 1024)}, {args.segments} segments, "
+          f"mock latency {args.latency * 1000:.0f}ms")
+    print(f"{'mode':<6} {'creates':>8} {'bytes/call':>11} {'total bytes':>12} {'tokens/call':>12} "
+          f"{'cached':>8} {'uncached':>9} {'latency':>10} {'errors':>7}")
+    for enabled in (False, True):
+        params = {
+            "reference_image": reference,
+            "brand_ci": brand,
+            "brand_ci_mode": "pdf",
+            "aspect_ratio": "1:1",
+            "edit_areas": ["actor", "background", "text"],
+            "upload_mode": "inline",
+            "preflight_enabled": False,
+            "context_cache": enabled,
+        }
+        elapsed, received, calls, usage, errors = run_mode(mock, params, segments, pipeline)
+        creates = mock.counters["cache_creates"]
+        per_call = max(calls, 1)
+        print(
+            f"{'on' if enabled else 'off':<6} {creates:>8} {format_bytes(received / per_call):>11} "
+            f"{format_bytes(received):>12} {usage.get('prompt_tokens', 0) / per_call:>12.0f} "
+            f"{usage.get('cached_tokens', 0) / per_call:>8.0f} "
+            f"{usage.get('uncached_tokens', 0) / per_call:>9.0f} "
+            f"{elapsed * 1000:>8.0f}ms {len(errors):>7}"
+        )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
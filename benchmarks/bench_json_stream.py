@@ -0,0 +1,138 @@
+"""
+Benchmark: peak memory of large /api/generate JSON responses, buffered vs
+streamed.
+
+Builds a response with N distinct base64 images (1 MB each before
+encoding) and sends it through cors.send_json to a socket-like sink,
+once with streaming disabled (one json.dumps + encode) and once streamed
+in chunks. Each run is a fresh process; the peak RSS growth over the RSS
+with the response data already built is reported alongside wall time.
+
+    python benchmarks/bench_json_stream.py [--images 1,4,8] [--image-kb 1024]
+"""
+
+import argparse
+import base64
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import format_bytes, peak_rss_bytes, reset_peak_rss, rss_bytes
+
+
+class _Sink:
+    """wfile stand-in that discards what is written, like a socket."""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+
+class _SinkHandler:
+    """The parts of BaseHTTPRequestHandler that send_json uses."""
+
+    protocol_version = "HTTP/1.1"
+    request_version = "HTTP/1.1"
+
+    def __init__(self):
+        self.wfile = _Sink()
+
+    def send_response(self, code):
+        pass
+
+    def send_header(self, key, value):
+        pass
+
+    def end_headers(self):
+        pass
+
+
+def build_response(images, image_kb):
+    """A /api/generate-shaped response with `images` distinct images."""
+    from _lib.segments_data import get_all_segments
+
+    segments = get_all_segments()
+    results = []
+    for i in range(images):
+        segment = segments[i % len(segments)]
+        results.append({
+            "segment_id": segment["id"],
+            "segment_name": segment["name"],
+            "image_base64": base64.b64encode(os.urandom(image_kb * 1024)).decode("ascii"),
+            "image_mime": "image/png",
+            "description": "Adapted creative for the segment.",
+            "status": "success",
+        })
+    return {
+        "status": "success",
+        "results": results,
+        "errors": [],
+        "metadata": {"total_segments": images, "successful": images, "failed": 0},
+    }
+
+
+def run_case(mode, images, image_kb):
+    """Send one response in this process; return the row dict."""
+    from _lib import cors
+
+    if mode == "buffered":
+        cors.STREAM_MIN_BYTES = 0
+    response = build_response(images, image_kb)
+    gc.collect()
+    baseline = rss_bytes()
+    peak_reset = reset_peak_rss()
+    handler = _SinkHandler()
+    start = time.perf_counter()
+    cors.send_json(handler, response)
+    elapsed = time.perf_counter() - start
+    if peak_reset:
+        peak = peak_rss_bytes()
+    else:
+        # ru_maxrss (KB on Linux) covers the whole process lifetime
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "seconds": elapsed,
+        "body_bytes": handler.wfile.written,
+        "peak_growth": None if baseline is None or peak is None else max(0, peak - baseline),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", default="1,4,8", help="Comma-separated image counts")
+    parser.add_argument("--image-kb", type=int, default=1024, help="Raw size of each image")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # "mode:images" (child process)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, images = args.run.split(":")
+        print(json.dumps(run_case(mode, int(images), args.image_kb)))
+        return
+
+    print(f"{'images':>6} {'mode':<9} {'body':>10} {'wall':>9} {'peak rss growth':>16}")
+    for images in (int(count) for count in args.images.split(",")):
+        for mode in ("buffered", "streamed"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", f"{mode}:{images}",
+                 "--image-kb", str(args.image_kb)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            growth = row["peak_growth"]
+            print(
+                f"{images:>6} {mode:<9} {format_bytes(row['body_bytes']):>10} "
+                f"{row['seconds'] * 1000:>7.1f}ms "
+                f"{format_bytes(growth) if growth is not None else 'n/a':>16}"
+            )
+
+
+if __name__ == "__main__":
+    main()
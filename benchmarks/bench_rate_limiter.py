@@ -0,0 +1,81 @@
+"""
+Benchmark: adaptive rate limiting against a Gemini quota.
+
+The mock answers 429 once more than --quota generate calls are in flight.
+--callers threads each issue calls concurrently, first with the limiter
+effectively off (every call goes straight upstream and relies on retries),
+then with the AIMD limiter, which backs off on 429s and queues the excess
+locally.
+
+    python benchmarks/bench_rate_limiter.py [--calls 64] [--callers 16] [--quota 4]
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _harness  # noqa: F401  (sets up sys.path)
+from mock_gemini import MockGeminiServer, PLACEHOLDER_PNG_BASE64
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=64)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--quota", type=int, default=4, help="Upstream concurrent call quota")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    mock = MockGeminiServer(latency=args.latency).start()
+    mock.state.concurrency_quota = args.quota
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+    from _lib import gemini_client, rate_limiter
+    from _lib.gemini_client import GeminiClientError, generate_image
+    from _lib.retry import RetryPolicy
+
+    gemini_client.GENERATE_RETRY_POLICY = RetryPolicy(max_attempts=5, base_delay=0.1, max_delay=1.0)
+
+    def call(_):
+        try:
+            result = generate_image("benchmark prompt", PLACEHOLDER_PNG_BASE64, "image/png", timeout=60)
+            return True, result["rate_limit_wait_seconds"]
+        except GeminiClientError:
+            return False, 0.0
+
+    print(
+        f"{args.calls} calls from {args.callers} callers, upstream quota {args.quota} "
+        f"in flight, {args.latency * 1000:.0f}ms per call\n"
+    )
+    print(
+        f"{'limiter':<10} {'ok':>4} {'failed':>7} {'upstream 429s':>14} {'wall':>8} "
+        f"{'queued total':>13} {'final limit':>12}"
+    )
+    for label, limiter in (
+        ("off", rate_limiter.AdaptiveRateLimiter(
+            rate=0, initial_concurrency=1000, min_concurrency=1000, max_concurrency=1000)),
+        ("adaptive", rate_limiter.AdaptiveRateLimiter(
+            rate=0, initial_concurrency=args.callers, max_concurrency=args.callers)),
+    ):
+        rate_limiter._default_limiter = limiter
+        mock.state.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.callers) as pool:
+            outcomes = list(pool.map(call, range(args.calls)))
+        wall = time.perf_counter() - start
+        ok = sum(1 for success, _ in outcomes if success)
+        stats = limiter.stats()
+        print(
+            f"{label:<10} {ok:>4} {args.calls - ok:>7} {mock.counters['quota_429s']:>14} "
+            f"{wall:>7.2f}s {stats['wait_seconds_total']:>12.2f}s {stats['concurrency_limit']:>12}"
+        )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
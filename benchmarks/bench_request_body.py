@@ -0,0 +1,79 @@
+"""
+Benchmark: per-segment request body assembly for a multi-segment call.
+
+Compares rebuilding the body dict and running json.dumps for every segment
+(the original generate_image path) against RequestBodyTemplate, which
+serializes the shared reference image / brand CI once and only splices in
+each segment's prompt.
+
+    python benchmarks/bench_request_body.py [--segments 8] [--mb 20]
+"""
+
+import argparse
+import base64
+import json
+import os
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import measure, print_rows, format_bytes
+from _lib.gemini_client import RequestBodyTemplate, _build_request_body
+from _lib.media import MediaAsset
+from _lib.prompt_builder import build_prompt
+from _lib.segments_data import get_all_segments
+
+
+def make_payload(total_mb):
+    """Return (reference_base64, brand_ci_base64) totalling ~total_mb of base64."""
+    total = int(total_mb * 1024 * 1024)
+    image_b64 = base64.b64encode(os.urandom(total * 3 // 4 * 3 // 4)).decode("ascii")
+    brand_b64 = base64.b64encode(os.urandom(total * 3 // 4 // 4)).decode("ascii")
+    return image_b64, brand_b64
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--mb", type=float, default=20.0)
+    args = parser.parse_args()
+
+    image_b64, brand_b64 = make_payload(args.mb)
+    segments = (get_all_segments() * args.segments)[: args.segments]
+    prompts = [
+        build_prompt(s, ["actor", "background", "text"], "1:1", has_brand_ci=True) for s in segments
+    ]
+    sent = []
+
+    def rebuild_per_segment():
+        for prompt in prompts:
+            body = _build_request_body(prompt, image_b64, "image/png", brand_b64)
+            body_bytes = json.dumps(body).encode("utf-8")
+            sent.append(len(body_bytes))
+
+    def template_once():
+        template = RequestBodyTemplate(
+            MediaAsset.from_base64("image/png", image_b64),
+            MediaAsset.from_base64("application/pdf", brand_b64),
+        )
+        for prompt in prompts:
+            chunks = template.render(prompt)
+            sent.append(sum(len(c) for c in chunks))
+
+    print(
+        f"{args.segments} segments, {format_bytes(len(image_b64) + len(brand_b64))} "
+        "of base64 assets per request"
+    )
+    rows = [
+        ("rebuild + json.dumps per segment", measure(rebuild_per_segment)),
+        ("RequestBodyTemplate (serialize once)", measure(template_once)),
+    ]
+    print_rows(rows)
+
+    before, after = rows[0][1], rows[1][1]
+    print(
+        f"CPU time reduced {before['cpu_seconds'] / max(after['cpu_seconds'], 1e-9):.1f}x, "
+        f"peak memory {format_bytes(before['peak_bytes'])} -> {format_bytes(after['peak_bytes'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
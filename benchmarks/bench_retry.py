@@ -0,0 +1,98 @@
+"""
+Benchmark: retries and hedged requests against the Gemini mock.
+
+Scenario 1 injects transient 503 / 429 (with Retry-After) responses and a
+fatal 422 and shows how many attempts each segment took. Scenario 2 gives
+a fraction of calls a long tail latency and compares end-to-end latency
+percentiles with and without hedging.
+
+    python benchmarks/bench_retry.py [--calls 60] [--tail-rate 0.1]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from mock_gemini import MockGeminiServer, PLACEHOLDER_PNG_BASE64
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--tail-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    mock = MockGeminiServer(latency=args.latency).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+    from _lib import gemini_client, rate_limiter
+    from _lib.gemini_client import GeminiClientError, generate_image
+    from _lib.retry import RetryPolicy
+
+    # Measure retries and hedging only, without client-side throttling
+    rate_limiter._default_limiter = rate_limiter.AdaptiveRateLimiter(rate=0, initial_concurrency=64)
+
+    def call():
+        return generate_image("benchmark prompt", PLACEHOLDER_PNG_BASE64, "image/png", timeout=30)
+
+    print("Scenario 1: injected failures")
+    gemini_client.GENERATE_RETRY_POLICY = RetryPolicy(base_delay=0.05, max_delay=0.5)
+    for label, status, count, retry_after in (
+        ("503 x2", 503, 2, None),
+        ("429 x1, Retry-After: 1", 429, 1, 1),
+        ("422 safety block", 422, 1, None),
+    ):
+        mock.state.reset()
+        mock.state.fail_next(status, count, retry_after)
+        start = time.perf_counter()
+        try:
+            attempts = call()["attempts"]
+            outcome = "success"
+        except GeminiClientError as e:
+            attempts = e.attempts
+            outcome = f"error {e.status_code}"
+        timings = ", ".join(f"{a['seconds'] * 1000:.0f}ms" for a in attempts)
+        print(
+            f"  {label:<24} {outcome:<10} {len(attempts)} attempt(s) [{timings}] "
+            f"total {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    print(f"\nScenario 2: {args.tail_rate:.0%} of calls take {args.tail_latency}s "
+          f"(normal {args.latency}s), {args.calls} sequential calls")
+    mock.state.tail_latency = args.tail_latency
+    mock.state.tail_rate = args.tail_rate
+    print(f"  {'mode':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'upstream calls':>15}")
+    for label, hedge in (("no hedging", 0), ("hedge p90", 0.9)):
+        policy = RetryPolicy(hedge_percentile=hedge, hedge_min_samples=10, hedge_min_delay=0.0)
+        gemini_client.GENERATE_RETRY_POLICY = policy
+        # Warm the latency window so the hedge threshold is known
+        for _ in range(10):
+            policy.latencies.record(args.latency)
+        mock.state.reset()
+        samples = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        print(
+            f"  {label:<12} " + " ".join(
+                f"{percentile(samples, p) * 1000:>6.0f}ms" for p in (0.5, 0.95, 0.99, 1.0)
+            ) + f" {mock.counters['generate_calls']:>15}"
+        )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
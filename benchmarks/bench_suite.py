@@ -0,0 +1,355 @@
+"""
+Offline microbenchmark suite for the Python hot paths.
+
+Needs no network and no API key. Every case reports best wall / CPU time
+and peak traced memory (see _harness.measure):
+
+  - prompt: build_prompt for every segment x edit-area combination x aspect
+    ratio, with and without brand CI
+  - request_body: _build_request_body + json.dumps, and RequestBodyTemplate,
+    at 1 / 5 / 20 MB of base64 assets
+  - parse_response: json.loads + _parse_response on large synthetic
+    generateContent responses (one and four image candidates), and the
+    same responses fed in 64 KB chunks to GeminiResponseParser
+  - read_body: _read_body + _validate_request for JSON and multipart bodies
+    at 1 / 5 / 20 MB
+  - send_json: cors.send_json for /api/generate-shaped responses carrying
+    1 / 4 / 8 inline images
+
+Results are printed as a table and written as JSON (--output) so runs can be
+compared across commits; --compare exits non-zero when a case got slower or
+used more memory than the baseline by more than --threshold:
+
+    python benchmarks/bench_suite.py --output baseline.json
+    python benchmarks/bench_suite.py --compare baseline.json [--threshold 1.25]
+"""
+
+import argparse
+import base64
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import measure, print_rows, format_bytes
+
+os.environ.setdefault("HISTORY_ENABLED", "0")
+
+from _lib import cors  # noqa: E402
+from _lib.gemini_client import RequestBodyTemplate, _build_request_body, _parse_response  # noqa: E402
+from _lib.gemini_response import GeminiResponseParser  # noqa: E402
+from _lib.http_pool import STREAM_CHUNK_BYTES  # noqa: E402
+from _lib.media import MediaAsset  # noqa: E402
+from _lib.prompt_builder import ASPECT_RATIO_DIMENSIONS, build_prompt  # noqa: E402
+from _lib.segments_data import get_all_segments  # noqa: E402
+from generate import _read_body, _validate_request, MAX_IMAGE_SIZE_BYTES  # noqa: E402
+
+PAYLOAD_MB = (1, 5, 20)
+RESPONSE_IMAGES = (1, 4, 8)
+EDIT_AREAS = ("actor", "background", "text")
+# Brand CI digest of a typical size (see brand_ci.format_brand_ci_summary)
+BRAND_CI_SUMMARY = "\n".join(
+    [
+        "Colours: Egg Yellow #FFC20E, Charcoal #1A1A1A, Sky #0072CE",
+        "Typography: Helvetica Bold for headlines, Helvetica for body copy",
+        "Logo: keep clear space equal to the wordmark height; never stretch or recolour",
+    ]
+    + [f"Guideline {i}: keep photography warm and natural, avoid heavy filters." for i in range(20)]
+)
+# Changes smaller than this are noise whatever the ratio
+MIN_WALL_DELTA_SECONDS = 0.001
+MIN_PEAK_DELTA_BYTES = 64 * 1024
+
+
+class _FakeHandler:
+    """Just enough of BaseHTTPRequestHandler for _read_body and send_json."""
+
+    def __init__(self, body=b"", headers=None):
+        self.headers = headers or {}
+        self.rfile = io.BytesIO(body)
+        self.wfile = io.BytesIO()
+
+    def send_response(self, code, message=None):
+        self.wfile.write(f"HTTP/1.1 {code}\r\n".encode("latin-1"))
+
+    def send_header(self, key, value):
+        self.wfile.write(f"{key}: {value}\r\n".encode("latin-1"))
+
+    def end_headers(self):
+        self.wfile.write(b"\r\n")
+
+
+def _random_base64(size):
+    """Return a base64 string of about `size` characters."""
+    return base64.b64encode(random.randbytes(size * 3 // 4)).decode("ascii")
+
+
+def prompt_cases():
+    """build_prompt over every segment, edit-area subset, aspect ratio and brand CI option."""
+    segments = get_all_segments()
+    subsets = [
+        list(combo)
+        for n in range(len(EDIT_AREAS) + 1)
+        for combo in itertools.combinations(EDIT_AREAS, n)
+    ]
+    brand_options = [(False, None), (True, None), (True, BRAND_CI_SUMMARY)]
+    combos = list(itertools.product(segments, subsets, ASPECT_RATIO_DIMENSIONS, brand_options))
+
+    def run():
+        for segment, edit_areas, aspect_ratio, (has_brand_ci, summary) in combos:
+            build_prompt(segment, edit_areas, aspect_ratio, has_brand_ci, summary)
+
+    yield "prompt/build_prompt_all", run, {"calls": len(combos)}
+
+
+def request_body_cases():
+    """Request body serialization at several payload sizes."""
+    prompt = build_prompt(get_all_segments()[0], list(EDIT_AREAS), "1:1", has_brand_ci=True)
+    for mb in PAYLOAD_MB:
+        total = mb * 1024 * 1024
+        image_b64 = _random_base64(total * 3 // 4)
+        brand_b64 = _random_base64(total // 4)
+
+        def dumps(image_b64=image_b64, brand_b64=brand_b64):
+            body = _build_request_body(prompt, image_b64, "image/png", brand_b64)
+            json.dumps(body).encode("utf-8")
+
+        def template(image_b64=image_b64, brand_b64=brand_b64):
+            body = RequestBodyTemplate(
+                MediaAsset.from_base64("image/png", image_b64),
+                MediaAsset.from_base64("application/pdf", brand_b64),
+            )
+            b"".join(body.render(prompt))
+
+        extra = {"payload_bytes": len(image_b64) + len(brand_b64)}
+        yield f"request_body/json_dumps_{mb}mb", dumps, extra
+        yield f"request_body/template_{mb}mb", template, extra
+
+
+def parse_response_cases():
+    """json.loads or GeminiResponseParser + _parse_response on large generateContent responses."""
+    image_b64 = _random_base64(4 * 1024 * 1024)
+    for candidates in (1, 4):
+        response = json.dumps({
+            "candidates": [
+                {
+                    "index": index,
+                    "content": {
+                        "role": "model",
+                        "parts": [
+                            {"text": "Here is the adapted creative for the segment."},
+                            {"inlineData": {"mimeType": "image/png", "data": image_b64}},
+                        ],
+                    },
+                    "finishReason": "STOP",
+                }
+                for index in range(candidates)
+            ],
+            "usageMetadata": {"promptTokenCount": 1290, "candidatesTokenCount": 1290 * candidates},
+        }).encode("utf-8")
+
+        def run(response=response):
+            _parse_response(json.loads(response))
+
+        def stream(response=response):
+            parser = GeminiResponseParser()
+            with memoryview(response) as view:
+                for start in range(0, len(response), STREAM_CHUNK_BYTES):
+                    parser.feed(view[start:start + STREAM_CHUNK_BYTES])
+            _parse_response(parser.close())
+
+        extra = {"response_bytes": len(response)}
+        yield f"parse_response/{candidates}_candidates", run, extra
+        yield f"parse_response/stream_{candidates}_candidates", stream, extra
+
+
+def read_body_cases():
+    """_read_body + _validate_request for JSON and multipart uploads."""
+    segments = [segment["id"] for segment in get_all_segments()]
+    for mb in PAYLOAD_MB:
+        # Stay inside the validation limit so the full path is exercised
+        size = min(mb * 1024 * 1024, MAX_IMAGE_SIZE_BYTES - 1024)
+        json_body = json.dumps({
+            "reference_image_base64": _random_base64(size),
+            "reference_image_mime": "image/png",
+            "segments": segments,
+            "aspect_ratio": "1:1",
+            "edit_areas": list(EDIT_AREAS),
+        }).encode("utf-8")
+
+        def run_json(json_body=json_body):
+            handler = _FakeHandler(json_body, {"Content-Length": str(len(json_body))})
+            body = _read_body(handler)
+            assert _validate_request(body)[0]
+
+        yield f"read_body/json_{mb}mb", run_json, {"body_bytes": len(json_body)}
+
+        boundary = "benchsuiteboundary"
+        manifest = json.dumps({"segments": segments, "aspect_ratio": "1:1"}).encode("utf-8")
+        multipart_body = b"".join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"manifest\"\r\n"
+            "Content-Type: application/json\r\n\r\n".encode("ascii"),
+            manifest,
+            f"\r\n--{boundary}\r\nContent-Disposition: form-data; name=\"reference_image\"; "
+            "filename=\"ref.png\"\r\nContent-Type: image/png\r\n\r\n".encode("ascii"),
+            random.randbytes(size * 3 // 4),
+            f"\r\n--{boundary}--\r\n".encode("ascii"),
+        ])
+        headers = {
+            "Content-Length": str(len(multipart_body)),
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+        }
+
+        def run_multipart(multipart_body=multipart_body, headers=headers):
+            body = _read_body(_FakeHandler(multipart_body, headers))
+            assert _validate_request(body)[0]
+
+        yield f"read_body/multipart_{mb}mb", run_multipart, {"body_bytes": len(multipart_body)}
+
+
+def send_json_cases():
+    """cors.send_json for multi-image /api/generate responses."""
+    image_b64 = _random_base64(1024 * 1024)
+    segments = get_all_segments()
+    for count in RESPONSE_IMAGES:
+        payload = {
+            "status": "success",
+            "results": [
+                {
+                    "segment_id": segments[i % len(segments)]["id"],
+                    "segment_name": segments[i % len(segments)]["name"],
+                    "image_base64": image_b64,
+                    "image_mime": "image/png",
+                    "description": "Adapted creative.",
+                    "prompt_used": build_prompt(segments[i % len(segments)], list(EDIT_AREAS)),
+                    "status": "success",
+                }
+                for i in range(count)
+            ],
+            "errors": [],
+            "metadata": {"total_segments": count, "successful": count, "failed": 0},
+        }
+
+        def run(payload=payload):
+            cors.send_json(_FakeHandler(), payload)
+
+        yield f"send_json/{count}_images", run, {"images": count}
+
+
+SUITES = (prompt_cases, request_body_cases, parse_response_cases, read_body_cases, send_json_cases)
+
+
+def _git_revision():
+    """Return the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(repeat, pattern=None):
+    """
+    Run every case (optionally only names containing pattern).
+
+    Returns:
+        The results document: run metadata plus a cases dict of
+        name -> measure() output and case-specific sizes.
+    """
+    random.seed(0)
+    cases = {}
+    for suite in SUITES:
+        for name, fn, extra in suite():
+            if pattern and pattern not in name:
+                continue
+            cases[name] = dict(measure(fn, repeat=repeat), repeat=repeat, **extra)
+    return {
+        "suite": "hot-paths",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline document.
+
+    Returns:
+        List of (case, metric, baseline value, current value, ratio) for
+        cases that regressed by more than threshold.
+    """
+    regressions = []
+    print(f"\n{'case':<40} {'wall':>8} {'peak mem':>9}   (current / baseline)")
+    for name, current in results["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if before is None:
+            print(f"{name:<40} {'new':>8}")
+            continue
+        ratios = {}
+        for metric, min_delta in (
+            ("wall_seconds", MIN_WALL_DELTA_SECONDS),
+            ("peak_bytes", MIN_PEAK_DELTA_BYTES),
+        ):
+            ratio = current[metric] / max(before[metric], 1e-12)
+            ratios[metric] = ratio
+            if ratio > threshold and current[metric] - before[metric] > min_delta:
+                regressions.append((name, metric, before[metric], current[metric], ratio))
+        print(f"{name:<40} {ratios['wall_seconds']:>7.2f}x {ratios['peak_bytes']:>8.2f}x")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="Print the JSON results to stdout")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25,
+        help="Fail when wall time or peak memory grows by more than this factor",
+    )
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_suite(args.repeat, args.filter)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_rows(sorted(results["cases"].items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, before, after, ratio in regressions:
+            if metric == "peak_bytes":
+                before, after = format_bytes(before), format_bytes(after)
+            else:
+                before, after = f"{before * 1000:.1f}ms", f"{after * 1000:.1f}ms"
+            print(f"REGRESSION {name} {metric}: {before} -> {after} ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
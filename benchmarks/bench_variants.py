@@ -0,0 +1,95 @@
+"""
+Benchmark: several image variants per segment via candidateCount vs
+parallel single-candidate calls.
+
+Runs the generation pipeline against the in-process Gemini mock with
+variants > 1 in each mode and reports the latency and request bytes Gemini
+received per variant. In "candidates" mode the reference image is sent once
+per segment; in "parallel" mode it is sent once per variant. The
+"fallback" row runs candidates mode against a mock that rejects
+candidateCount, which costs one rejected call before switching to
+parallel calls.
+
+    python benchmarks/bench_variants.py [--variants 4] [--segments 4] [--reference-kb 1024]
+"""
+
+import argparse
+import os
+import time
+
+import _harness  # noqa: F401  (sets up sys.path)
+from _harness import format_bytes
+from mock_gemini import MockGeminiServer
+
+
+def run_mode(mock, params, segments, pipeline):
+    """Run all segments once; return (seconds, bytes received, calls, images, errors)."""
+    mock.state.reset()
+    start = time.perf_counter()
+    results, errors = pipeline.run_segments(segments, params, max_concurrency=4, deadline_seconds=120)
+    elapsed = time.perf_counter() - start
+    counters = dict(mock.counters)
+    images = sum(result.get("variant_count", 1) for result in results)
+    return elapsed, counters["bytes_received"], counters["generate_calls"], images, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--reference-kb", type=int, default=1024, help="Reference image size")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock Gemini latency (s)")
+    parser.add_argument(
+        "--candidate-latency", type=float, default=0.05,
+        help="Mock latency per extra candidate (s)",
+    )
+    args = parser.parse_args()
+
+    mock = MockGeminiServer(latency=args.latency, candidate_latency=args.candidate_latency).start()
+    os.environ["GEMINI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+    os.environ["GENERATION_CACHE_BACKENDS"] = "none"
+
+    from _lib import gemini_client, pipeline, rate_limiter
+    from _lib.media import MediaAsset
+    from _lib.segments_data import get_all_segments
+
+    segments = (get_all_segments() * args.segments)[: args.segments]
+    reference = MediaAsset("image/png", data=os.urandom(args.reference_kb * 1024))
+
+    print(f"Reference image: {format_bytes(args.reference_kb * 1024)}, {args.segments} segments "
+          f"x {args.variants} variants, mock latency {args.latency * 1000:.0f}ms "
+          f"+ {args.candidate_latency * 1000:.0f}ms per extra candidate")
+    print(f"{'mode':<11} {'calls':>6} {'images':>7} {'bytes/variant':>14} {'total bytes':>12} "
+          f"{'latency':>10} {'ms/variant':>11} {'errors':>7}")
+    for label, mode, max_candidates in (
+        ("candidates", "candidates", 8),
+        ("parallel", "parallel", 8),
+        ("fallback", "candidates", 0),
+    ):
+        mock.state.max_candidates = max_candidates
+        gemini_client.VARIANTS_MODE = mode
+        gemini_client._candidate_count_rejected_at = None
+        # Fresh, unthrottled limiter so modes do not inherit each other's limit
+        rate_limiter._default_limiter = rate_limiter.AdaptiveRateLimiter(rate=0, initial_concurrency=64)
+        params = {
+            "reference_image": reference,
+            "brand_ci": None,
+            "aspect_ratio": "1:1",
+            "edit_areas": ["actor", "background", "text"],
+            "upload_mode": "inline",
+            "preflight_enabled": False,
+            "variants": args.variants,
+        }
+        elapsed, received, calls, images, errors = run_mode(mock, params, segments, pipeline)
+        print(
+            f"{label:<11} {calls:>6} {images:>7} {format_bytes(received / max(images, 1)):>14} "
+            f"{format_bytes(received):>12} {elapsed * 1000:>8.0f}ms "
+            f"{elapsed * 1000 / max(images, 1):>9.1f}ms {len(errors):>7}"
+        )
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+Local stand-in for the Gemini REST endpoints used by api/_lib/gemini_client.py.
+
+Implements generateContent, the resumable Files API upload and
+cachedContents creation so the client can be exercised without network
+access or an API key:
+
+    python benchmarks/mock_gemini.py --port 8765 --latency 0.5
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_AI_STUDIO_API_KEY=test \
+        python local_server.py
+
+It can also be started in-process with MockGeminiServer, which records the
+bytes and parts it received so benchmarks can compare request modes.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# 1x1 transparent PNG returned as the "generated" image
+PLACEHOLDER_PNG_BASE64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+# Tokens counted per image or document part (Gemini bills a small image at 258)
+MEDIA_PART_TOKENS = 258
+
+
+class _MockState:
+    """Counters and uploaded-file registry shared by request handlers."""
+
+    def __init__(self, latency=0.0, image_base64=PLACEHOLDER_PNG_BASE64):
+        self.latency = latency
+        self.image_base64 = image_base64
+        # A tail_rate fraction of generate calls take tail_latency instead
+        self.tail_latency = 0.0
+        self.tail_rate = 0.0
+        # Queued (status, retry_after) responses returned before succeeding
+        self.failures = []
+        # Generate calls beyond this many in flight get a 429 (0 = no quota)
+        self.concurrency_quota = 0
+        # Most candidates one call may return (0 = candidateCount > 1 is
+        # rejected with a 400, like models without multi-candidate support)
+        self.max_candidates = 8
+        # Extra seconds per candidate beyond the first
+        self.candidate_latency = 0.0
+        # Close keep-alive connections idle this many seconds (None = never)
+        self.keepalive_timeout = None
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.files = {}  # uri -> file dict
+        self.cached_contents = {}  # name -> prompt token count
+        # Reject cachedContents creation like models without caching support
+        self.context_cache_supported = True
+        self.pending_uploads = {}  # upload id -> {"display_name", "mime_type"}
+        self.next_id = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {
+                "generate_calls": 0,
+                "upload_calls": 0,
+                "bytes_received": 0,
+                "inline_parts": 0,
+                "file_parts": 0,
+                "unknown_file_parts": 0,
+                "injected_failures": 0,
+                "quota_429s": 0,
+                "max_in_flight": 0,
+                "cache_creates": 0,
+                "cached_content_calls": 0,
+            }
+            self.failures = []
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """Answer the next `count` generate calls with an error status."""
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def next_failure(self):
+        with self.lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def enter(self):
+        """Track a generate call; return False if it exceeds the quota."""
+        with self.lock:
+            if self.concurrency_quota and self.in_flight >= self.concurrency_quota:
+                self.counters["quota_429s"] += 1
+                return False
+            self.in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.in_flight)
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs
+    # add ~40ms to every keep-alive response and skew latency measurements
+    disable_nagle_algorithm = True
+
+    @property
+    def state(self):
+        return self.server.mock_state
+
+    def setup(self):
+        # StreamRequestHandler applies this as the socket timeout; an idle
+        # keep-alive connection that times out is closed by the server
+        self.timeout = self.state.keepalive_timeout
+        super().setup()
+
+    def _read(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length) if length else b""
+        self.state.count("bytes_received", len(data))
+        return data
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        try:
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. timed out) before the response
+            self.close_connection = True
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        data = self._read()
+        if parts.path.startswith("/upload/v1beta/files"):
+            self._handle_upload(parts, data)
+        elif parts.path.endswith(":generateContent"):
+            self._handle_generate(data)
+        elif parts.path == "/v1beta/cachedContents":
+            self._handle_cache_create(data)
+        else:
+            self._send(404, {"error": {"code": 404, "message": f"Unknown path {parts.path}"}})
+
+    def _handle_upload(self, parts, data):
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        if command == "start":
+            metadata = json.loads(data or b"{}").get("file", {})
+            upload_id = self.state.new_id()
+            self.state.pending_uploads[upload_id] = {
+                "display_name": metadata.get("display_name"),
+                "mime_type": self.headers.get("X-Goog-Upload-Header-Content-Type"),
+            }
+            host, port = self.server.server_address[:2]
+            upload_url = f"http://{host}:{port}/upload/v1beta/files?upload_id={upload_id}"
+            self._send(200, {}, {"X-Goog-Upload-URL": upload_url})
+            return
+
+        upload_id = int(parse_qs(parts.query).get("upload_id", ["0"])[0])
+        pending = self.state.pending_uploads.pop(upload_id, None)
+        if pending is None or "finalize" not in command:
+            self._send(400, {"error": {"code": 400, "message": "Unknown upload session"}})
+            return
+
+        self.state.count("upload_calls")
+        host, port = self.server.server_address[:2]
+        name = f"files/mock-{upload_id}"
+        expires = datetime.now(timezone.utc) + timedelta(hours=48)
+        file_info = {
+            "name": name,
+            "displayName": pending["display_name"],
+            "mimeType": pending["mime_type"],
+            "sizeBytes": str(len(data)),
+            "uri": f"http://{host}:{port}/v1beta/{name}",
+            "state": "ACTIVE",
+            "expirationTime": expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        }
+        self.state.files[file_info["uri"]] = file_info
+        self._send(200, {"file": file_info})
+
+    def _count_prompt_tokens(self, contents):
+        """
+        Estimate prompt tokens the way Gemini roughly bills them: ~4 chars
+        per text token and a flat MEDIA_PART_TOKENS per image or document.
+
+        Returns:
+            The token count, or None after answering 400 for an unknown file.
+        """
+        tokens = 0
+        for content in contents:
+            for part in content.get("parts", []):
+                if "text" in part:
+                    tokens += max(1, len(part["text"]) // 4)
+                elif "inline_data" in part or "inlineData" in part:
+                    self.state.count("inline_parts")
+                    tokens += MEDIA_PART_TOKENS
+                elif "file_data" in part or "fileData" in part:
+                    self.state.count("file_parts")
+                    file_data = part.get("file_data") or part.get("fileData")
+                    uri = file_data.get("file_uri") or file_data.get("fileUri")
+                    if uri not in self.state.files:
+                        self.state.count("unknown_file_parts")
+                        self._send(400, {"error": {"code": 400, "message": f"Unknown file {uri}"}})
+                        return None
+                    tokens += MEDIA_PART_TOKENS
+        return tokens
+
+    def _handle_cache_create(self, data):
+        if not self.state.context_cache_supported:
+            self._send(400, {"error": {
+                "code": 400,
+                "message": "Model does not support explicit context caching",
+            }})
+            return
+        body = json.loads(data or b"{}")
+        tokens = self._count_prompt_tokens(body.get("contents", []))
+        if tokens is None:
+            return
+        self.state.count("cache_creates")
+        name = f"cachedContents/mock-{self.state.new_id()}"
+        with self.state.lock:
+            self.state.cached_contents[name] = tokens
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        expires = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self._send(200, {
+            "name": name,
+            "model": body.get("model"),
+            "expireTime": expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "usageMetadata": {"totalTokenCount": tokens},
+        })
+
+    def _handle_generate(self, data):
+        self.state.count("generate_calls")
+        try:
+            body = json.loads(data)
+        except ValueError:
+            self._send(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+            return
+
+        prompt_tokens = self._count_prompt_tokens(body.get("contents", []))
+        if prompt_tokens is None:
+            return
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            with self.state.lock:
+                cached_tokens = self.state.cached_contents.get(body["cachedContent"])
+            if cached_tokens is None:
+                self._send(404, {"error": {"code": 404, "message": "CachedContent not found"}})
+                return
+            self.state.count("cached_content_calls")
+            prompt_tokens += cached_tokens
+
+        requested = int(body.get("generationConfig", {}).get("candidateCount", 1))
+        if requested > 1 and not self.state.max_candidates:
+            self._send(400, {"error": {
+                "code": 400,
+                "message": "Multiple candidates is not enabled for this model",
+                "status": "INVALID_ARGUMENT",
+            }})
+            return
+        candidates = max(1, min(requested, self.state.max_candidates))
+
+        failure = self.state.next_failure()
+        if failure is not None:
+            status, retry_after = failure
+            self.state.count("injected_failures")
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            self._send(status, {"error": {"code": status, "message": f"Injected {status}"}}, headers)
+            return
+
+        if not self.state.enter():
+            self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted"}})
+            return
+        try:
+            latency = self.state.latency
+            if self.state.tail_rate and random.random() < self.state.tail_rate:
+                latency = self.state.tail_latency
+            latency += self.state.candidate_latency * (candidates - 1)
+            if latency:
+                time.sleep(latency)
+        finally:
+            self.state.leave()
+
+        self._send(200, {
+            "candidates": [
+                {
+                    "index": index,
+                    "content": {
+                        "parts": [
+                            {"inlineData": {"mimeType": "image/png", "data": self.state.image_base64}},
+                            {"text": "Mock generated image."},
+                        ],
+                    },
+                    "finishReason": "STOP",
+                }
+                for index in range(candidates)
+            ],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "cachedContentTokenCount": cached_tokens,
+                "candidatesTokenCount": MEDIA_PART_TOKENS * candidates,
+                "totalTokenCount": prompt_tokens + MEDIA_PART_TOKENS * candidates,
+            },
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open hundreds of connections at once
+    request_queue_size = 1024
+
+
+class MockGeminiServer:
+    """
+    Run the mock Gemini API on a background thread.
+
+    Usage:
+        with MockGeminiServer(latency=0.2) as mock:
+            os.environ["GEMINI_BASE_URL"] = mock.base_url
+            ...
+            print(mock.counters)
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        image_base64=PLACEHOLDER_PNG_BASE64,
+        tail_latency=0.0,
+        tail_rate=0.0,
+        max_candidates=8,
+        candidate_latency=0.0,
+        keepalive_timeout=None,
+    ):
+        self._server = _MockHTTPServer((host, port), _MockHandler)
+        self._server.mock_state = _MockState(latency=latency, image_base64=image_base64)
+        self._server.mock_state.tail_latency = tail_latency
+        self._server.mock_state.tail_rate = tail_rate
+        self._server.mock_state.max_candidates = max_candidates
+        self._server.mock_state.candidate_latency = candidate_latency
+        self._server.mock_state.keepalive_timeout = keepalive_timeout
+        self._thread = None
+
+    @property
+    def state(self):
+        return self._server.mock_state
+
+    @property
+    def counters(self):
+        with self.state.lock:
+            return dict(self.state.counters)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Gemini API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per generateContent call")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="Seconds for slow calls")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fraction of slow calls")
+    parser.add_argument(
+        "--max-candidates", type=int, default=8,
+        help="Most candidates per call (0 = reject candidateCount > 1)",
+    )
+    parser.add_argument(
+        "--candidate-latency", type=float, default=0.0,
+        help="Extra seconds per candidate beyond the first",
+    )
+    parser.add_argument(
+        "--keepalive-timeout", type=float, default=None,
+        help="Close keep-alive connections idle this many seconds",
+    )
+    args = parser.parse_args()
+
+    server = MockGeminiServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        tail_latency=args.tail_latency,
+        tail_rate=args.tail_rate,
+        max_candidates=args.max_candidates,
+        candidate_latency=args.candidate_latency,
+        keepalive_timeout=args.keepalive_timeout,
+    )
+    print(f"Mock Gemini API running at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+
+
+if __name__ == "__main__":
+    main()
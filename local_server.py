@@ -1,12 +1,26 @@
 """
 Local development server that mimics Vercel's serverless function routing.
 Routes /api/* requests to the appropriate Python handler modules.
+
+Requests are handled on a thread per connection, capped at --workers
+(LOCAL_SERVER_WORKERS env, default 32) so a slow /api/generate call does
+not block other endpoints; further connections wait in the listen backlog.
+Connections are kept alive (HTTP/1.1) between requests. Handler modules
+are imported once and reloaded only when their source file changes;
+--no-reload turns that check off for production-like load testing:
+
+    python local_server.py [--port 3000] [--workers 32] [--no-reload]
+
+Background job workers (/api/jobs, /api/campaigns) start with the server,
+so jobs left queued or running by the previous run resume right away.
 """
 
+import argparse
 import json
 import sys
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from io import BytesIO
 from urllib.parse import urlparse, parse_qs
 import importlib
@@ -16,6 +30,13 @@ API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api")
 sys.path.insert(0, API_DIR)
 
 PORT = 3000
+MAX_WORKERS = int(os.environ.get('LOCAL_SERVER_WORKERS', '32'))
+# Idle keep-alive connections are closed after this many seconds so they
+# do not hold a worker slot
+KEEPALIVE_TIMEOUT = 5
+# Socket timeout for each read and write once a request has started
+# arriving, so a slow upload or download is not cut off mid-body
+REQUEST_IO_TIMEOUT = 60
 
 
 class FakeHandler:
@@ -45,76 +66,171 @@ class FakeHandler:
         return self._response_code, self._response_headers, self.wfile.getvalue()
 
 
+class ResponseWriter:
+    """
+    wfile for a delegated handler that makes its response keep-alive safe.
+
+    Some Vercel handlers do not send Content-Length, so the body is buffered
+    and the header is added before anything reaches the socket. Responses
+    that already carry Content-Length or use chunked encoding (large JSON
+    responses, see cors.send_json) and streamed responses (the handler
+    calls flush) are written straight through instead; a streamed response
+    has no length, so its connection is closed after it.
+    """
+
+    # Statuses that never have a body (and must not get a Content-Length)
+    NO_BODY_STATUSES = (b' 204 ', b' 304 ')
+
+    def __init__(self, wfile, method):
+        self._wfile = wfile
+        self._method = method
+        self._head = None
+        self._body = []
+        self.passthrough = False
+        self.unsized = False
+
+    @property
+    def started(self):
+        """Whether the handler has sent its response headers."""
+        return self._head is not None
+
+    def write(self, data):
+        if self.passthrough:
+            return self._wfile.write(data)
+        if self._head is None:
+            # BaseHTTPRequestHandler.end_headers writes the whole header block at once
+            self._head = bytes(data)
+            head = self._head.lower()
+            if b'\r\ncontent-length:' in head or b'\r\ntransfer-encoding:' in head:
+                self._start_passthrough()
+            return len(data)
+        self._body.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        if not self.passthrough and self._head is not None:
+            self.unsized = True
+            self._start_passthrough()
+        self._wfile.flush()
+
+    def _start_passthrough(self):
+        self.passthrough = True
+        self._wfile.write(self._head + b''.join(self._body))
+        self._body = []
+
+    def finish(self):
+        """Write a buffered response with its Content-Length."""
+        if self.passthrough or self._head is None:
+            return
+        body = b''.join(self._body)
+        status_line = self._head.split(b'\r\n', 1)[0] + b' '
+        if self._method != 'HEAD' and not any(s in status_line for s in self.NO_BODY_STATUSES):
+            # Insert before the blank line that ends the header block
+            self._head = (
+                self._head[:-2] + f'Content-Length: {len(body)}\r\n'.encode('latin-1') + b'\r\n'
+            )
+        self._wfile.write(self._head + body)
+
+
+class HandlerModules:
+    """Imported handler modules, reloaded only when their source changes."""
+
+    def __init__(self, reload_enabled=True):
+        self.reload_enabled = reload_enabled
+        self._modules = {}  # module name -> (module, source mtime)
+        self._lock = threading.Lock()
+
+    def get(self, module_name):
+        path = os.path.join(API_DIR, f'{module_name}.py')
+        mtime = os.path.getmtime(path) if self.reload_enabled else None
+        with self._lock:
+            cached = self._modules.get(module_name)
+            if cached is not None and (not self.reload_enabled or cached[1] == mtime):
+                return cached[0]
+            if cached is None:
+                mod = importlib.import_module(module_name)
+            else:
+                mod = importlib.reload(cached[0])  # Hot reload for dev
+                print(f'Reloaded {module_name}')
+            self._modules[module_name] = (mod, mtime)
+            return mod
+
+
 class LocalDevHandler(BaseHTTPRequestHandler):
     """Routes requests to the appropriate Vercel serverless handler."""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_IO_TIMEOUT
+    modules = HandlerModules()
     
     ROUTE_MAP = {
         '/api/health': 'health',
         '/api/segments': 'segments',
         '/api/generate': 'generate',
         '/api/history': 'history',
+        '/api/assets': 'assets',
+        '/api/jobs': 'jobs',
+        '/api/campaigns': 'campaigns',
+        '/api/metrics': 'metrics',
     }
     
+    def _resolve_route(self, path):
+        """Match the longest ROUTE_MAP prefix, so /api/assets/<hash> -> assets."""
+        route = urlparse(path).path.rstrip('/')
+        while route:
+            if route in self.ROUTE_MAP:
+                return self.ROUTE_MAP[route]
+            route = route.rsplit('/', 1)[0]
+        return None
+    
     def _get_handler_module(self, path):
-        parsed = urlparse(path)
-        route = parsed.path.rstrip('/')
-        module_name = self.ROUTE_MAP.get(route)
+        module_name = self._resolve_route(path)
         if module_name:
             try:
-                mod = importlib.import_module(module_name)
-                importlib.reload(mod)  # Hot reload for dev
-                return mod
+                return self.modules.get(module_name)
             except Exception as e:
                 print(f"Error importing module {module_name}: {e}")
                 return None
         return None
     
+    def _send_json_error(self, status, message):
+        body = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
     def _proxy_to_handler(self, method):
-        mod = self._get_handler_module(self.path)
-        if not mod:
-            self.send_response(404)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
-            return
-        
-        # Read body for POST/PUT
+        # Read body for POST/PUT (always, so a kept-alive connection stays in sync)
         body = None
         content_length = int(self.headers.get('Content-Length', 0))
         if content_length > 0:
             body = self.rfile.read(content_length)
         
-        # Create a fake handler that mimics BaseHTTPRequestHandler
-        fake = FakeHandler(method, self.path, self.headers, body)
+        mod = self._get_handler_module(self.path)
+        if not mod:
+            self._send_json_error(404, "Not found")
+            return
         
-        # Get the handler class and invoke
         handler_class = mod.handler
-        
-        # We need to actually create the proper handler - the Vercel handlers
-        # use BaseHTTPRequestHandler methods directly, so let's just forward
-        # the request using the real handler
-        
-        # Instead, let's use a simpler approach - directly call the handler methods
-        # We'll monkey-patch our actual handler to act as the Vercel handler
-        original_wfile = self.wfile
-        original_rfile = self.rfile
-        
-        if body:
-            self.rfile = BytesIO(body)
+        writer = ResponseWriter(self.wfile, method)
         
         try:
-            # Create an instance that shares our socket
+            # Create an instance that shares our socket (through the writer)
             h = handler_class.__new__(handler_class)
             h.rfile = BytesIO(body) if body else BytesIO()
-            h.wfile = self.wfile
+            h.wfile = writer
             h.headers = self.headers
             h.path = self.path
             h.command = method
             h.request_version = self.request_version
+            h.protocol_version = self.protocol_version
             h.client_address = self.client_address
             h.server = self.server
-            h.close_connection = True
+            h.close_connection = False
             h.requestline = f"{method} {self.path} {self.request_version}"
             h.responses = self.responses
             
@@ -122,39 +238,110 @@ class LocalDevHandler(BaseHTTPRequestHandler):
             if method_fn:
                 method_fn()
             else:
-                self.send_response(405)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Method not allowed"}).encode())
+                self._send_json_error(405, "Method not allowed")
+                return
+            writer.finish()
+            if h.close_connection or writer.unsized:
+                self.close_connection = True
         except Exception as e:
             print(f"Handler error: {e}")
             import traceback
             traceback.print_exc()
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
-        finally:
-            self.rfile = original_rfile
+            if writer.started:
+                # Part of a response may be out already; drop the connection
+                writer.finish()
+                self.close_connection = True
+            else:
+                self._send_json_error(500, str(e))
     
     def do_GET(self):
         self._proxy_to_handler('GET')
     
+    def do_HEAD(self):
+        self._proxy_to_handler('HEAD')
+    
     def do_POST(self):
         self._proxy_to_handler('POST')
     
     def do_OPTIONS(self):
         self._proxy_to_handler('OPTIONS')
     
+    def handle_one_request(self):
+        # Only the wait for the next request line gets the short keep-alive
+        # timeout; the request itself is read and answered under self.timeout
+        self.connection.settimeout(KEEPALIVE_TIMEOUT)
+        try:
+            self.rfile.peek(1)
+        except OSError:
+            # Idle too long (routine), or the client went away
+            self.close_connection = True
+            return
+        self.connection.settimeout(self.timeout)
+        super().handle_one_request()
+
     def log_message(self, format, *args):
         print(f"[API] {args[0]}" if args else "")
 
 
+class LocalDevServer(ThreadingHTTPServer):
+    """Thread-per-connection server with at most max_workers connections in service."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler_class, max_workers=MAX_WORKERS):
+        super().__init__(address, handler_class)
+        self.max_workers = max(1, max_workers)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while every worker is busy
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def resume_jobs():
+    """Start the job workers, re-queueing jobs the previous run left unfinished."""
+    try:
+        from _lib.job_queue import get_default_runner
+        runner = get_default_runner()
+    except Exception as e:
+        print(f"Job workers not started: {e}")
+        return
+    stats = runner.stats()
+    print(f"Job workers: {stats['workers']}, resumed jobs: {stats['queued'] + stats['active']}")
+
+
 def main():
-    server = HTTPServer(('0.0.0.0', PORT), LocalDevHandler)
-    print(f"Local API server running at http://localhost:{PORT}")
+    parser = argparse.ArgumentParser(description='Run the API locally with Vercel-style routing.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument(
+        '--workers', type=int, default=MAX_WORKERS,
+        help='Most connections served at once (LOCAL_SERVER_WORKERS env)',
+    )
+    parser.add_argument(
+        '--no-reload', action='store_true',
+        help='Never reload handler modules (production-like benchmarking)',
+    )
+    args = parser.parse_args()
+
+    LocalDevHandler.modules = HandlerModules(reload_enabled=not args.no_reload)
+    server = LocalDevServer((args.host, args.port), LocalDevHandler, max_workers=args.workers)
+    print(f"Local API server running at http://localhost:{args.port}")
     print(f"Routes: {list(LocalDevHandler.ROUTE_MAP.keys())}")
+    print(f"Workers: {server.max_workers}, reload: {'off' if args.no_reload else 'on change'}")
+    resume_jobs()
     try:
         server.serve_forever()
     except KeyboardInterrupt:
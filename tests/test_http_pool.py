@@ -0,0 +1,271 @@
+"""
+Tests for api/_lib/http_pool.py against the in-process Gemini mock.
+
+Covers reconnecting after the server closes an idle keep-alive connection
+(caught by the health check, or by the one stale retry when the close
+races the check), idle eviction, and the framings the asyncio HTTP/1.1
+reader handles: Content-Length, chunked and connection close.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "api"), os.path.join(ROOT, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from _lib import http_pool  # noqa: E402
+from _lib.http_pool import AsyncConnectionPool, ConnectionPool  # noqa: E402
+from mock_gemini import MockGeminiServer  # noqa: E402
+
+GENERATE_PATH = "/v1beta/models/mock:generateContent"
+GENERATE_BODY = json.dumps({"contents": [{"parts": [{"text": "hi"}]}]}).encode("utf-8")
+HEADERS = {"Content-Type": "application/json"}
+
+# Server-side keep-alive timeout, and a wait comfortably past it
+KEEPALIVE_TIMEOUT = 0.2
+PAST_KEEPALIVE = 0.5
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockGeminiServer(keepalive_timeout=KEEPALIVE_TIMEOUT).start()
+        self.pool = ConnectionPool(self.mock.base_url, max_size=2, idle_timeout=60)
+
+    def tearDown(self):
+        self.pool.close()
+        self.mock.stop()
+
+    def generate(self):
+        status, _, body = self.pool.request(
+            "POST", GENERATE_PATH, body=GENERATE_BODY, headers=HEADERS, timeout=5
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("candidates", json.loads(body))
+
+    def test_reuses_keepalive_connection(self):
+        self.generate()
+        self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["connections_reused"], 1)
+        self.assertEqual(stats["idle"], 1)
+
+    def test_server_closed_connection_fails_health_check(self):
+        self.generate()
+        time.sleep(PAST_KEEPALIVE)  # the server closes the idle connection
+        self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["evicted_unhealthy"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+        self.assertEqual(stats["stale_retries"], 0)
+
+    def test_stale_connection_is_retried_once(self):
+        self.generate()
+        time.sleep(PAST_KEEPALIVE)
+        # The server closing just after the health check ran
+        with mock.patch.object(http_pool, "_is_healthy", return_value=True):
+            self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["stale_retries"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+        self.assertEqual(self.mock.counters["generate_calls"], 2)
+
+    def test_fresh_connection_failure_is_not_retried(self):
+        self.mock.stop()
+        with self.assertRaises(OSError):
+            self.pool.request("POST", GENERATE_PATH, body=GENERATE_BODY, timeout=1)
+        self.assertEqual(self.pool.stats()["stale_retries"], 0)
+        self.mock = MockGeminiServer().start()  # for tearDown
+
+    def test_idle_connections_are_evicted(self):
+        self.pool.idle_timeout = 0.05
+        self.generate()
+        time.sleep(0.1)
+        self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["evicted_idle"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+        self.assertEqual(stats["connections_reused"], 0)
+
+    def test_overflow_connections_are_closed(self):
+        conns = [self.pool._checkout(5)[0] for _ in range(3)]
+        for conn in conns:
+            self.pool._checkin(conn, reusable=True)
+        stats = self.pool.stats()
+        self.assertEqual(stats["idle"], 2)
+        self.assertEqual(stats["discarded_overflow"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+
+class AsyncConnectionPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mock = MockGeminiServer(keepalive_timeout=KEEPALIVE_TIMEOUT).start()
+        self.pool = AsyncConnectionPool(self.mock.base_url, max_size=2, idle_timeout=60)
+
+    async def asyncTearDown(self):
+        self.pool.close()
+        self.mock.stop()
+
+    async def generate(self):
+        status, _, body = await self.pool.request(
+            "POST", GENERATE_PATH, body=[GENERATE_BODY], headers=HEADERS, timeout=5
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("candidates", json.loads(body))
+
+    async def test_reuses_keepalive_connection(self):
+        await self.generate()
+        await self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["connections_reused"], 1)
+
+    async def test_server_closed_connection_fails_health_check(self):
+        await self.generate()
+        await asyncio.sleep(PAST_KEEPALIVE)
+        await self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["evicted_unhealthy"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+
+    async def test_stale_connection_is_retried_once(self):
+        await self.generate()
+        await asyncio.sleep(PAST_KEEPALIVE)
+        with mock.patch.object(http_pool._AsyncConnection, "is_healthy", return_value=True):
+            await self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["stale_retries"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+
+    async def test_idle_connections_are_evicted(self):
+        self.pool.idle_timeout = 0.05
+        await self.generate()
+        await asyncio.sleep(0.1)
+        await self.generate()
+        stats = self.pool.stats()
+        self.assertEqual(stats["evicted_idle"], 1)
+        self.assertEqual(stats["connections_created"], 2)
+
+
+def _chunked(body, size=7):
+    """Encode body with chunked transfer encoding, plus a trailer."""
+    out = b""
+    for start in range(0, len(body), size):
+        piece = body[start:start + size]
+        out += b"%x;ext=1\r\n%s\r\n" % (len(piece), piece)
+    return out + b"0\r\nX-Trailer: 1\r\n\r\n"
+
+
+class ReadResponseTest(unittest.IsolatedAsyncioTestCase):
+    """_read_response on canned bytes, and the pool against a raw server."""
+
+    BODY = b'{"candidates": []}' * 10
+
+    async def read(self, raw, method="POST", stream_to=None):
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await http_pool._read_response(reader, method, stream_to)
+
+    async def test_content_length(self):
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(self.BODY), self.BODY)
+        status, headers, body, will_close = await self.read(raw + b"HTTP/1.1 200 OK\r\n")
+        self.assertEqual((status, body, will_close), (200, self.BODY, False))
+
+    async def test_chunked(self):
+        raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + _chunked(self.BODY)
+        status, headers, body, will_close = await self.read(raw)
+        self.assertEqual((status, body, will_close), (200, self.BODY, False))
+        self.assertEqual(headers["Transfer-Encoding"], "chunked")
+
+    async def test_chunked_streamed(self):
+        received = []
+        raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + _chunked(self.BODY)
+        _, _, body, _ = await self.read(raw, stream_to=lambda status: received.append)
+        self.assertIsNone(body)
+        self.assertEqual(b"".join(received), self.BODY)
+
+    async def test_close_delimited(self):
+        raw = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + self.BODY
+        status, _, body, will_close = await self.read(raw)
+        self.assertEqual((status, body, will_close), (200, self.BODY, True))
+
+    async def test_close_delimited_streamed(self):
+        received = []
+        raw = b"HTTP/1.0 200 OK\r\n\r\n" + self.BODY
+        _, _, body, will_close = await self.read(raw, stream_to=lambda status: received.append)
+        self.assertIsNone(body)
+        self.assertTrue(will_close)
+        self.assertEqual(b"".join(received), self.BODY)
+
+    async def test_no_body_statuses(self):
+        raw = b"HTTP/1.1 204 No Content\r\n\r\n"
+        self.assertEqual((await self.read(raw))[2], b"")
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n"
+        self.assertEqual((await self.read(raw, method="HEAD"))[2], b"")
+
+    async def test_truncated_bodies(self):
+        truncated = (
+            b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nshort",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n10\r\nshort",
+        )
+        for raw in truncated:
+            with self.assertRaises(http.client.IncompleteRead):
+                await self.read(raw)
+
+    async def test_closed_or_garbled_status_line(self):
+        with self.assertRaises(http.client.RemoteDisconnected):
+            await self.read(b"")
+        with self.assertRaises(http.client.BadStatusLine):
+            await self.read(b"garbage\r\n\r\n")
+
+    async def test_pool_reuse_follows_framing(self):
+        responses = {
+            b"/chunked": b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + _chunked(self.BODY),
+            b"/close": b"HTTP/1.1 200 OK\r\n\r\n" + self.BODY,
+        }
+
+        async def serve(reader, writer):
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                path = request_line.split()[1]
+                writer.write(responses[path])
+                await writer.drain()
+                if path == b"/close":
+                    break
+            writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        pool = AsyncConnectionPool(f"http://127.0.0.1:{port}")
+        try:
+            for path in ("/chunked", "/chunked", "/close", "/chunked"):
+                status, _, body = await pool.request("GET", path, timeout=5)
+                self.assertEqual((status, body), (200, self.BODY))
+            stats = pool.stats()
+            # The close-delimited response ends its connection
+            self.assertEqual(stats["connections_created"], 2)
+            self.assertEqual(stats["connections_reused"], 2)
+        finally:
+            pool.close()
+            server.close()
+            await server.wait_closed()
+
+
+if __name__ == "__main__":
+    unittest.main()
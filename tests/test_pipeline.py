@@ -0,0 +1,63 @@
+"""
+Tests for the generation history written by api/_lib/pipeline.py.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+from _lib import pipeline  # noqa: E402
+
+SEGMENTS = [{"id": f"s{index}", "name": f"Segment {index}"} for index in range(2)]
+SLOW_SECONDS = 0.5
+
+
+def _slow_segment(segment, params, deadline, prompt=None):
+    time.sleep(SLOW_SECONDS)
+    return {"segment_id": segment["id"], "status": "success"}
+
+
+class DeadlineHistoryTest(unittest.TestCase):
+    def run_cells(self, max_concurrency):
+        recorded = []
+        lock = threading.Lock()
+
+        def record(outcome, params):
+            with lock:
+                recorded.append((outcome["segment_id"], outcome["status"]))
+
+        cells = [(segment, {}, None) for segment in SEGMENTS]
+        with mock.patch.object(pipeline, "generate_segment", _slow_segment), \
+                mock.patch.object(pipeline, "record_generation", record):
+            outcomes = dict(pipeline.iter_cell_results(
+                cells, max_concurrency=max_concurrency, deadline_seconds=0.1, engine="threads",
+            ))
+            # Let the abandoned threads finish and try to record too
+            time.sleep(SLOW_SECONDS * 2)
+        return outcomes, recorded
+
+    def test_missed_deadline_is_recorded_once(self):
+        outcomes, recorded = self.run_cells(max_concurrency=2)
+        self.assertEqual([outcome["status"] for outcome in outcomes.values()], ["error"] * 2)
+        self.assertEqual(sorted(recorded), [("s0", "error"), ("s1", "error")])
+
+    def test_sequential_cells_are_recorded_once(self):
+        outcomes, recorded = self.run_cells(max_concurrency=1)
+        self.assertEqual(len(outcomes), 2)
+        self.assertEqual(sorted(recorded), sorted(
+            (outcome["segment_id"], outcome["status"]) for outcome in outcomes.values()
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()